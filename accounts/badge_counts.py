@@ -0,0 +1,120 @@
+# accounts/badge_counts.py - Header counters from one cached entry per user, dropped by signals and rebuilt on read
+from django.conf import settings
+from django.core.cache import cache
+
+from . import notification_service
+
+BADGES_KEY = 'badges:{user_id}'
+GENERATION_KEY = 'badges:{user_id}:gen'
+
+
+def _badges_key(user_id):
+    return BADGES_KEY.format(user_id=user_id)
+
+
+def _generation_key(user_id):
+    return GENERATION_KEY.format(user_id=user_id)
+
+
+def _count_friend_requests(user_id):
+    from .models import FriendRequest
+    return FriendRequest.objects.filter(to_user_id=user_id, status='pending').count()
+
+
+def _unread_chats(user_id):
+    from chat.models import Message
+    return sorted(
+        str(conversation_id) for conversation_id in
+        Message.objects.filter(conversation__participants__id=user_id, is_read=False)
+        .exclude(sender_id=user_id).values_list('conversation_id', flat=True).distinct()
+    )
+
+
+COUNTERS = {
+    'friend_requests': _count_friend_requests,
+    'unread_chats': _unread_chats,
+}
+
+
+def get_badge_counts(user):
+    """
+    {'friend_requests', 'notifications', 'unread_chats'} for the header.
+    The badge entry, its generation and the notification counts come back in one cache round trip.
+    """
+    badges_key = _badges_key(user.id)
+    generation_key = _generation_key(user.id)
+    counts_key = notification_service.COUNTS_CACHE_KEY.format(user_id=user.id)
+    cached = cache.get_many([badges_key, generation_key, counts_key])
+
+    generation = cached.get(generation_key, 0)
+    entry = cached.get(badges_key)
+    if entry is None or entry['generation'] != generation:
+        # Stamped with the generation read before counting: a change that lands while we count
+        # bumps it, so this entry is rebuilt on the next read instead of hiding the change
+        entry = {name: count(user.id) for name, count in COUNTERS.items()}
+        entry['generation'] = generation
+        cache.set(badges_key, entry, settings.BADGE_COUNTS_CACHE_TIMEOUT)
+
+    counts = cached.get(counts_key)
+    return {
+        'friend_requests': entry['friend_requests'],
+        'notifications': counts['unread'] if counts is not None else notification_service.get_unread_count(user),
+        'unread_chats': len(entry['unread_chats']),
+    }
+
+
+def _bump_generation(user_id):
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Never set (or evicted): start it, unless another process just did
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _invalidate(user_ids, entries):
+    """
+    Drop the users' entries; the next read rebuilds them from the database.
+    Nothing is read back and written, so concurrent signals cannot undo each other.
+    """
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        _bump_generation(user_id)
+    cache.delete_many([_badges_key(user_id) for user_id in user_ids])
+    # Only users that had an entry are pushed. Open pages re-read theirs with the badge poll, well
+    # inside the timeout, so a missing entry means nobody is looking; the next read rebuilds it
+    notification_service.push_badge_counts([user_id for user_id in user_ids if user_id in entries])
+
+
+def _cached_entries(user_ids):
+    keys = {_badges_key(user_id): user_id for user_id in user_ids}
+    return {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+
+
+def refresh(user_ids):
+    """A counted row changed for these users (called after it commits)"""
+    user_ids = set(user_ids)
+    _invalidate(user_ids, _cached_entries(user_ids))
+
+
+def chat_became_unread(user_ids, conversation_id):
+    """A message nobody has read yet arrived for these users (called after it commits)"""
+    conversation_id = str(conversation_id)
+    entries = _cached_entries(set(user_ids))
+    # Skipping an entry that lists the chat already is safe: any later change drops it, and the
+    # rebuild after that runs after this message committed
+    _invalidate(
+        {user_id for user_id in user_ids if conversation_id not in entries.get(user_id, {}).get('unread_chats', ())},
+        entries
+    )
+
+
+def chat_read(user_id, conversation_id):
+    """The user has read the conversation"""
+    entries = _cached_entries([user_id])
+    entry = entries.get(user_id)
+    if entry is not None and str(conversation_id) not in entry['unread_chats']:
+        return
+    _invalidate({user_id}, entries)
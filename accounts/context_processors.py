@@ -1,13 +1,12 @@
 # messenger_app/accounts/context_processors.py
-from .models import FriendRequest
+from django.utils.functional import SimpleLazyObject
 
-def friend_request_counts(request):
+
+def badge_counts(request):
+    """Header counters (friend requests, notifications, invitations, unread chats), read only if a template uses them"""
     if request.user.is_authenticated:
-        pending_count = FriendRequest.objects.filter(
-            to_user=request.user,
-            status='pending'
-        ).count()
+        from .badge_counts import get_badge_counts
         return {
-            'pending_friend_requests_count': pending_count
+            'badge_counts': SimpleLazyObject(lambda: get_badge_counts(request.user))
         }
-    return {}
\ No newline at end of file
+    return {}
@@ -0,0 +1,89 @@
+# accounts/delivery_policy.py - Decide per recipient whether a notification is pushed, held or dropped
+from datetime import datetime, timedelta
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import CustomUser
+
+# Outcomes for one recipient
+PUSH = 'push'    # store and push to open sockets now
+STORE = 'store'  # store only (push notifications turned off)
+DEFER = 'defer'  # store now, push when the recipient's quiet hours end
+DROP = 'drop'    # the recipient turned this kind of notification off
+
+# The preference that switches each notification type off (types not listed are always on)
+TYPE_PREFERENCES = {
+    'message': 'message_notifications',
+    'reaction': 'message_notifications',
+    'reply': 'message_notifications',
+    'friend_request': 'friend_request_notifications',
+    'friend_online': 'friend_online_notifications',
+    'system': 'system_notifications',
+    'marketing': 'marketing_notifications',
+}
+# Types that also follow the group settings when they come from a group conversation
+GROUP_TYPES = {'message', 'reaction', 'reply', 'mention'}
+
+PREFERENCE_FIELDS = [
+    'id', 'push_notifications', 'group_notifications', 'group_mentions_only',
+    'quiet_hours_enabled', 'quiet_hours_start', 'quiet_hours_end',
+    *sorted(set(TYPE_PREFERENCES.values())),
+]
+
+
+def load_preferences(users):
+    """Delivery preferences of many users (a user queryset, or users / ids) in one query, as {user_id: {field: value}}"""
+    if not isinstance(users, QuerySet):
+        users = CustomUser.objects.filter(id__in=[getattr(user, 'id', user) for user in users])
+    return {preferences['id']: preferences for preferences in users.values(*PREFERENCE_FIELDS)}
+
+
+def quiet_hours_end(preferences, now=None):
+    """When the user's current quiet hours end, or None if they are not in quiet hours now"""
+    start, end = preferences['quiet_hours_start'], preferences['quiet_hours_end']
+    if not preferences['quiet_hours_enabled'] or start is None or end is None or start == end:
+        return None
+
+    # Quiet hours are wall-clock times in the site time zone; a window may wrap past midnight
+    local = timezone.localtime(now or timezone.now())
+    current = local.time()
+    if start < end:
+        quiet = start <= current < end
+    else:
+        quiet = current >= start or current < end
+    if not quiet:
+        return None
+
+    ends_at = timezone.make_aware(datetime.combine(local.date(), end))
+    if ends_at <= local:
+        ends_at = timezone.make_aware(datetime.combine(local.date() + timedelta(days=1), end))
+    return ends_at
+
+
+def decide(preferences, notification_type, is_group=False, now=None):
+    """(outcome, deliver_after) for one recipient; deliver_after is only set when deferring"""
+    preference = TYPE_PREFERENCES.get(notification_type)
+    if preference and not preferences[preference]:
+        return DROP, None
+    if is_group and notification_type in GROUP_TYPES:
+        if not preferences['group_notifications']:
+            return DROP, None
+        if preferences['group_mentions_only'] and notification_type != 'mention':
+            return DROP, None
+
+    if not preferences['push_notifications']:
+        return STORE, None
+    deliver_after = quiet_hours_end(preferences, now)
+    if deliver_after is not None:
+        return DEFER, deliver_after
+    return PUSH, None
+
+
+def plan(preferences, notification_type, is_group=False, now=None):
+    """Outcome for every recipient in load_preferences() output, as {user_id: (outcome, deliver_after)}"""
+    now = now or timezone.now()
+    return {
+        user_id: decide(user_preferences, notification_type, is_group, now)
+        for user_id, user_preferences in preferences.items()
+    }
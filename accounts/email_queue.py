@@ -0,0 +1,238 @@
+# accounts/email_queue.py - Outbound email queue sent in rate-limited batches over one SMTP connection
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OTP_SUBJECTS = {
+    'account_verification': 'Verify your account',
+    'email_verification': 'Verify your email',
+    'password_reset': 'Reset your password',
+    'password_change': 'Confirm your password change',
+}
+
+_executor = None
+_run_scheduled = threading.Event()
+_retry_timer = None
+
+
+def queue_emails(emails):
+    """Save unsaved OutboundEmail rows and schedule a delivery run; returns the saved rows"""
+    from .models import Invitation, OutboundEmail
+
+    emails = OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    invitation_ids = [email.invitation_id for email in emails if email.invitation_id]
+    for start in range(0, len(invitation_ids), 500):
+        Invitation.objects.filter(id__in=invitation_ids[start:start + 500]).update(email_status='queued')
+
+    schedule_delivery()
+    return emails
+
+
+def queue_email(to_email, subject, body, kind='other', invitation=None):
+    """Queue a single email"""
+    from .models import OutboundEmail
+
+    return queue_emails([OutboundEmail(
+        kind=kind, to_email=to_email, subject=subject, body=body, invitation=invitation
+    )])[0]
+
+
+def queue_otp_email(otp, purpose):
+    """Queue the email carrying an OTP code (purpose is a key of OTP_SUBJECTS)"""
+    body = (
+        f"Your Connect.io code is {otp.otp_code}\n\n"
+        f"It expires in 10 minutes. If you didn't ask for it, you can ignore this email."
+    )
+    return queue_email(otp.email, OTP_SUBJECTS.get(purpose, 'Your verification code'), body, kind='otp')
+
+
+def schedule_delivery():
+    """Send due emails in the background after the current transaction commits"""
+    if not getattr(settings, 'EMAIL_QUEUE_IN_BACKGROUND', True):
+        # Left for the send_queued_email worker command
+        return
+
+    transaction.on_commit(_submit_run)
+
+
+def _submit_run():
+    global _executor
+    # A run already waiting will pick these rows up too
+    if _run_scheduled.is_set():
+        return
+    _run_scheduled.set()
+    if _executor is None:
+        # One thread: runs never overlap, so the rate limit holds for the process
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-queue')
+    _executor.submit(_deliver_in_thread)
+
+
+def _deliver_in_thread():
+    _run_scheduled.clear()
+    close_old_connections()
+    try:
+        release_stale()
+        deliver_pending()
+        _schedule_retry()
+    except Exception as e:
+        logger.warning(f"Email queue run failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def _schedule_retry():
+    """Run again when the earliest backed-off email is due, so retries do not wait for the next enqueue"""
+    global _retry_timer
+    from .models import OutboundEmail
+
+    due = (
+        OutboundEmail.objects.filter(status='pending').order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True).first()
+    )
+    if _retry_timer is not None:
+        _retry_timer.cancel()
+        _retry_timer = None
+    if due is None:
+        return
+
+    _retry_timer = threading.Timer(max(0, (due - timezone.now()).total_seconds()), _submit_run)
+    _retry_timer.daemon = True
+    _retry_timer.start()
+
+
+def deliver_pending(batch_size=None):
+    """Send every due email, one SMTP connection per batch; returns (sent, failed) counts"""
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    sent = failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return sent, failed
+
+        batch_sent, batch_failed = send_batch(batch)
+        sent += batch_sent
+        failed += batch_failed
+
+
+def claim_batch(batch_size):
+    """Mark up to batch_size due emails as sending (OTP mail first) and return them"""
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    email_ids = list(
+        OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by(
+            Case(When(kind='otp', then=Value(0)), default=Value(1), output_field=IntegerField()),
+            'next_attempt_at'
+        )
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not email_ids:
+        return []
+
+    # Conditional update, so concurrent workers never send the same row twice
+    OutboundEmail.objects.filter(id__in=email_ids, status='pending').update(status='sending', claimed_at=now)
+    return list(OutboundEmail.objects.filter(id__in=email_ids, status='sending', claimed_at=now))
+
+
+def send_batch(emails):
+    """Send claimed emails over one connection, at most EMAIL_QUEUE_RATE_PER_SECOND; returns (sent, failed)"""
+    rate = settings.EMAIL_QUEUE_RATE_PER_SECOND
+    interval = 1 / rate if rate else 0
+    sent_ids, errors = [], {}
+    unsent = emails
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Server unreachable: the whole batch is retried later
+        errors = {email.id: str(e) for email in emails}
+        unsent = []
+
+    try:
+        for email in unsent:
+            started = time.monotonic()
+            try:
+                connection.send_messages([EmailMessage(
+                    email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to_email]
+                )])
+                sent_ids.append(email.id)
+            except Exception as e:
+                errors[email.id] = str(e)
+                # The server may have dropped us; reconnect for the rest of the batch
+                connection.close()
+                connection.open()
+
+            if interval:
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+    except Exception as e:
+        # Reconnect failed: whatever was not sent yet is retried later
+        errors.update({email.id: str(e) for email in emails if email.id not in sent_ids and email.id not in errors})
+    finally:
+        connection.close()
+
+    record_results(emails, sent_ids, errors)
+    return len(sent_ids), len(errors)
+
+
+def record_results(emails, sent_ids, errors):
+    """Store delivery outcomes on the emails and their invitations"""
+    from .models import Invitation, OutboundEmail
+
+    now = timezone.now()
+    emails_by_id = {email.id: email for email in emails}
+
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status='sent', sent_at=now, last_error='', attempts=F('attempts') + 1
+        )
+        Invitation.objects.filter(emails__id__in=sent_ids).update(email_status='sent', email_sent_at=now)
+
+    given_up = []
+    for email_id, error in errors.items():
+        email = emails_by_id[email_id]
+        email.attempts += 1
+        email.last_error = error[:1000]
+        if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            email.status = 'failed'
+            given_up.append(email_id)
+        else:
+            # Exponential backoff: 1, 2, 4, 8... retry delays
+            email.status = 'pending'
+            email.next_attempt_at = now + timedelta(
+                seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (email.attempts - 1)
+            )
+        email.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at'])
+
+    if given_up:
+        Invitation.objects.filter(emails__id__in=given_up).update(email_status='failed')
+        logger.warning(f"Gave up on {len(given_up)} emails after {settings.EMAIL_QUEUE_MAX_ATTEMPTS} attempts")
+
+
+def release_stale(minutes=15):
+    """Return emails stuck in sending (worker died mid-batch) to the queue"""
+    from .models import OutboundEmail
+
+    return OutboundEmail.objects.filter(
+        status='sending', claimed_at__lt=timezone.now() - timedelta(minutes=minutes)
+    ).update(status='pending')
+
+
+def retry_failed():
+    """Give emails that exhausted their attempts a fresh set"""
+    from .models import Invitation, OutboundEmail
+
+    failed = OutboundEmail.objects.filter(status='failed')
+    Invitation.objects.filter(emails__in=failed).update(email_status='queued')
+    return failed.update(status='pending', attempts=0, next_attempt_at=timezone.now())
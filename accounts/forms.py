@@ -244,4 +244,77 @@ class SendOTPForm(forms.Form):
             except NumberParseException:
                 raise forms.ValidationError('Please enter a valid phone number (e.g., 9800000000)')
 
+        return cleaned_data
+
+
+class InvitationForm(forms.Form):
+    email = forms.EmailField(
+        required=False,
+        widget=forms.EmailInput(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'placeholder': 'friend@example.com'
+        })
+    )
+
+    phone_number = forms.CharField(
+        required=False,
+        max_length=20,
+        widget=forms.TextInput(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'placeholder': '+9779812345678'
+        })
+    )
+
+    message = forms.CharField(
+        required=False,
+        max_length=500,
+        widget=forms.Textarea(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'rows': 3,
+            'placeholder': 'Add a personal message (optional)'
+        })
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('email') and not cleaned_data.get('phone_number'):
+            raise forms.ValidationError('Enter an email address or a phone number')
+        return cleaned_data
+
+
+class BulkInvitationForm(forms.Form):
+    contacts = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'rows': 8,
+            'placeholder': 'One email address or phone number per line'
+        })
+    )
+
+    message = forms.CharField(
+        required=False,
+        max_length=500,
+        widget=forms.Textarea(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'rows': 3,
+            'placeholder': 'Add a personal message (optional)'
+        })
+    )
+
+    csv_file = forms.FileField(
+        required=False,
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'w-full text-sm text-gray-700',
+            'accept': '.csv,text/csv'
+        })
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        csv_file = cleaned_data.get('csv_file')
+        if not cleaned_data.get('contacts', '').strip() and not csv_file:
+            raise forms.ValidationError('Paste some contacts or upload a CSV file')
+        if csv_file and not csv_file.name.lower().endswith('.csv'):
+            raise forms.ValidationError('Please upload a .csv file')
         return cleaned_data
\ No newline at end of file
@@ -0,0 +1,178 @@
+# accounts/invitation_import.py - Set-based bulk invitation import from pasted text or CSV
+import csv
+import io
+from datetime import timedelta
+
+import phonenumbers
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from phonenumbers import NumberParseException
+
+# Numbers without a country code are read as Nepali, like the rest of the phone forms
+DEFAULT_PHONE_REGION = 'NP'
+
+# Contacts per lookup query; keeps the IN lists well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 2000
+
+CSV_CONTACT_COLUMNS = ('email', 'phone', 'phone_number', 'mobile', 'contact')
+
+
+def normalize_contact(raw):
+    """Return ('email', lowercased address) or ('phone', E.164 number), or None if invalid"""
+    contact = raw.strip().strip('"\'<>').strip()
+    if not contact:
+        return None
+
+    if '@' in contact:
+        contact = contact.lower()
+        try:
+            validate_email(contact)
+        except ValidationError:
+            return None
+        return 'email', contact
+
+    try:
+        parsed = phonenumbers.parse(contact, DEFAULT_PHONE_REGION)
+    except NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return 'phone', phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+def read_text_contacts(text):
+    """Contacts pasted one per line (commas and semicolons also separate)"""
+    for line in text.splitlines():
+        for contact in line.replace(';', ',').split(','):
+            yield contact
+
+
+def read_csv_contacts(uploaded_file):
+    """
+    Contacts from an uploaded CSV, read row by row from the (possibly on-disk) upload.
+    With a header naming an email/phone column only those columns are used,
+    otherwise every cell is tried.
+    """
+    reader = csv.reader(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', errors='replace'))
+    first_row = next(reader, None)
+    if first_row is None:
+        return
+
+    header = [cell.strip().lower() for cell in first_row]
+    columns = [index for index, name in enumerate(header) if name in CSV_CONTACT_COLUMNS]
+    if not columns:
+        yield from first_row
+
+    for row in reader:
+        if columns:
+            yield from (row[index] for index in columns if index < len(row))
+        else:
+            yield from row
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def find_registered(contacts):
+    """The contacts (value -> kind) that already belong to an account, one IN query per chunk"""
+    from .models import CustomUser
+
+    registered = set()
+    for chunk in _chunks(contacts.items()):
+        emails = [value for value, kind in chunk if kind == 'email']
+        phones = [value for value, kind in chunk if kind == 'phone']
+        for email, phone_number in (
+            CustomUser.objects.annotate(email_lower=Lower('email'))
+            .filter(Q(email_lower__in=emails) | Q(phone_number__in=phones))
+            .values_list('email_lower', 'phone_number')
+        ):
+            registered.update((email, phone_number))
+    return registered & contacts.keys()
+
+
+def find_pending(inviter, contacts):
+    """The contacts inviter already has a pending invitation for, one IN query per chunk"""
+    from .models import Invitation
+
+    pending = set()
+    for chunk in _chunks(contacts.items()):
+        emails = [value for value, kind in chunk if kind == 'email']
+        phones = [value for value, kind in chunk if kind == 'phone']
+        for email, phone_number in (
+            Invitation.objects.filter(inviter=inviter, status='pending')
+            .filter(Q(email__in=emails) | Q(phone_number__in=phones))
+            .values_list('email', 'phone_number')
+        ):
+            pending.update((email, phone_number))
+    return pending & contacts.keys()
+
+
+def import_invitations(inviter, raw_contacts, message=''):
+    """
+    Normalize and dedup contacts in memory, skip registered users and pending invitations,
+    insert the rest with bulk_create and queue their emails. Returns counts per outcome.
+    """
+    from .email_queue import queue_emails
+    from .models import Invitation
+    from .views_invitations import invitation_email
+
+    result = {'created': 0, 'invalid': 0, 'duplicates': 0, 'registered': 0, 'already_invited': 0, 'over_limit': 0}
+    limit = settings.INVITATION_IMPORT_MAX_CONTACTS
+
+    contacts = {}
+    for raw in raw_contacts:
+        if not raw or not raw.strip():
+            continue
+        normalized = normalize_contact(raw)
+        if normalized is None:
+            result['invalid'] += 1
+        elif normalized[1] in contacts:
+            result['duplicates'] += 1
+        elif len(contacts) >= limit:
+            result['over_limit'] += 1
+        else:
+            contacts[normalized[1]] = normalized[0]
+
+    # Own address and number are registered too, so inviting yourself is skipped here
+    registered = find_registered(contacts)
+    pending = find_pending(inviter, contacts)
+    result['registered'] = len(registered)
+    result['already_invited'] = len(pending - registered)
+
+    expires_at = timezone.now() + timedelta(days=7)
+    invitations = [
+        Invitation(
+            inviter=inviter,
+            email=value if kind == 'email' else None,
+            phone_number=value if kind == 'phone' else None,
+            message=message,
+            invitation_type=kind,
+            expires_at=expires_at
+        )
+        for value, kind in contacts.items()
+        if value not in registered and value not in pending
+    ]
+    if not invitations:
+        return result
+
+    with transaction.atomic():
+        # The pending-invitation constraints drop rows a concurrent import inserted first
+        Invitation.objects.bulk_create(invitations, batch_size=1000, ignore_conflicts=True)
+        created_ids = set()
+        for id_chunk in _chunks(invitation.id for invitation in invitations):
+            created_ids.update(Invitation.objects.filter(id__in=id_chunk).values_list('id', flat=True))
+
+        created = [invitation for invitation in invitations if invitation.id in created_ids]
+        queue_emails([invitation_email(invitation) for invitation in created if invitation.email])
+
+    result['created'] = len(created)
+    result['already_invited'] += len(invitations) - len(created)
+    return result
@@ -0,0 +1,14 @@
+# accounts/management/commands/flush_deferred_notifications.py
+from django.core.management.base import BaseCommand
+from accounts.notification_service import flush_deferred
+
+
+class Command(BaseCommand):
+    help = 'Push notifications held during quiet hours once they are over (run every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Notifications released per transaction')
+
+    def handle(self, *args, **options):
+        pushed = flush_deferred(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Pushed {pushed} deferred notifications'))
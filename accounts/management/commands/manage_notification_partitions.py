@@ -0,0 +1,42 @@
+# accounts/management/commands/manage_notification_partitions.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from accounts.notification_retention import (
+    convert_to_partitioned, drop_expired_partitions, ensure_partitions, get_max_retention_days, is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = ('Keep the PostgreSQL monthly partitions of the notification table: create upcoming months '
+            'and drop months older than the longest retention period (run daily)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Rebuild the notification table as a partitioned table first (one-off, locks the table)')
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future monthly partitions to keep ready')
+        parser.add_argument('--keep-expired', action='store_true', help='Do not drop expired partitions')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL; use purge_notifications on this database')
+
+        if options['convert']:
+            if is_partitioned():
+                self.stdout.write(self.style.WARNING('⚠️  The notification table is already partitioned'))
+            else:
+                convert_to_partitioned(months_ahead=options['months_ahead'])
+                self.stdout.write(self.style.SUCCESS('✅ Notification table converted to monthly partitions'))
+
+        if not is_partitioned():
+            raise CommandError('The notification table is not partitioned; run with --convert first')
+
+        for name in ensure_partitions(months_ahead=options['months_ahead']):
+            self.stdout.write(f'Created {name}')
+
+        if not options['keep_expired']:
+            for name in drop_expired_partitions():
+                self.stdout.write(f'Dropped {name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Partitions ready; months older than {get_max_retention_days()} days are dropped'
+        ))
@@ -0,0 +1,32 @@
+# accounts/management/commands/purge_notifications.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import Notification
+from accounts.notification_retention import get_retention_days, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications older than their type\'s retention period, in batches (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows have expired')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            now = timezone.now()
+            for notification_type, _ in Notification.NOTIFICATION_TYPES:
+                days = get_retention_days(notification_type)
+                expired = Notification.objects.filter(
+                    notification_type=notification_type,
+                    created_at__lt=now - timedelta(days=days)
+                ).count()
+                self.stdout.write(f'{notification_type}: {expired} expired (kept {days} days)')
+            return
+
+        deleted = purge_expired(batch_size=options['batch_size'])
+        for notification_type, count in deleted.items():
+            self.stdout.write(f'{notification_type}: {count} deleted')
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Purged {sum(deleted.values())} expired notifications'))
@@ -0,0 +1,18 @@
+# accounts/management/commands/send_notification_digest.py
+from django.core.management.base import BaseCommand
+from accounts.notification_service import get_digest_redis, send_digest
+
+
+class Command(BaseCommand):
+    help = 'Write queued low-priority notifications as one digest per user and type (run periodically, e.g. every 15 minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users read from the queue at a time')
+
+    def handle(self, *args, **options):
+        if get_digest_redis() is None:
+            self.stdout.write(self.style.WARNING('⚠️  NOTIFICATION_DIGEST_REDIS_URL is not set; digest notifications are written directly'))
+            return
+
+        written = send_digest(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {written} digest notifications'))
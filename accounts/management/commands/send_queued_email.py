@@ -0,0 +1,39 @@
+# accounts/management/commands/send_queued_email.py
+import time
+
+from django.core.management.base import BaseCommand
+from accounts import email_queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued invitation and OTP emails in batches, one SMTP connection per batch. '
+        'Web processes send new mail and its retries themselves (EMAIL_QUEUE_IN_BACKGROUND); '
+        'startup.sh also runs this with --watch as the worker that drains retries and stale sends '
+        'left by restarted processes. Set EMAIL_QUEUE_IN_BACKGROUND=False to leave all sending to it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails per SMTP connection')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry emails that ran out of attempts')
+        parser.add_argument('--stale-minutes', type=int, default=15,
+                            help='Requeue emails left in sending this long by a dead worker')
+        parser.add_argument('--watch', type=int, default=0, help='Keep polling every N seconds (worker mode)')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = email_queue.retry_failed()
+            self.stdout.write(f'Requeued {retried} failed emails')
+
+        while True:
+            released = email_queue.release_stale(options['stale_minutes'])
+            if released:
+                self.stdout.write(self.style.WARNING(f'⚠️  Requeued {released} emails stuck in sending'))
+
+            sent, failed = email_queue.deliver_pending(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f'✅ Sent {sent} emails ({failed} failed, will retry)'))
+
+            if not options['watch']:
+                break
+            time.sleep(options['watch'])
@@ -0,0 +1,118 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:31
+
+import bisect
+import re
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Old rows only carried a link such as /chat/<uuid>/ or /chat/group/<uuid>/
+CONVERSATION_URL_RE = re.compile(r'^/chat/(?:group/|conversation/)?([0-9a-f-]{36})/$')
+
+# A message used to write both an account and a chat notification a few ms apart
+DUPLICATE_WINDOW = timedelta(seconds=5)
+
+
+def merge_notifications(apps, schema_editor):
+    """Link account notifications to conversations and fold chat notifications into the same table"""
+    Notification = apps.get_model('accounts', 'Notification')
+    ChatNotification = apps.get_model('chat', 'ChatNotification')
+    Conversation = apps.get_model('chat', 'Conversation')
+
+    linked = {}
+    for notification_id, related_url in Notification.objects.filter(
+        related_url__startswith='/chat/'
+    ).values_list('id', 'related_url').iterator():
+        match = CONVERSATION_URL_RE.match(related_url)
+        if match:
+            linked[notification_id] = uuid.UUID(match.group(1))
+
+    existing = set(Conversation.objects.filter(id__in=set(linked.values())).values_list('id', flat=True))
+    updates = [
+        Notification(
+            id=notification_id,
+            related_conversation_id=conversation_id,
+            related_url=f'/chat/conversation/{conversation_id}/'
+        )
+        for notification_id, conversation_id in linked.items()
+        if conversation_id in existing
+    ]
+    Notification.objects.bulk_update(updates, ['related_conversation', 'related_url'], batch_size=1000)
+
+    # Message notifications already written to the account table, per (user, conversation)
+    message_times = defaultdict(list)
+    for user_id, conversation_id, created_at in Notification.objects.filter(
+        notification_type='message', related_conversation__isnull=False
+    ).values_list('user_id', 'related_conversation_id', 'created_at').iterator():
+        message_times[(user_id, conversation_id)].append(created_at)
+    for times in message_times.values():
+        times.sort()
+
+    def is_duplicate(row):
+        times = message_times.get((row.user_id, row.related_conversation_id))
+        if row.notification_type != 'message' or not times:
+            return False
+        position = bisect.bisect_left(times, row.created_at - DUPLICATE_WINDOW)
+        return position < len(times) and times[position] <= row.created_at + DUPLICATE_WINDOW
+
+    batch = []
+    for row in ChatNotification.objects.all().iterator():
+        if is_duplicate(row):
+            continue
+        batch.append(Notification(
+            id=row.id,
+            user_id=row.user_id,
+            notification_type=row.notification_type,
+            title=row.title[:200],
+            message=row.message,
+            related_url=f'/chat/conversation/{row.related_conversation_id}/' if row.related_conversation_id else '',
+            related_conversation_id=row.related_conversation_id,
+            related_message_id=row.related_message_id,
+            is_read=row.is_read,
+            is_archived=row.is_archived,
+            read_at=row.read_at,
+            created_at=row.created_at,
+        ))
+        if len(batch) >= 1000:
+            Notification.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Notification.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_emoji_usage'),
+        ('accounts', '0002_fix_verification_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='related_conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='chat.conversation'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='related_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='chat.message'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('message', 'New Message'), ('friend_request', 'Friend Request'), ('friend_online', 'Friend Online'), ('group_invite', 'Group Invitation'), ('call', 'Call'), ('mention', 'Mention'), ('reaction', 'Message Reaction'), ('reply', 'Message Reply'), ('system', 'System Notification'), ('marketing', 'Marketing')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'is_archived', '-created_at'], name='notification_user_state_idx'),
+        ),
+        migrations.RunPython(merge_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_notification_retention_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='deliver_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('deliver_after__isnull', False)), fields=['deliver_after'], name='notification_deferred_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_invitation_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='invitation',
+            constraint=models.UniqueConstraint(condition=models.Q(('email__isnull', False), ('status', 'pending')), fields=('inviter', 'email'), name='invitation_pending_email_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='invitation',
+            constraint=models.UniqueConstraint(condition=models.Q(('phone_number__isnull', False), ('status', 'pending')), fields=('inviter', 'phone_number'), name='invitation_pending_phone_uniq'),
+        ),
+    ]
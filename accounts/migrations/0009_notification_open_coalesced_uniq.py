@@ -0,0 +1,42 @@
+# Generated by Django 4.2.26 on 2026-10-19 14:11
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_open_duplicates(apps, schema_editor):
+    """Fold duplicate open coalesced notifications into the newest one, summing their counts"""
+    Notification = apps.get_model('accounts', 'Notification')
+
+    open_rows = Notification.objects.filter(
+        is_read=False, is_archived=False, notification_type__in=['message', 'reaction', 'reply']
+    )
+    duplicates = (
+        open_rows.values('user_id', 'notification_type', 'related_conversation_id')
+        .annotate(rows=Count('id'), total=Sum('count'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        rows = open_rows.filter(
+            user_id=group['user_id'],
+            notification_type=group['notification_type'],
+            related_conversation_id=group['related_conversation_id'],
+        ).order_by('-created_at', '-id')
+        keep = rows.first()
+        rows.exclude(id=keep.id).delete()
+        Notification.objects.filter(id=keep.id).update(count=group['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_invitation_pending_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_open_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_archived', False), ('is_read', False), ('notification_type__in', ['message', 'reaction', 'reply'])), fields=('user', 'notification_type', 'related_conversation'), name='notification_open_coalesced_uniq'),
+        ),
+    ]
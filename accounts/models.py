@@ -2,7 +2,7 @@
 import secrets
 import string
 from datetime import timedelta
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -256,15 +256,24 @@ class CustomUser(AbstractUser):
 
 
 class Notification(models.Model):
-    """Notification model for user notifications"""
+    """
+    The single notification store for accounts and chat events.
+    Write and read it through accounts.notification_service.
+    """
     NOTIFICATION_TYPES = [
         ('message', 'New Message'),
         ('friend_request', 'Friend Request'),
         ('friend_online', 'Friend Online'),
         ('group_invite', 'Group Invitation'),
+        ('call', 'Call'),
+        ('mention', 'Mention'),
+        ('reaction', 'Message Reaction'),
+        ('reply', 'Message Reply'),
         ('system', 'System Notification'),
         ('marketing', 'Marketing'),
     ]
+    # Kept as one open row per (user, type, conversation) carrying a count
+    COALESCED_TYPES = ('message', 'reaction', 'reply')
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(
@@ -276,13 +285,52 @@ class Notification(models.Model):
     title = models.CharField(max_length=200)
     message = models.TextField()
     related_url = models.CharField(max_length=500, blank=True)
+    related_conversation = models.ForeignKey(
+        'chat.Conversation',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
+    related_message = models.ForeignKey(
+        'chat.Message',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
+    # Events folded into this row (see COALESCED_TYPES / DIGEST_TYPES in the service)
+    count = models.PositiveIntegerField(default=1)
     is_read = models.BooleanField(default=False)
     is_archived = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    # Push held back until then (the recipient's quiet hours); cleared once pushed
+    deliver_after = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Badge counts, filtered lists and pages all start from this prefix
+            models.Index(fields=['user', 'is_read', 'is_archived', '-created_at'], name='notification_user_state_idx'),
+            # Retention purge walks each type's oldest rows
+            models.Index(fields=['notification_type', 'created_at'], name='notification_type_created_idx'),
+            # The deferred-push queue: only held rows are indexed
+            models.Index(
+                fields=['deliver_after'],
+                name='notification_deferred_idx',
+                condition=models.Q(deliver_after__isnull=False)
+            ),
+        ]
+        constraints = [
+            # Coalescing folds into the open row of a COALESCED_TYPES type; a second one would be counted twice
+            models.UniqueConstraint(
+                fields=['user', 'notification_type', 'related_conversation'],
+                name='notification_open_coalesced_uniq',
+                condition=models.Q(is_read=False, is_archived=False, notification_type__in=['message', 'reaction', 'reply'])
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.title}"
@@ -308,12 +356,14 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read"""
         self.is_read = True
-        self.save(update_fields=['is_read'])
+        self.read_at = timezone.now()
+        self.save(update_fields=['is_read', 'read_at'])
 
     def mark_as_unread(self):
         """Mark notification as unread"""
         self.is_read = False
-        self.save(update_fields=['is_read'])
+        self.read_at = None
+        self.save(update_fields=['is_read', 'read_at'])
 
     def archive(self):
         """Archive notification"""
@@ -663,9 +713,112 @@ class BlockedUser(models.Model):
             (Q(blocker=user2) & Q(blocked=user1))
         ).exists()
 
+class Invitation(models.Model):
+    """Invitation to join sent to an email address or phone number"""
+    INVITATION_TYPES = [
+        ('email', 'Email'),
+        ('phone', 'Phone'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('expired', 'Expired'),
+    ]
+
+    EMAIL_STATUS_CHOICES = [
+        ('not_sent', 'Not Sent'),
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    inviter = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='app_invitations')
+    email = models.EmailField(blank=True, null=True)
+    phone_number = models.CharField(max_length=20, blank=True, null=True)
+    message = models.TextField(blank=True)
+    invitation_type = models.CharField(max_length=10, choices=INVITATION_TYPES, default='email')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    email_status = models.CharField(max_length=10, choices=EMAIL_STATUS_CHOICES, default='not_sent')
+    email_sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['inviter', 'status'], name='invitation_inviter_status_idx'),
+        ]
+        # One pending invitation per contact and inviter; bulk imports insert with ignore_conflicts
+        constraints = [
+            models.UniqueConstraint(
+                fields=['inviter', 'email'],
+                condition=Q(status='pending', email__isnull=False),
+                name='invitation_pending_email_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['inviter', 'phone_number'],
+                condition=Q(status='pending', phone_number__isnull=False),
+                name='invitation_pending_phone_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.inviter.username} invited {self.email or self.phone_number}"
+
+    def is_expired(self):
+        """Check if invitation has expired"""
+        return timezone.now() > self.expires_at
+
+
+class OutboundEmail(models.Model):
+    """Email waiting in the outbound queue (sent in batches by accounts.email_queue)"""
+    KIND_CHOICES = [
+        ('invitation', 'Invitation'),
+        ('otp', 'OTP'),
+        ('other', 'Other'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='other')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    invitation = models.ForeignKey(
+        Invitation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='emails'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.to_email} ({self.status})"
+
 
 # Signal handlers at the bottom to avoid circular imports
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -683,7 +836,8 @@ def update_last_seen_on_save(sender, instance, **kwargs):
 def create_friend_request_notification(sender, instance, created, **kwargs):
     """Create notification for friend request"""
     if created and instance.status == 'pending':
-        Notification.objects.create(
+        from .notification_service import notify
+        notify(
             user=instance.to_user,
             notification_type='friend_request',
             title="New Friend Request",
@@ -696,8 +850,9 @@ def create_friend_request_notification(sender, instance, created, **kwargs):
 def update_friend_request_notification(sender, instance, **kwargs):
     """Update notification when friend request status changes"""
     if instance.status == 'accepted':
+        from .notification_service import archive, notify
         # Create notification for the requester
-        Notification.objects.create(
+        notify(
             user=instance.from_user,
             notification_type='friend_request',
             title="Friend Request Accepted",
@@ -706,19 +861,28 @@ def update_friend_request_notification(sender, instance, **kwargs):
         )
 
         # Archive the original notification for the receiver
-        Notification.objects.filter(
+        archive(instance.to_user, Notification.objects.filter(
             user=instance.to_user,
             notification_type='friend_request',
             message__contains=f"{instance.from_user.username} sent you a friend request"
-        ).update(is_archived=True)
+        ).values('id'))
+
+
+@receiver(post_save, sender=FriendRequest)
+@receiver(post_delete, sender=FriendRequest)
+def update_friend_request_badge(sender, instance, **kwargs):
+    """Drop the receiver's cached badges once the change is visible to the rebuild"""
+    from . import badge_counts
+    transaction.on_commit(lambda: badge_counts.refresh([instance.to_user_id]), robust=True)
 
 
 @receiver(post_save, sender=BlockedUser)
 def create_block_notification(sender, instance, created, **kwargs):
     """Create notification when user is blocked"""
     if created:
+        from .notification_service import notify
         # Notification for blocked user
-        Notification.objects.create(
+        notify(
             user=instance.blocked,
             notification_type='system',
             title="User Blocked You",
@@ -727,7 +891,7 @@ def create_block_notification(sender, instance, created, **kwargs):
         )
 
         # Notification for blocker
-        Notification.objects.create(
+        notify(
             user=instance.blocker,
             notification_type='system',
             title="User Blocked",
@@ -0,0 +1,180 @@
+# accounts/notification_retention.py - Per-type notification TTLs and monthly partitions on PostgreSQL
+import re
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+from .notification_service import invalidate_counts
+
+TABLE = Notification._meta.db_table
+PARTITION_NAME = TABLE + '_p{year:04d}_{month:02d}'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def get_retention_days(notification_type):
+    """Days a notification of this type is kept"""
+    return settings.NOTIFICATION_RETENTION_DAYS_BY_TYPE.get(notification_type, settings.NOTIFICATION_RETENTION_DAYS)
+
+
+def get_max_retention_days():
+    """The longest TTL: a partition entirely older than this holds nothing worth keeping"""
+    return max([settings.NOTIFICATION_RETENTION_DAYS, *settings.NOTIFICATION_RETENTION_DAYS_BY_TYPE.values()])
+
+
+def purge_expired(batch_size=1000, now=None):
+    """
+    Delete notifications past their type's TTL in batches of batch_size (short transactions,
+    served by the (notification_type, created_at) index); returns rows deleted per type
+    """
+    now = now or timezone.now()
+    deleted = {}
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        cutoff = now - timedelta(days=get_retention_days(notification_type))
+        expired = Notification.objects.filter(notification_type=notification_type, created_at__lt=cutoff)
+        total = 0
+        while True:
+            with transaction.atomic():
+                batch = list(expired.values_list('id', 'user_id')[:batch_size])
+                if not batch:
+                    break
+                total += Notification.objects.filter(id__in=[notification_id for notification_id, _ in batch]).delete()[0]
+                invalidate_counts(user_id for _, user_id in batch)
+        if total:
+            deleted[notification_type] = total
+    return deleted
+
+
+# ---- PostgreSQL range partitions by created_at month ----
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=value.tzinfo)
+
+
+def _next_month(value):
+    return _month_start(value + timedelta(days=32))
+
+
+def is_partitioned():
+    """Whether the notification table is range-partitioned (always False off PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Monthly partitions as {(year, month): name}"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)', [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions[(int(match.group(1)), int(match.group(2)))] = name
+    return partitions
+
+
+def _create_partition(cursor, month):
+    name = PARTITION_NAME.format(year=month.year, month=month.month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+        [month, _next_month(month)]
+    )
+    return name
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Create the monthly partitions from this month to months_ahead; returns the names created"""
+    month = _month_start(now or timezone.now())
+    existing = list_partitions()
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            if (month.year, month.month) not in existing:
+                created.append(_create_partition(cursor, month))
+            month = _next_month(month)
+    return created
+
+
+def drop_expired_partitions(now=None):
+    """
+    Detach and drop every partition whose whole month is older than the longest TTL:
+    one DROP TABLE instead of deleting the rows; returns the names dropped
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=get_max_retention_days())
+    dropped = []
+    for (year, month), name in sorted(list_partitions().items()):
+        if _next_month(datetime(year, month, 1, tzinfo=cutoff.tzinfo)) > cutoff:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT user_id FROM {name}')
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+            invalidate_counts(user_ids)
+        dropped.append(name)
+    return dropped
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    Rebuild the notification table as a created_at range-partitioned table: monthly partitions
+    covering the existing rows and months_ahead, a default partition for anything outside them,
+    and the original indexes and foreign keys. The primary key becomes (id, created_at),
+    as PostgreSQL requires the partition key in it. Runs in one transaction.
+    """
+    old_table = TABLE + '_unpartitioned'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old_table}')
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s',
+            [old_table, '%_pkey']
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [old_table]
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)')
+
+        cursor.execute(f'SELECT MIN(created_at) FROM {old_table}')
+        oldest = cursor.fetchone()[0] or timezone.now()
+        month = _month_start(oldest)
+        last = _month_start(timezone.now())
+        for _ in range(months_ahead):
+            last = _next_month(last)
+        while month <= last:
+            _create_partition(cursor, month)
+            month = _next_month(month)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old_table}')
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        # Recreated under their original names now that the old table is gone. PostgreSQL cannot
+        # enforce a unique index without the partition key across partitions, so the open-row
+        # guard (notification_open_coalesced_uniq) is dropped; _store still folds into the newest row
+        for _, definition in indexes:
+            if definition.startswith('CREATE UNIQUE INDEX') and 'created_at' not in definition:
+                continue
+            cursor.execute(definition.replace(f' ON {old_table} ', f' ON {TABLE} ').replace(
+                f'.{old_table} ', f'.{TABLE} '
+            ))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
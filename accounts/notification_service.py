@@ -0,0 +1,429 @@
+# accounts/notification_service.py - The one way notifications are written, read and counted
+import json
+import logging
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from messenger.pagination import decode_cursor, encode_cursor
+
+from . import delivery_policy
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Collapsed into one unread row per (user, conversation, type) carrying a count and the latest preview
+COALESCED_TYPES = set(Notification.COALESCED_TYPES)
+# Low-priority types queued and written once per user by send_notification_digest
+DIGEST_TYPES = {'friend_online', 'system'}
+DIGEST_PREVIEW_LINES = 5
+
+COUNTS_CACHE_KEY = 'notifications:counts:{user_id}'
+
+DIGEST_KEY = 'notifications:digest:{user_id}'
+DIGEST_PENDING_KEY = 'notifications:digest:pending'
+
+_digest_client = None
+
+
+def get_notification_group_name(user_id):
+    """Channel layer group of a user's notification sockets"""
+    return f'notifications_{user_id}'
+
+
+def _conversation_url(conversation):
+    return reverse('conversation', args=[conversation.id]) if conversation is not None else ''
+
+
+def notify(user, notification_type, title, message, related_url='', conversation=None, related_message=None,
+           digest=None):
+    """Notify one user; returns the stored notification, or None when it was queued for the digest"""
+    notifications = notify_many(
+        [user], notification_type, title, message, related_url, conversation, related_message, digest
+    )
+    return notifications[0] if notifications else None
+
+
+def notify_many(users, notification_type, title, message, related_url='', conversation=None, related_message=None,
+                digest=None):
+    """
+    Notify several users with as few writes as possible: coalesced types fold into each user's
+    open notification (one UPDATE) and the rest go in one INSERT. Each recipient's preferences
+    decide whether it is pushed now, held until their quiet hours end, or not written at all.
+    Digest types (or digest=True) are queued for send_notification_digest; pass digest=False
+    for ones that must arrive now.
+    """
+    is_group = conversation is not None and conversation.is_group
+    deliveries = delivery_policy.plan(delivery_policy.load_preferences(users), notification_type, is_group)
+    if all(outcome == delivery_policy.DROP for outcome, _ in deliveries.values()):
+        return []
+
+    fields = {
+        'notification_type': notification_type,
+        'title': title[:200],
+        'message': message,
+        'related_url': related_url or _conversation_url(conversation),
+        'related_conversation_id': conversation.id if conversation is not None else None,
+        'related_message_id': related_message.id if related_message is not None else None,
+    }
+    if notification_type in DIGEST_TYPES if digest is None else digest:
+        if _queue_digest(deliveries, fields):
+            return []
+        # No digest queue (local development): fold into the open digest row right away
+        return _write(deliveries, fields, coalesce=True)
+    return _write(deliveries, fields, coalesce=notification_type in COALESCED_TYPES)
+
+
+def _write(deliveries, fields, coalesce, increment=1):
+    """
+    Store the notification for each recipient in deliveries ({user_id: (outcome, deliver_after)}),
+    then push the ones due now; deferred ones keep deliver_after for flush_deferred
+    """
+    now = timezone.now()
+    # Recipients held until the same time are written together
+    batches = defaultdict(list)
+    for user_id, (outcome, deliver_after) in deliveries.items():
+        if outcome != delivery_policy.DROP:
+            batches[deliver_after].append(user_id)
+
+    notifications = []
+    for deliver_after, user_ids in batches.items():
+        notifications += _store(user_ids, {**fields, 'deliver_after': deliver_after}, coalesce, increment, now)
+
+    invalidate_counts(notification.user_id for notification in notifications)
+    push_notifications([
+        notification for notification in notifications
+        if deliveries[notification.user_id][0] == delivery_policy.PUSH
+    ])
+    return notifications
+
+
+def _store(user_ids, fields, coalesce, increment, now):
+    """One notification per user, folding into their open one when coalescing"""
+    if not coalesce:
+        return Notification.objects.bulk_create([
+            Notification(user_id=user_id, count=increment, created_at=now, **fields)
+            for user_id in user_ids
+        ])
+
+    try:
+        with transaction.atomic():
+            return _coalesce(user_ids, fields, increment, now)
+    except IntegrityError:
+        # A concurrent writer opened the row first (notification_open_coalesced_uniq): fold into it
+        return _coalesce(user_ids, fields, increment, now)
+
+
+def _coalesce(user_ids, fields, increment, now):
+    open_rows = Notification.objects.filter(
+        user_id__in=user_ids,
+        is_read=False,
+        is_archived=False,
+        notification_type=fields['notification_type'],
+        related_conversation_id=fields['related_conversation_id'],
+    ).order_by('created_at', 'id')
+    # Only the newest open row per user, should older duplicates exist (e.g. before the constraint)
+    current = {
+        user_id: (notification_id, count)
+        for notification_id, user_id, count in open_rows.values_list('id', 'user_id', 'count')
+    }
+
+    notifications = []
+    if current:
+        # created_at moves with the latest event so the row stays at the top of the list
+        Notification.objects.filter(id__in=[notification_id for notification_id, _ in current.values()]).update(
+            count=F('count') + increment, created_at=now, updated_at=now, **fields
+        )
+        notifications = [
+            Notification(id=notification_id, user_id=user_id, count=count + increment, created_at=now, **fields)
+            for user_id, (notification_id, count) in current.items()
+        ]
+
+    new_user_ids = [user_id for user_id in user_ids if user_id not in current]
+    if new_user_ids:
+        notifications += Notification.objects.bulk_create([
+            Notification(user_id=user_id, count=increment, created_at=now, **fields)
+            for user_id in new_user_ids
+        ])
+    return notifications
+
+
+def push_notifications(notifications):
+    """Send new notifications to the recipients' sockets once the transaction commits"""
+    events = [
+        (notification.user_id, {
+            'type': 'send_notification',
+            'id': str(notification.id),
+            'title': notification.title,
+            'message': notification.message,
+            'notification_type': notification.notification_type,
+            'related_url': notification.related_url,
+            'conversation_id': str(notification.related_conversation_id) if notification.related_conversation_id else None,
+            'count': notification.count,
+            'timestamp': notification.created_at.isoformat(),
+            'is_read': notification.is_read,
+        })
+        for notification in notifications
+    ]
+    if events:
+        transaction.on_commit(lambda: _publish(events))
+
+
+def flush_deferred(batch_size=500, now=None):
+    """Push held notifications whose recipients' quiet hours have ended; returns the number pushed"""
+    now = now or timezone.now()
+    pushed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(Notification.objects.filter(deliver_after__lte=now).order_by('deliver_after')[:batch_size])
+            if not batch:
+                return pushed
+            Notification.objects.filter(id__in=[notification.id for notification in batch]).update(deliver_after=None)
+            # Anything read or archived in the meantime was seen already
+            due = [notification for notification in batch if not notification.is_read and not notification.is_archived]
+            push_notifications(due)
+        pushed += len(due)
+
+
+def push_unread_count(user_id):
+    """Tell a user's sockets to refresh their badge"""
+    invalidate_counts([user_id])
+    transaction.on_commit(lambda: _publish([(user_id, {'type': 'unread_count_changed'})]))
+
+
+def push_badge_counts(user_ids):
+    """Tell users' sockets to refresh their header badges"""
+    events = [(user_id, {'type': 'badge_counts_changed'}) for user_id in user_ids]
+    if events:
+        transaction.on_commit(lambda: _publish(events))
+
+
+def _publish(events):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for sent, (user_id, event) in enumerate(events):
+        try:
+            async_to_sync(channel_layer.group_send)(get_notification_group_name(user_id), event)
+        except Exception as e:
+            # Stored already; the badge poll picks it up. The layer is most likely down,
+            # so give up on the rest instead of timing out (and logging) once per user
+            logger.warning(f"Could not push {event['type']} to {len(events) - sent} users: {e}")
+            return
+
+
+# ---- Digest of low-priority notifications ----
+
+def get_digest_redis():
+    """Shared Redis client for the digest queue, or None when NOTIFICATION_DIGEST_REDIS_URL is unset"""
+    global _digest_client
+    url = getattr(settings, 'NOTIFICATION_DIGEST_REDIS_URL', '')
+    if not url:
+        return None
+    if _digest_client is None:
+        import redis
+        _digest_client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+    return _digest_client
+
+
+def _queue_digest(deliveries, fields):
+    """Queue a notification for the next digest once the transaction commits; False without a queue"""
+    client = get_digest_redis()
+    if client is None:
+        return False
+
+    user_ids = [user_id for user_id, (outcome, _) in deliveries.items() if outcome != delivery_policy.DROP]
+    event = json.dumps({**fields, 'created_at': timezone.now().isoformat()}, default=str)
+
+    def queue():
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipeline.rpush(DIGEST_KEY.format(user_id=user_id), event)
+            pipeline.sadd(DIGEST_PENDING_KEY, *user_ids)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Notification digest queue unavailable, writing directly: {e}")
+            _write(deliveries, fields, coalesce=True)
+
+    transaction.on_commit(queue)
+    return True
+
+
+def _digest_message(events):
+    """Distinct messages of a digest, latest first"""
+    messages = list(dict.fromkeys(event['message'] for event in reversed(events)))
+    lines = messages[:DIGEST_PREVIEW_LINES]
+    if len(messages) > DIGEST_PREVIEW_LINES:
+        lines.append(f'+{len(messages) - DIGEST_PREVIEW_LINES} more')
+    return '\n'.join(lines)
+
+
+def send_digest(batch_size=500):
+    """Write the queued low-priority notifications as one row per (user, type, conversation); returns rows written"""
+    client = get_digest_redis()
+    if client is None:
+        return 0
+
+    written = 0
+    while True:
+        user_ids = [int(user_id) for user_id in client.spop(DIGEST_PENDING_KEY, batch_size) or []]
+        if not user_ids:
+            return written
+
+        # Read and clear each queue in one MULTI so events queued meanwhile wait for the next run
+        pipeline = client.pipeline(transaction=True)
+        for user_id in user_ids:
+            key = DIGEST_KEY.format(user_id=user_id)
+            pipeline.lrange(key, 0, -1)
+            pipeline.delete(key)
+        queues = pipeline.execute()[::2]
+
+        # Preferences are read again: they may have changed since the events were queued
+        preferences = delivery_policy.load_preferences(user_ids)
+        groups = defaultdict(list)
+        for user_id, events in zip(user_ids, queues):
+            for raw in events:
+                event = json.loads(raw)
+                groups[(user_id, event['notification_type'], event['related_conversation_id'])].append(event)
+
+        with transaction.atomic():
+            for (user_id, _, _), events in groups.items():
+                latest = events[-1]
+                fields = {
+                    'notification_type': latest['notification_type'],
+                    'title': latest['title'],
+                    'message': _digest_message(events),
+                    'related_url': latest['related_url'],
+                    'related_conversation_id': latest['related_conversation_id'],
+                    'related_message_id': latest['related_message_id'],
+                }
+                deliveries = delivery_policy.plan(
+                    {user_id: preferences[user_id]} if user_id in preferences else {}, fields['notification_type']
+                )
+                written += len(_write(deliveries, fields, coalesce=True, increment=len(events)))
+
+
+# ---- Reading ----
+
+def get_notifications(user, archived=False):
+    """A user's notifications, newest first (served by the (user, is_read, is_archived, created_at) index)"""
+    return Notification.objects.filter(user=user, is_archived=archived).order_by('-created_at')
+
+
+def get_page(notifications, cursor=None, limit=20, oldest_first=False):
+    """
+    One page of a notification queryset and the cursor of the next one (None on the last page).
+    The cursor is "<created_at iso>|<id>" of the last row shown; id breaks timestamp ties.
+    Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        cursor_at, cursor_id = decode_cursor(cursor, uuid.UUID)
+        if oldest_first:
+            notifications = notifications.filter(Q(created_at__gt=cursor_at) | Q(created_at=cursor_at, id__gt=cursor_id))
+        else:
+            notifications = notifications.filter(Q(created_at__lt=cursor_at) | Q(created_at=cursor_at, id__lt=cursor_id))
+
+    ordering = ('created_at', 'id') if oldest_first else ('-created_at', '-id')
+    page = list(notifications.order_by(*ordering)[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return page, next_cursor
+
+
+def get_counts(user):
+    """
+    Unarchived notification counts (all, unread, read and one per type) from one grouped
+    aggregate, cached per user until the next notification write for them
+    """
+    key = COUNTS_CACHE_KEY.format(user_id=user.id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = Notification.objects.filter(user=user, is_archived=False).aggregate(
+            all=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            read=Count('id', filter=Q(is_read=True)),
+            **{
+                notification_type: Count('id', filter=Q(notification_type=notification_type))
+                for notification_type, _ in Notification.NOTIFICATION_TYPES
+            }
+        )
+        cache.set(key, counts, settings.NOTIFICATION_COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_counts(user_ids):
+    """Drop cached counts now and again after commit, so a read racing the write cannot re-cache stale ones"""
+    keys = [COUNTS_CACHE_KEY.format(user_id=user_id) for user_id in set(user_ids)]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_unread_count(user):
+    """Unread, unarchived notifications for the badge"""
+    return get_counts(user)['unread']
+
+
+def get_notification(user, notification_id):
+    """One of the user's notifications, or None"""
+    return Notification.objects.filter(user=user, id=notification_id).first()
+
+
+# ---- State changes (each returns the number of rows changed) ----
+
+def _select(user, notification_ids=None, conversation=None):
+    notifications = Notification.objects.filter(user=user)
+    if notification_ids is not None:
+        notifications = notifications.filter(id__in=notification_ids)
+    if conversation is not None:
+        notifications = notifications.filter(related_conversation=conversation)
+    return notifications
+
+
+def mark_read(user, notification_ids=None, conversation=None):
+    """Mark the given notifications (or all, or a conversation's) as read"""
+    updated = _select(user, notification_ids, conversation).filter(is_read=False).update(
+        is_read=True, read_at=timezone.now()
+    )
+    if updated:
+        push_unread_count(user.id)
+    return updated
+
+
+def mark_unread(user, notification_ids=None):
+    """Mark the given notifications (or all unarchived ones) as unread"""
+    notifications = _select(user, notification_ids)
+    if notification_ids is None:
+        notifications = notifications.filter(is_archived=False)
+    updated = notifications.filter(is_read=True).update(is_read=False, read_at=None)
+    if updated:
+        push_unread_count(user.id)
+    return updated
+
+
+def archive(user, notification_ids=None):
+    """Archive the given notifications (or all)"""
+    updated = _select(user, notification_ids).filter(is_archived=False).update(is_archived=True)
+    if updated:
+        push_unread_count(user.id)
+    return updated
+
+
+def delete(user, notification_ids=None):
+    """Delete the given notifications (or all)"""
+    deleted, _ = _select(user, notification_ids).delete()
+    if deleted:
+        push_unread_count(user.id)
+    return deleted
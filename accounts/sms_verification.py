@@ -0,0 +1,222 @@
+# accounts/sms_verification.py - SMS verification client: pluggable backend, pooled HTTP, circuit breaker
+import logging
+import secrets
+import string
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Returned by send_code when the provider has not answered within SMS_VERIFICATION_SEND_WAIT
+PENDING_SID = 'pending'
+
+CIRCUIT_FAILURES_KEY = 'sms_verification:circuit:failures'
+CIRCUIT_OPEN_KEY = 'sms_verification:circuit:open'
+
+# Set when a send that outlived its request failed, so check_code can say so; kept as long as a code lives
+SEND_FAILED_KEY = 'sms_verification:send_failed:{phone_number}'
+SEND_FAILED_TTL = 600
+
+_backend = None
+_executor = None
+
+
+class VerificationUnavailable(Exception):
+    """The provider timed out, refused the connection or answered with a server error"""
+
+
+class TwilioVerifyBackend:
+    """Twilio Verify over one keep-alive session per process"""
+    API_URL = 'https://verify.twilio.com/v2/Services/{service_sid}/{resource}'
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        # Connections are reused across requests; failed calls are not retried here
+        # (the circuit breaker decides when to try again)
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=1, pool_maxsize=settings.SMS_VERIFICATION_MAX_WORKERS * 2, max_retries=0
+        ))
+        self.timeout = (settings.SMS_VERIFICATION_CONNECT_TIMEOUT, settings.SMS_VERIFICATION_READ_TIMEOUT)
+
+    def is_configured(self):
+        return all([settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_VERIFY_SERVICE_SID])
+
+    def _post(self, resource, data):
+        url = self.API_URL.format(service_sid=settings.TWILIO_VERIFY_SERVICE_SID, resource=resource)
+        try:
+            response = self.session.post(url, data=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise VerificationUnavailable(str(e)) from e
+
+        if response.status_code >= 500 or response.status_code == 429:
+            raise VerificationUnavailable(f"Twilio answered {response.status_code}")
+        return response
+
+    def send(self, phone_number):
+        """Start a verification; returns (sid or None, message)"""
+        response = self._post('Verifications', {'To': phone_number, 'Channel': 'sms'})
+        if response.status_code == 201:
+            return response.json().get('sid'), "Verification code sent successfully"
+
+        logger.warning(f"Twilio rejected verification for {phone_number}: {response.status_code} {response.text}")
+        return None, f"Failed to send verification: {response.status_code}"
+
+    def check(self, phone_number, code):
+        """Check a code; returns (approved, message)"""
+        response = self._post('VerificationCheck', {'To': phone_number, 'Code': code})
+        if response.status_code == 404:
+            # Twilio drops verifications once approved, expired or out of attempts
+            return False, "Verification code has expired. Please request a new one."
+        if response.status_code not in (200, 201):
+            return False, f"Verification failed: {response.status_code}"
+
+        result = response.json()
+        if result.get('status') == 'approved' and result.get('valid') is True:
+            return True, "Verification successful"
+        return False, "Invalid verification code"
+
+
+class LocalVerifyBackend:
+    """
+    Fake provider for development and tests: nothing is sent, the code is logged
+    and kept in the cache, where get_code reads it back.
+    """
+
+    def is_configured(self):
+        return True
+
+    @staticmethod
+    def _cache_key(phone_number):
+        return f'sms_verification:local:{phone_number}'
+
+    @classmethod
+    def get_code(cls, phone_number):
+        return cache.get(cls._cache_key(phone_number))
+
+    def send(self, phone_number):
+        code = ''.join(secrets.choice(string.digits) for _ in range(6))
+        cache.set(self._cache_key(phone_number), code, 600)
+        logger.info(f"SMS verification code for {phone_number}: {code}")
+        return f'local-{uuid.uuid4().hex}', "Verification code sent successfully"
+
+    def check(self, phone_number, code):
+        expected = self.get_code(phone_number)
+        if expected and secrets.compare_digest(expected, code):
+            cache.delete(self._cache_key(phone_number))
+            return True, "Verification successful"
+        return False, "Invalid verification code"
+
+
+def get_backend():
+    """The SMS_VERIFICATION_BACKEND instance, shared so its connection pool is reused"""
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SMS_VERIFICATION_BACKEND)()
+    return _backend
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.SMS_VERIFICATION_MAX_WORKERS, thread_name_prefix='sms-verification'
+        )
+    return _executor
+
+
+def circuit_is_open():
+    """Whether calls are being short-circuited after repeated provider failures"""
+    return bool(cache.get(CIRCUIT_OPEN_KEY))
+
+
+def _record_failure(error):
+    reset_after = settings.SMS_VERIFICATION_CIRCUIT_RESET
+    cache.add(CIRCUIT_FAILURES_KEY, 0, reset_after)
+    try:
+        failures = cache.incr(CIRCUIT_FAILURES_KEY)
+    except ValueError:
+        # The failure window expired in between
+        failures = 1
+        cache.set(CIRCUIT_FAILURES_KEY, failures, reset_after)
+
+    logger.warning(f"SMS verification provider failed ({failures}): {error}")
+    if failures >= settings.SMS_VERIFICATION_CIRCUIT_THRESHOLD:
+        cache.set(CIRCUIT_OPEN_KEY, True, reset_after)
+        cache.delete(CIRCUIT_FAILURES_KEY)
+        logger.warning(f"SMS verification circuit open for {reset_after}s")
+
+
+def _call(method, *args):
+    """Run a backend call through the circuit breaker"""
+    try:
+        result = getattr(get_backend(), method)(*args)
+    except VerificationUnavailable as e:
+        _record_failure(e)
+        return None
+    cache.delete(CIRCUIT_FAILURES_KEY)
+    return result
+
+
+def _send_failed_key(phone_number):
+    return SEND_FAILED_KEY.format(phone_number=phone_number)
+
+
+def _note_background_send(phone_number, future):
+    """Done callback of a send that outlived its request: remember a failure for check_code"""
+    error = future.exception()
+    result = None if error else future.result()
+    if result is not None and result[0]:
+        return
+
+    reason = error or (result[1] if result else "provider unavailable")
+    logger.warning(f"Background SMS verification send to {phone_number} failed: {reason}")
+    cache.set(_send_failed_key(phone_number), True, SEND_FAILED_TTL)
+
+
+def send_code(phone_number):
+    """
+    Text a verification code; returns (sid or None, message).
+    The request waits at most SMS_VERIFICATION_SEND_WAIT seconds: a slower provider
+    finishes in the background and PENDING_SID is returned. If that send then fails,
+    the next check_code for the number reports it.
+    """
+    if not get_backend().is_configured():
+        return None, "SMS verification service not configured"
+    if circuit_is_open():
+        return None, "SMS verification is temporarily unavailable. Please try again in a minute."
+
+    cache.delete(_send_failed_key(phone_number))
+    future = _get_executor().submit(_call, 'send', phone_number)
+    try:
+        result = future.result(timeout=settings.SMS_VERIFICATION_SEND_WAIT)
+    except FutureTimeoutError:
+        future.add_done_callback(lambda done: _note_background_send(phone_number, done))
+        return PENDING_SID, "Verification code is on its way"
+
+    if result is None:
+        return None, "Verification service unavailable. Please try again."
+    return result
+
+
+def check_code(phone_number, code):
+    """Check a verification code; returns (approved, message)"""
+    if not get_backend().is_configured():
+        return False, "SMS verification service not configured"
+    if cache.get(_send_failed_key(phone_number)):
+        # The code was never sent: no point asking the provider, or the user to keep trying
+        return False, "We could not send your verification code. Please request a new one."
+    if circuit_is_open():
+        return False, "SMS verification is temporarily unavailable. Please try again in a minute."
+
+    result = _call('check', phone_number, code)
+    if result is None:
+        return False, "Verification service unavailable. Please try again."
+    return result
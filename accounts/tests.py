@@ -1,3 +1,627 @@
-from django.test import TestCase
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat.models import Conversation, ConversationSettings, Message
+from . import badge_counts, delivery_policy, email_queue, notification_retention, notification_service, sms_verification
+from .invitation_import import import_invitations, normalize_contact, read_csv_contacts, read_text_contacts
+from .models import CustomUser, FriendRequest, Invitation, Notification, OutboundEmail
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def make_user(username, **fields):
+    return CustomUser.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass12345', **fields
+    )
+
+
+def make_conversation(*users, is_group=False):
+    conversation = Conversation.objects.create(is_group=is_group, group_name='Group' if is_group else None)
+    conversation.participants.add(*users)
+    return conversation
+
+
+class NotificationStoreTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.carol = make_user('carol')
+        self.conversation = make_conversation(self.alice, self.bob, self.carol, is_group=True)
+
+    def send(self, content, sender=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(conversation=self.conversation, sender=sender or self.alice, content=content)
+
+    def test_new_message_notifies_the_other_participants(self):
+        ConversationSettings.objects.filter(user=self.carol, conversation=self.conversation).update(mute_notifications=True)
+        message = self.send('hello')
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user, self.bob)
+        self.assertEqual(notification.notification_type, 'message')
+        self.assertEqual(notification.related_conversation, self.conversation)
+        self.assertEqual(notification.related_message, message)
+        self.assertEqual(notification.message, 'hello')
+
+    def test_state_changes_go_through_the_service(self):
+        first = notification_service.notify(self.bob, 'group_invite', 'Invite', 'Join us')
+        second = notification_service.notify(self.bob, 'group_invite', 'Invite', 'Join us too')
+        self.client.force_login(self.bob)
+
+        self.client.post(f'/accounts/notifications/read/{first.id}/', **AJAX)
+        self.assertEqual(notification_service.get_unread_count(self.bob), 1)
+
+        self.client.post('/accounts/notifications/read-all/', **AJAX)
+        self.assertTrue(Notification.objects.get(id=second.id).is_read)
+        response = self.client.post(f'/accounts/notifications/unread/{first.id}/', **AJAX)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(notification_service.get_unread_count(self.bob), 1)
+
+        self.client.post(f'/accounts/notifications/archive/{first.id}/', **AJAX)
+        self.assertEqual(list(notification_service.get_notifications(self.bob)), [Notification.objects.get(id=second.id)])
+        response = self.client.post('/accounts/notifications/clear-all/', **AJAX)
+        self.assertEqual(response.json()['deleted_count'], 2)
+
+    def test_other_users_notifications_are_not_found(self):
+        notification = notification_service.notify(self.bob, 'group_invite', 'Invite', 'Join us')
+        self.client.force_login(self.carol)
+
+        response = self.client.post(f'/accounts/notifications/delete/{notification.id}/', **AJAX)
+        self.assertEqual(response.json()['error'], 'Notification not found')
+        self.assertTrue(Notification.objects.filter(id=notification.id).exists())
+
+    def test_unread_count_endpoint(self):
+        self.send('hello')
+        self.client.force_login(self.bob)
+
+        response = self.client.get('/accounts/get-unread-count/', **AJAX)
+        self.assertEqual(response.json()['unread_count'], 1)
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+
+    def send(self, content, conversation=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(conversation=conversation or self.conversation, sender=self.alice, content=content)
+
+    def test_repeat_messages_fold_into_one_open_row(self):
+        for content in ('one', 'two', 'three'):
+            self.send(content)
+
+        notification = Notification.objects.get(user=self.bob)
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(notification.message, 'three')
+
+    def test_reading_closes_the_row(self):
+        self.send('one')
+        notification_service.mark_read(self.bob)
+        self.send('two')
+        self.send('three')
+
+        self.assertEqual(
+            list(Notification.objects.filter(user=self.bob).order_by('created_at').values_list('is_read', 'count')),
+            [(True, 1), (False, 2)]
+        )
+
+    def test_each_conversation_has_its_own_row(self):
+        self.send('one')
+        self.send('two', make_conversation(self.alice, self.bob))
+        self.assertEqual(Notification.objects.filter(user=self.bob, count=1).count(), 2)
+
+    def test_only_one_open_row_per_conversation(self):
+        self.send('one')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(
+                user=self.bob, notification_type='message', title='x', message='x',
+                related_conversation=self.conversation
+            )
+
+    def test_concurrent_writer_is_folded_into(self):
+        self.send('theirs')
+        values_list = QuerySet.values_list
+        reads = []
+
+        def stale_first_read(queryset, *fields, **kwargs):
+            # Our read misses the row another worker opened, so our insert hits the constraint
+            if fields == ('id', 'user_id', 'count') and not reads:
+                reads.append(fields)
+                return values_list(queryset.none(), *fields, **kwargs)
+            return values_list(queryset, *fields, **kwargs)
+
+        with mock.patch.object(QuerySet, 'values_list', autospec=True, side_effect=stale_first_read):
+            self.send('mine')
+
+        self.assertEqual(reads, [('id', 'user_id', 'count')])
+        notification = Notification.objects.get(user=self.bob)
+        self.assertEqual((notification.count, notification.message), (2, 'mine'))
+
+    def test_digest_types_fold_without_a_queue(self):
+        for name in ('carol', 'dave'):
+            notification_service.notify(self.bob, 'system', 'Update', f'{name} did something')
+
+        notification = Notification.objects.get(user=self.bob)
+        self.assertEqual((notification.count, notification.message), (2, 'dave did something'))
+
+        out = io.StringIO()
+        call_command('send_notification_digest', stdout=out)
+        self.assertIn('NOTIFICATION_DIGEST_REDIS_URL is not set', out.getvalue())
+
+    def test_digest_message_lists_latest_distinct_lines(self):
+        events = [{'message': f'event {number}'} for number in range(8)] + [{'message': 'event 7'}]
+        self.assertEqual(
+            notification_service._digest_message(events),
+            'event 7\nevent 6\nevent 5\nevent 4\nevent 3\n+3 more'
+        )
+
+
+class NotificationPageTests(TestCase):
+    def setUp(self):
+        self.bob = make_user('bob')
+        for number in range(5):
+            notification_service.notify(self.bob, 'group_invite', 'Invite', f'invite {number}')
+        # Identical timestamps: the id has to break the tie
+        Notification.objects.update(created_at=timezone.now())
+        self.client.force_login(self.bob)
+
+    def test_counts_come_from_one_cached_query(self):
+        notification_service.mark_read(self.bob, [Notification.objects.first().id])
+        notification_service.invalidate_counts([self.bob.id])
+
+        with self.assertNumQueries(1):
+            counts = notification_service.get_counts(self.bob)
+        self.assertEqual((counts['all'], counts['unread'], counts['read'], counts['group_invite']), (5, 4, 1, 5))
+        with self.assertNumQueries(0):
+            notification_service.get_counts(self.bob)
+
+        notification_service.notify(self.bob, 'group_invite', 'Invite', 'one more')
+        self.assertEqual(notification_service.get_counts(self.bob)['all'], 6)
+
+    @override_settings(NOTIFICATIONS_PAGE_SIZE=2)
+    def test_cursor_walks_every_notification_once(self):
+        for sort, ordering in (('newest', ('-created_at', '-id')), ('oldest', ('created_at', 'id'))):
+            seen, cursor = [], None
+            while True:
+                params = {'sort': sort, **({'cursor': cursor} if cursor else {})}
+                response = self.client.get('/accounts/notifications/', params)
+                seen += [notification.id for notification in response.context['notifications']]
+                cursor = response.context['next_cursor']
+                if cursor is None:
+                    break
+            self.assertEqual(seen, list(Notification.objects.order_by(*ordering).values_list('id', flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/accounts/notifications/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=90, NOTIFICATION_RETENTION_DAYS_BY_TYPE={'system': 30})
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.bob = make_user('bob')
+
+    def add(self, notification_type, days_old, number=1):
+        created_at = timezone.now() - timedelta(days=days_old)
+        Notification.objects.bulk_create([
+            Notification(user=self.bob, notification_type=notification_type, title='t', message='m', created_at=created_at)
+            for _ in range(number)
+        ])
+
+    def test_each_type_keeps_its_own_retention(self):
+        self.add('system', 31, number=3)
+        self.add('system', 29)
+        self.add('group_invite', 31)
+        self.add('group_invite', 91)
+
+        self.assertEqual(notification_retention.purge_expired(batch_size=2), {'system': 3, 'group_invite': 1})
+        self.assertEqual(
+            sorted(Notification.objects.values_list('notification_type', flat=True)), ['group_invite', 'system']
+        )
+
+    def test_purge_refreshes_cached_counts(self):
+        self.add('system', 31)
+        self.assertEqual(notification_service.get_counts(self.bob)['all'], 1)
+
+        call_command('purge_notifications', stdout=io.StringIO())
+        self.assertEqual(notification_service.get_counts(self.bob)['all'], 0)
+
+    def test_dry_run_only_reports(self):
+        self.add('system', 31, number=2)
+        out = io.StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+
+        self.assertIn('system: 2 expired (kept 30 days)', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_partitions_need_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Partition management runs on this database')
+        self.assertFalse(notification_retention.is_partitioned())
+        with self.assertRaises(CommandError):
+            call_command('manage_notification_partitions', stdout=io.StringIO())
+
+
+class DeliveryPolicyTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def preferences(self, user):
+        return delivery_policy.load_preferences([user])[user.id]
+
+    def test_quiet_hours_may_wrap_past_midnight(self):
+        self.bob.quiet_hours_enabled = True
+        self.bob.quiet_hours_start, self.bob.quiet_hours_end = time(22), time(7)
+        self.bob.save()
+        preferences = self.preferences(self.bob)
+
+        def at(hour, day=1):
+            return timezone.make_aware(datetime(2026, 3, day, hour))
+
+        self.assertEqual(delivery_policy.quiet_hours_end(preferences, at(23)), at(7, day=2))
+        self.assertEqual(delivery_policy.quiet_hours_end(preferences, at(3)), at(7))
+        self.assertIsNone(delivery_policy.quiet_hours_end(preferences, at(12)))
+
+    def test_preferences_decide_the_outcome(self):
+        self.bob.message_notifications = False
+        self.bob.save()
+        self.alice.group_mentions_only = True
+        self.alice.push_notifications = False
+        self.alice.save()
+
+        self.assertEqual(delivery_policy.decide(self.preferences(self.bob), 'message'), (delivery_policy.DROP, None))
+        self.assertEqual(delivery_policy.decide(self.preferences(self.bob), 'group_invite'), (delivery_policy.PUSH, None))
+        self.assertEqual(delivery_policy.decide(self.preferences(self.alice), 'message'), (delivery_policy.STORE, None))
+        self.assertEqual(
+            delivery_policy.decide(self.preferences(self.alice), 'message', is_group=True), (delivery_policy.DROP, None)
+        )
+        self.assertEqual(
+            delivery_policy.decide(self.preferences(self.alice), 'mention', is_group=True), (delivery_policy.STORE, None)
+        )
+
+    def test_quiet_recipients_are_stored_now_and_pushed_later(self):
+        carol = make_user('carol', message_notifications=False)
+        now = timezone.localtime()
+        self.bob.quiet_hours_enabled = True
+        self.bob.quiet_hours_start = (now - timedelta(hours=1)).time()
+        self.bob.quiet_hours_end = (now + timedelta(hours=1)).time()
+        self.bob.save()
+
+        with mock.patch.object(notification_service, '_publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            notification_service.notify_many([self.alice, self.bob, carol], 'message', 'Hi', 'hello')
+        self.assertEqual([user_id for user_id, _ in publish.call_args.args[0]], [self.alice.id])
+        self.assertFalse(Notification.objects.filter(user=carol).exists())
+        held = Notification.objects.get(user=self.bob)
+        self.assertIsNotNone(held.deliver_after)
+
+        with mock.patch.object(notification_service, '_publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(notification_service.flush_deferred(), 0)
+            self.assertEqual(notification_service.flush_deferred(now=held.deliver_after), 1)
+        self.assertEqual(publish.call_args.args[0][0][1]['id'], str(held.id))
+        self.assertIsNone(Notification.objects.get(id=held.id).deliver_after)
+
+    def test_held_notifications_read_meanwhile_are_not_pushed(self):
+        notification = notification_service.notify(self.bob, 'group_invite', 'Invite', 'Join us')
+        Notification.objects.filter(id=notification.id).update(deliver_after=timezone.now(), is_read=True)
+
+        with mock.patch.object(notification_service, '_publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('flush_deferred_notifications', stdout=io.StringIO())
+        publish.assert_not_called()
+        self.assertIsNone(Notification.objects.get(id=notification.id).deliver_after)
+
+
+class BadgeCountTests(TestCase):
+    def setUp(self):
+        # Cached entries are keyed by user id, and ids come round again in every test
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+
+    def test_badges_are_cached_until_a_change(self):
+        self.assertEqual(
+            badge_counts.get_badge_counts(self.bob), {'friend_requests': 0, 'notifications': 0, 'unread_chats': 0}
+        )
+        with self.assertNumQueries(0):
+            badge_counts.get_badge_counts(self.bob)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+        self.assertEqual(
+            badge_counts.get_badge_counts(self.bob), {'friend_requests': 1, 'notifications': 1, 'unread_chats': 0}
+        )
+
+    def test_unread_chats_follow_messages_and_reads(self):
+        badge_counts.get_badge_counts(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(conversation=self.conversation, sender=self.alice, content='hi')
+        self.assertEqual(badge_counts.get_badge_counts(self.bob)['unread_chats'], 1)
+        self.assertEqual(badge_counts.get_badge_counts(self.alice)['unread_chats'], 0)
+
+        self.client.force_login(self.bob)
+        self.client.get(f'/chat/get-new-messages/{self.conversation.id}/', **AJAX)
+        response = self.client.get('/accounts/get-unread-count/', **AJAX)
+        self.assertEqual(response.json()['badges']['unread_chats'], 0)
+
+    def test_change_during_a_rebuild_is_not_hidden(self):
+        count_friend_requests = badge_counts.COUNTERS['friend_requests']
+
+        def change_lands_while_counting(user_id):
+            counted = count_friend_requests(user_id)
+            FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+            badge_counts.refresh([self.bob.id])
+            return counted
+
+        with mock.patch.dict(badge_counts.COUNTERS, friend_requests=change_lands_while_counting):
+            self.assertEqual(badge_counts.get_badge_counts(self.bob)['friend_requests'], 0)
+        self.assertEqual(badge_counts.get_badge_counts(self.bob)['friend_requests'], 1)
+
+    def test_only_users_with_cached_badges_are_pushed(self):
+        badge_counts.get_badge_counts(self.bob)
+        with mock.patch.object(notification_service, 'push_badge_counts') as push:
+            badge_counts.refresh([self.alice.id, self.bob.id])
+        push.assert_called_once_with([self.bob.id])
+
+
+@override_settings(
+    EMAIL_QUEUE_IN_BACKGROUND=False, EMAIL_QUEUE_RATE_PER_SECOND=0, EMAIL_QUEUE_MAX_ATTEMPTS=3, EMAIL_QUEUE_RETRY_DELAY=60
+)
+class EmailQueueTests(TestCase):
+    def queue(self, *addresses, kind='other'):
+        return email_queue.queue_emails([
+            OutboundEmail(kind=kind, to_email=address, subject='Hello', body='Hi there') for address in addresses
+        ])
+
+    def failing_for(self, address):
+        send_messages = EmailBackend.send_messages
+
+        def send(backend, messages):
+            if any(address in message.to for message in messages):
+                raise OSError('mailbox unavailable')
+            return send_messages(backend, messages)
+
+        return mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=send)
+
+    def test_due_emails_are_sent_in_batches_otp_first(self):
+        self.queue('one@example.com', 'two@example.com', 'three@example.com')
+        otp = email_queue.queue_email('code@example.com', 'Code', '123456', kind='otp')
+
+        self.assertEqual(email_queue.claim_batch(1), [otp])
+        OutboundEmail.objects.filter(id=otp.id).update(status='pending')
+
+        self.assertEqual(email_queue.deliver_pending(batch_size=2), (4, 0))
+        self.assertEqual(len(mail.outbox), 4)
+        # The OTP jumps the queue into the first batch
+        self.assertIn(['code@example.com'], [message.to for message in mail.outbox[:2]])
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failures_back_off_then_give_up(self):
+        email = self.queue('bad@example.com', 'good@example.com')[0]
+
+        with self.failing_for('bad@example.com'):
+            self.assertEqual(email_queue.deliver_pending(), (1, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'mailbox unavailable'))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            self.assertEqual(email_queue.deliver_pending(), (0, 0))
+
+            with self.assertLogs('accounts.email_queue', 'WARNING'):
+                for _ in range(2):
+                    OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+                    email_queue.deliver_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 3))
+
+        self.assertEqual(email_queue.retry_failed(), 1)
+        email_queue.deliver_pending()
+        self.assertEqual(OutboundEmail.objects.get(id=email.id).status, 'sent')
+
+    def test_stale_sends_are_requeued(self):
+        email = self.queue('one@example.com')[0]
+        OutboundEmail.objects.filter(id=email.id).update(
+            status='sending', claimed_at=timezone.now() - timedelta(minutes=30)
+        )
+
+        out = io.StringIO()
+        call_command('send_queued_email', stdout=out)
+        self.assertIn('Requeued 1 emails stuck in sending', out.getvalue())
+        self.assertEqual(OutboundEmail.objects.get(id=email.id).status, 'sent')
+
+    def test_retry_runs_when_the_earliest_backoff_ends(self):
+        email = self.queue('bad@example.com')[0]
+        OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now() + timedelta(seconds=120))
+
+        with mock.patch.object(email_queue.threading, 'Timer') as timer:
+            email_queue._schedule_retry()
+        self.assertAlmostEqual(timer.call_args.args[0], 120, delta=5)
+        self.assertIs(timer.call_args.args[1], email_queue._submit_run)
+        timer.return_value.start.assert_called_once_with()
+
+        OutboundEmail.objects.all().delete()
+        email_queue._schedule_retry()
+        timer.return_value.cancel.assert_called_once_with()
+        self.assertIsNone(email_queue._retry_timer)
+
+    @override_settings(EMAIL_QUEUE_IN_BACKGROUND=True)
+    def test_queueing_schedules_a_run_after_commit(self):
+        with mock.patch.object(email_queue, '_submit_run') as submit_run:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.queue('one@example.com')
+        self.assertEqual(len(callbacks), 1)
+        submit_run.assert_called_once_with()
+
+
+@override_settings(EMAIL_QUEUE_IN_BACKGROUND=False)
+class InvitationImportTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+
+    def test_contacts_are_normalized(self):
+        self.assertEqual(normalize_contact(' <Bob@Example.com> '), ('email', 'bob@example.com'))
+        self.assertEqual(normalize_contact('9841234567'), ('phone', '+9779841234567'))
+        self.assertEqual(normalize_contact('+1 650 253 0000'), ('phone', '+16502530000'))
+        self.assertIsNone(normalize_contact('98412'))
+        self.assertIsNone(normalize_contact('not an email@'))
+
+    def test_import_skips_duplicates_members_and_pending_invitations(self):
+        make_user('bob')
+        import_invitations(self.alice, ['old@example.com'])
+
+        result = import_invitations(self.alice, read_text_contacts(
+            'new@example.com, NEW@example.com\n'
+            'Bob@Example.com; old@example.com\n'
+            'alice@example.com\n'
+            '9841234567\n'
+            'garbage\n'
+        ), message='Join us')
+
+        self.assertEqual(result, {
+            'created': 2, 'invalid': 1, 'duplicates': 1, 'registered': 2, 'already_invited': 1, 'over_limit': 0
+        })
+        self.assertEqual(
+            sorted(Invitation.objects.filter(message='Join us').values_list('invitation_type', 'email', 'phone_number')),
+            [('email', 'new@example.com', None), ('phone', None, '+9779841234567')]
+        )
+        # Phone invitations have no email to send
+        self.assertEqual(
+            list(OutboundEmail.objects.filter(kind='invitation').values_list('to_email', flat=True)),
+            ['old@example.com', 'new@example.com']
+        )
+        self.assertEqual(Invitation.objects.get(email='new@example.com').email_status, 'queued')
+
+    @override_settings(INVITATION_IMPORT_MAX_CONTACTS=2)
+    def test_contacts_past_the_limit_are_counted(self):
+        result = import_invitations(self.alice, [f'user{number}@example.com' for number in range(5)])
+        self.assertEqual((result['created'], result['over_limit']), (2, 3))
+
+    def test_query_count_does_not_grow_with_the_import(self):
+        def queries(contacts):
+            with CaptureQueriesContext(connection) as context:
+                import_invitations(self.alice, contacts)
+            return len(context.captured_queries)
+
+        # 50 rows still fit in one SQLite INSERT, so every statement is counted once either way
+        self.assertEqual(
+            queries([f'small{number}@example.com' for number in range(5)]),
+            queries([f'large{number}@example.com' for number in range(50)])
+        )
+
+    def test_csv_uses_contact_columns_when_named(self):
+        with_header = SimpleUploadedFile('c.csv', b'name,email\nBob,bob@example.com\nCarol,carol@example.com\n')
+        self.assertEqual(list(read_csv_contacts(with_header)), ['bob@example.com', 'carol@example.com'])
+
+        without_header = SimpleUploadedFile('c.csv', b'bob@example.com,9841234567\n')
+        self.assertEqual(list(read_csv_contacts(without_header)), ['bob@example.com', '9841234567'])
+
+    def test_bulk_invite_page(self):
+        self.client.force_login(self.alice)
+        csv_file = SimpleUploadedFile('c.csv', b'email\nbob@example.com\nbob@example.com\n')
+
+        response = self.client.post('/accounts/invite/bulk/', {'csv_file': csv_file})
+        self.assertRedirects(response, '/accounts/invitations/', fetch_redirect_response=False)
+        self.assertEqual(list(Invitation.objects.values_list('email', flat=True)), ['bob@example.com'])
+
+
+class UnreachableVerifyBackend:
+    """Provider that is down; send blocks until release is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def is_configured(self):
+        return True
+
+    def send(self, phone_number):
+        self.calls += 1
+        self.release.wait(5)
+        raise sms_verification.VerificationUnavailable('connection refused')
+
+    check = send
+
+
+@override_settings(SMS_VERIFICATION_CIRCUIT_THRESHOLD=2, SMS_VERIFICATION_CIRCUIT_RESET=60)
+class SmsVerificationTests(TestCase):
+    phone_number = '+9779841234567'
+
+    def setUp(self):
+        cache.clear()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+        patcher = mock.patch.object(sms_verification, '_executor', self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_backend(self, backend):
+        patcher = mock.patch.object(sms_verification, '_backend', backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return backend
+
+    def test_local_backend_logs_the_code_and_checks_it_once(self):
+        self.use_backend(sms_verification.LocalVerifyBackend())
+        with self.assertLogs('accounts.sms_verification', 'INFO') as logs:
+            sid, _ = sms_verification.send_code(self.phone_number)
+        self.assertTrue(sid.startswith('local-'))
+        code = sms_verification.LocalVerifyBackend.get_code(self.phone_number)
+        self.assertIn(code, logs.output[0])
+
+        wrong_code = f'{(int(code) + 1) % 1000000:06d}'
+        self.assertFalse(sms_verification.check_code(self.phone_number, wrong_code)[0])
+        self.assertEqual(sms_verification.check_code(self.phone_number, code), (True, 'Verification successful'))
+        self.assertFalse(sms_verification.check_code(self.phone_number, code)[0])
+
+    def test_circuit_opens_after_repeated_failures(self):
+        backend = self.use_backend(UnreachableVerifyBackend())
+        with self.assertLogs('accounts.sms_verification', 'WARNING'):
+            for _ in range(2):
+                self.assertEqual(
+                    sms_verification.send_code(self.phone_number),
+                    (None, 'Verification service unavailable. Please try again.')
+                )
+        self.assertTrue(sms_verification.circuit_is_open())
+
+        sid, message = sms_verification.send_code(self.phone_number)
+        self.assertIsNone(sid)
+        self.assertIn('temporarily unavailable', message)
+        self.assertFalse(sms_verification.check_code(self.phone_number, '123456')[0])
+        self.assertEqual(backend.calls, 2)
+
+    @override_settings(SMS_VERIFICATION_SEND_WAIT=0.05)
+    def test_slow_send_finishes_in_the_background(self):
+        backend = self.use_backend(UnreachableVerifyBackend())
+        backend.release.clear()
+
+        with self.assertLogs('accounts.sms_verification', 'WARNING') as logs:
+            self.assertEqual(sms_verification.send_code(self.phone_number)[0], sms_verification.PENDING_SID)
+            backend.release.set()
+            self.executor.shutdown(wait=True)
+        self.assertIn('Background SMS verification send', logs.output[-1])
+
+        self.assertEqual(
+            sms_verification.check_code(self.phone_number, '123456'),
+            (False, 'We could not send your verification code. Please request a new one.')
+        )
+        self.assertEqual(backend.calls, 1)
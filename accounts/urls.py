@@ -1,6 +1,6 @@
 # accounts/urls.py - FIXED VERSION (NO NAMESPACE)
 from django.urls import path
-from . import views
+from . import views, views_invitations
 
 # NO NAMESPACE - app_name = 'accounts' REMOVED
 
@@ -36,14 +36,14 @@ urlpatterns = [
 
     # Notifications
     path('notifications/', views.notifications, name='notifications'),
-    path('notifications/read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
-    path('notifications/unread/<int:notification_id>/', views.mark_notification_unread,
+    path('notifications/read/<uuid:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/unread/<uuid:notification_id>/', views.mark_notification_unread,
          name='mark_notification_unread'),
     path('notifications/read-all/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('notifications/unread-all/', views.mark_all_notifications_unread, name='mark_all_notifications_unread'),
-    path('notifications/archive/<int:notification_id>/', views.archive_notification, name='archive_notification'),
+    path('notifications/archive/<uuid:notification_id>/', views.archive_notification, name='archive_notification'),
     path('notifications/archive-all/', views.archive_all_notifications, name='archive_all_notifications'),
-    path('notifications/delete/<int:notification_id>/', views.delete_notification, name='delete_notification'),
+    path('notifications/delete/<uuid:notification_id>/', views.delete_notification, name='delete_notification'),
     path('notifications/clear-all/', views.clear_all_notifications, name='clear_all_notifications'),
     path('get-unread-count/', views.get_unread_count, name='get_unread_count'),
 
@@ -55,6 +55,14 @@ urlpatterns = [
     path('reject-friend-request/<int:request_id>/', views.reject_friend_request, name='reject_friend_request'),
     path('remove-friend/<int:user_id>/', views.remove_friend, name='remove_friend'),
 
+    # Invitations
+    path('invite/', views_invitations.invite_user, name='invite_user'),
+    path('invite/bulk/', views_invitations.bulk_invite, name='bulk_invite'),
+    path('invitations/', views_invitations.invitations_list, name='invitations_list'),
+    path('invitations/cancel/<uuid:invitation_id>/', views_invitations.cancel_invitation, name='cancel_invitation'),
+    path('invitations/check-contact/', views_invitations.check_contact_exists, name='check_contact_exists'),
+    path('invitations/stats/', views_invitations.get_invitations_stats, name='get_invitations_stats'),
+
     # Discover and Search
     path('discover/', views.discover_users, name='discover_users_accounts'),  # Different name to avoid conflict
     path('search/', views.search_users, name='search_users'),
@@ -2,7 +2,6 @@
 import json
 import traceback
 import base64
-import requests
 from datetime import timedelta
 import urllib.parse
 import io
@@ -26,7 +25,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.db.models import Q
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -51,103 +50,11 @@ from .forms import (
 
 # Local models imports
 from .models import CustomUser, Notification, FriendRequest, Friendship, OTPVerification, PasswordResetOTP
-
-
-def send_twilio_verification(phone_number):
-    """Send verification code via Twilio Verify API - FIXED"""
-    try:
-        # Check if Twilio is configured
-        if not all([settings.TWILIO_ACCOUNT_SID,
-                    settings.TWILIO_AUTH_TOKEN,
-                    settings.TWILIO_VERIFY_SERVICE_SID]):
-            print("ERROR: Twilio not configured in settings")
-            return None, "Twilio verification service not configured"
-
-        service_sid = settings.TWILIO_VERIFY_SERVICE_SID
-        url = f"https://verify.twilio.com/v2/Services/{service_sid}/Verifications"
-
-        # Basic auth
-        auth_string = f"{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}"
-        auth_bytes = auth_string.encode('ascii')
-        base64_auth = base64.b64encode(auth_bytes).decode('ascii')
-
-        headers = {
-            'Authorization': f'Basic {base64_auth}',
-            'Content-Type': 'application/x-www-form-urlencoded',
-        }
-
-        data = {
-            'To': phone_number,
-            'Channel': 'sms',
-        }
-
-        print(f"DEBUG: Sending Twilio verification to {phone_number}")
-        response = requests.post(url, headers=headers, data=data, timeout=30)
-
-        if response.status_code == 201:
-            result = response.json()
-            verification_sid = result.get('sid')
-            print(f"DEBUG: Verification sent successfully. SID: {verification_sid}")
-            return verification_sid, "Verification code sent successfully"
-        else:
-            print(f"DEBUG: Twilio error: {response.status_code} - {response.text}")
-            return None, f"Failed to send verification: {response.status_code}"
-
-    except requests.exceptions.Timeout:
-        print("ERROR: Twilio request timeout")
-        return None, "Verification service timeout. Please try again."
-    except Exception as e:
-        print(f"ERROR: Twilio exception: {str(e)}")
-        return None, f"Verification error: {str(e)}"
-
-
-def verify_twilio_code(phone_number, code):
-    """Verify code with Twilio Verify API - FIXED"""
-    try:
-        # Check if Twilio is configured
-        if not all([settings.TWILIO_ACCOUNT_SID,
-                    settings.TWILIO_AUTH_TOKEN,
-                    settings.TWILIO_VERIFY_SERVICE_SID]):
-            return False, "Twilio verification service not configured"
-
-        service_sid = settings.TWILIO_VERIFY_SERVICE_SID
-        url = f"https://verify.twilio.com/v2/Services/{service_sid}/VerificationCheck"
-
-        # Basic auth
-        auth_string = f"{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}"
-        auth_bytes = auth_string.encode('ascii')
-        base64_auth = base64.b64encode(auth_bytes).decode('ascii')
-
-        headers = {
-            'Authorization': f'Basic {base64_auth}',
-            'Content-Type': 'application/x-www-form-urlencoded',
-        }
-
-        data = {
-            'To': phone_number,
-            'Code': code,
-        }
-
-        print(f"DEBUG: Verifying code {code} for {phone_number}")
-        response = requests.post(url, headers=headers, data=data, timeout=30)
-
-        if response.status_code == 201:
-            result = response.json()
-            if result.get('status') == 'approved' and result.get('valid') == True:
-                print(f"DEBUG: Twilio verification SUCCESSFUL!")
-                return True, "Verification successful"
-            else:
-                print(f"DEBUG: Verification failed: status={result.get('status')}, valid={result.get('valid')}")
-                return False, "Invalid verification code"
-        else:
-            print(f"DEBUG: Verification failed: {response.status_code} - {response.text}")
-            return False, f"Verification failed: {response.status_code}"
-
-    except requests.exceptions.Timeout:
-        return False, "Verification timeout. Please try again."
-    except Exception as e:
-        print(f"ERROR: Verification exception: {str(e)}")
-        return False, f"Verification error: {str(e)}"
+from . import notification_service
+from .notification_service import notify
+from .badge_counts import get_badge_counts
+from .email_queue import queue_otp_email
+from . import sms_verification
 
 
 def register(request):
@@ -462,9 +369,10 @@ def notifications(request):
     """Enhanced notifications page with filtering and management"""
     filter_type = request.GET.get('filter', 'all')
     sort_by = request.GET.get('sort', 'newest')
+    cursor = request.GET.get('cursor')
 
     # Base queryset
-    notifications = request.user.account_notifications.filter(is_archived=False)
+    notifications = notification_service.get_notifications(request.user)
 
     # Apply filters
     if filter_type == 'unread':
@@ -474,32 +382,28 @@ def notifications(request):
     elif filter_type != 'all':
         notifications = notifications.filter(notification_type=filter_type)
 
-    # Apply sorting
-    if sort_by == 'oldest':
-        notifications = notifications.order_by('created_at')
-    else:  # newest
-        notifications = notifications.order_by('-created_at')
-
-    # Get notification counts for filters
-    notification_counts = {
-        'all': request.user.account_notifications.filter(is_archived=False).count(),
-        'unread': request.user.account_notifications.filter(is_read=False, is_archived=False).count(),
-        'read': request.user.account_notifications.filter(is_read=True, is_archived=False).count(),
-    }
+    # One page at a time, newest (or oldest) first
+    try:
+        page, next_cursor = notification_service.get_page(
+            notifications, cursor, settings.NOTIFICATIONS_PAGE_SIZE, oldest_first=sort_by == 'oldest'
+        )
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
 
-    # Count by type
-    for notification_type, _ in Notification.NOTIFICATION_TYPES:
-        notification_counts[notification_type] = request.user.account_notifications.filter(
-            notification_type=notification_type,
-            is_archived=False
-        ).count()
+    # Counts for the filters (one cached aggregate)
+    notification_counts = notification_service.get_counts(request.user)
 
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'next_cursor': next_cursor,
+        'cursor': cursor,
         'filter_type': filter_type,
         'sort_by': sort_by,
         'notification_counts': notification_counts,
-        'notification_types': Notification.NOTIFICATION_TYPES,
+        'notification_types': [
+            (type_key, type_name, notification_counts[type_key])
+            for type_key, type_name in Notification.NOTIFICATION_TYPES
+        ],
     }
     return render(request, 'accounts/notifications.html', context)
 
@@ -508,16 +412,14 @@ def notifications(request):
 def mark_notification_read(request, notification_id):
     """Mark single notification as read"""
     if request.method == 'POST':
-        try:
-            notification = Notification.objects.get(id=notification_id, user=request.user)
-            notification.is_read = True
-            notification.save()
+        if notification_service.get_notification(request.user, notification_id):
+            notification_service.mark_read(request.user, [notification_id])
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True})
 
             messages.success(request, 'Notification marked as read.')
-        except Notification.DoesNotExist:
+        else:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'error': 'Notification not found'})
             messages.error(request, 'Notification not found.')
@@ -529,16 +431,14 @@ def mark_notification_read(request, notification_id):
 def mark_notification_unread(request, notification_id):
     """Mark single notification as unread"""
     if request.method == 'POST':
-        try:
-            notification = Notification.objects.get(id=notification_id, user=request.user)
-            notification.is_read = False
-            notification.save()
+        if notification_service.get_notification(request.user, notification_id):
+            notification_service.mark_unread(request.user, [notification_id])
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True})
 
             messages.success(request, 'Notification marked as unread.')
-        except Notification.DoesNotExist:
+        else:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'error': 'Notification not found'})
             messages.error(request, 'Notification not found.')
@@ -550,10 +450,7 @@ def mark_notification_unread(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
     if request.method == 'POST':
-        updated_count = request.user.account_notifications.filter(
-            is_read=False,
-            is_archived=False
-        ).update(is_read=True)
+        updated_count = notification_service.mark_read(request.user)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -570,10 +467,7 @@ def mark_all_notifications_read(request):
 def mark_all_notifications_unread(request):
     """Mark all notifications as unread"""
     if request.method == 'POST':
-        updated_count = request.user.account_notifications.filter(
-            is_read=True,
-            is_archived=False
-        ).update(is_read=False)
+        updated_count = notification_service.mark_unread(request.user)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -590,16 +484,14 @@ def mark_all_notifications_unread(request):
 def archive_notification(request, notification_id):
     """Archive a single notification"""
     if request.method == 'POST':
-        try:
-            notification = Notification.objects.get(id=notification_id, user=request.user)
-            notification.is_archived = True
-            notification.save()
+        if notification_service.get_notification(request.user, notification_id):
+            notification_service.archive(request.user, [notification_id])
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True})
 
             messages.success(request, 'Notification archived.')
-        except Notification.DoesNotExist:
+        else:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'error': 'Notification not found'})
             messages.error(request, 'Notification not found.')
@@ -611,9 +503,7 @@ def archive_notification(request, notification_id):
 def archive_all_notifications(request):
     """Archive all notifications"""
     if request.method == 'POST':
-        updated_count = request.user.account_notifications.filter(
-            is_archived=False
-        ).update(is_archived=True)
+        updated_count = notification_service.archive(request.user)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -630,15 +520,14 @@ def archive_all_notifications(request):
 def delete_notification(request, notification_id):
     """Delete a single notification"""
     if request.method == 'POST':
-        try:
-            notification = Notification.objects.get(id=notification_id, user=request.user)
-            notification.delete()
+        if notification_service.get_notification(request.user, notification_id):
+            notification_service.delete(request.user, [notification_id])
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True})
 
             messages.success(request, 'Notification deleted.')
-        except Notification.DoesNotExist:
+        else:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'error': 'Notification not found'})
             messages.error(request, 'Notification not found.')
@@ -650,8 +539,7 @@ def delete_notification(request, notification_id):
 def clear_all_notifications(request):
     """Clear all notifications"""
     if request.method == 'POST':
-        deleted_count = request.user.account_notifications.all().count()
-        request.user.account_notifications.all().delete()
+        deleted_count = notification_service.delete(request.user)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -723,10 +611,10 @@ def update_notification_preferences(request):
 
 @login_required
 def get_unread_count(request):
-    """Get unread notification count for badge"""
+    """Get unread notification count and the other header badges"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        unread_count = request.user.account_notifications.filter(is_read=False).count()
-        return JsonResponse({'unread_count': unread_count})
+        badges = get_badge_counts(request.user)
+        return JsonResponse({'unread_count': badges['notifications'], 'badges': badges})
     return JsonResponse({'error': 'Invalid request'})
 
 
@@ -901,7 +789,7 @@ def send_friend_request(request, user_id):
                     existing_request.save()
 
                     # Create notification
-                    Notification.objects.create(
+                    notify(
                         user=to_user,
                         notification_type='friend_request',
                         title="New Friend Request",
@@ -923,18 +811,10 @@ def send_friend_request(request, user_id):
 
             if reverse_request:
                 # Auto-accept if there's a pending reverse request
+                # accept() notifies the requester through the FriendRequest signal
                 reverse_request.accept()
                 Friendship.create_friendship(request.user, to_user)
 
-                # Create notification for both users
-                Notification.objects.create(
-                    user=to_user,
-                    notification_type='friend_request',
-                    title="Friend Request Accepted",
-                    message=f"{request.user.username} accepted your friend request",
-                    related_url=f"/accounts/profile/{request.user.id}/"
-                )
-
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({'success': True, 'message': f'You are now friends with {to_user.username}!'})
                 messages.success(request, f'You are now friends with {to_user.username}!')
@@ -955,14 +835,14 @@ def send_friend_request(request, user_id):
                     friend_request.message = request.POST.get('message', '')
                     friend_request.save()
 
-                # Create notification
-                Notification.objects.create(
-                    user=to_user,
-                    notification_type='friend_request',
-                    title="New Friend Request",
-                    message=f"{request.user.username} sent you a friend request",
-                    related_url="/accounts/friend-requests/"
-                )
+                    # New requests are notified by the FriendRequest signal
+                    notify(
+                        user=to_user,
+                        notification_type='friend_request',
+                        title="New Friend Request",
+                        message=f"{request.user.username} sent you a friend request",
+                        related_url="/accounts/friend-requests/"
+                    )
 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({'success': True, 'message': f'Friend request sent to {to_user.username}!'})
@@ -1026,18 +906,10 @@ def accept_friend_request(request, request_id):
                 status='pending'
             )
 
+            # accept() notifies the requester through the FriendRequest signal
             friend_request.accept()
             Friendship.create_friendship(friend_request.from_user, friend_request.to_user)
 
-            # Create notification for the requester
-            Notification.objects.create(
-                user=friend_request.from_user,
-                notification_type='friend_request',
-                title="Friend Request Accepted",
-                message=f"{request.user.username} accepted your friend request",
-                related_url=f"/accounts/profile/{request.user.id}/"
-            )
-
             messages.success(request, f'You are now friends with {friend_request.from_user.username}!')
 
         except FriendRequest.DoesNotExist:
@@ -1147,6 +1019,7 @@ def password_reset_request(request):
                         user=user,
                         email=email
                     )
+                    queue_otp_email(otp, 'password_reset')
 
                     # Store in session
                     request.session['password_reset_user_id'] = str(user.id)
@@ -1167,7 +1040,7 @@ def password_reset_request(request):
                     user = CustomUser.objects.get(phone_number=phone, is_active=True)
 
                     # ✅ SEND VIA TWILIO VERIFY API
-                    verification_sid, message = send_twilio_verification(phone)
+                    verification_sid, message = sms_verification.send_code(phone)
 
                     if verification_sid:
                         # Create OTP record with Twilio SID
@@ -1248,7 +1121,7 @@ def password_reset_verify_otp(request):
             if reset_method == 'phone' and phone_number:
                 print(f"DEBUG: Verifying phone OTP {otp_code} for {phone_number}")
 
-                success, message = verify_twilio_code(phone_number, otp_code)
+                success, message = sms_verification.check_code(phone_number, otp_code)
 
                 if success:
                     # Mark OTP as used
@@ -1351,12 +1224,13 @@ def password_reset_confirm(request):
             form.save()
 
             # Create notification
-            Notification.objects.create(
+            notify(
                 user=user,
                 notification_type='system',
                 title="Password Reset",
                 message="Your password has been reset successfully.",
-                related_url="/accounts/settings/"
+                related_url="/accounts/settings/",
+                digest=False
             )
 
             messages.success(request, 'Your password has been reset successfully. You can now log in.')
@@ -1401,9 +1275,10 @@ def password_change_with_otp(request):
                     user=user,
                     email=contact_value
                 )
+                queue_otp_email(otp, 'password_change')
             else:
                 # For phone, use Twilio
-                verification_sid, message = send_twilio_verification(contact_value)
+                verification_sid, message = sms_verification.send_code(contact_value)
                 if verification_sid:
                     otp = PasswordResetOTP.objects.create(
                         user=user,
@@ -1473,7 +1348,7 @@ def verify_password_change_otp(request):
 
             # VERIFY VIA TWILIO FOR PHONE
             if contact_method == 'phone' and twilio_sid:
-                success, message = verify_twilio_code(otp.phone_number, otp_code)
+                success, message = sms_verification.check_code(otp.phone_number, otp_code)
             else:
                 # Email verification
                 success, message = otp.verify_and_use(otp_code)
@@ -1502,12 +1377,13 @@ def verify_password_change_otp(request):
                 update_session_auth_hash(request, user)
 
                 # Create notification
-                Notification.objects.create(
+                notify(
                     user=user,
                     notification_type='system',
                     title="Password Changed",
                     message="Your password has been changed successfully.",
-                    related_url="/accounts/settings/"
+                    related_url="/accounts/settings/",
+                    digest=False
                 )
 
                 # Clear session
@@ -1575,9 +1451,10 @@ def resend_otp(request, otp_type):
                         user=request.user,
                         email=request.user.email
                     )
+                    queue_otp_email(new_otp, 'password_change')
                 else:
                     # For phone, use Twilio
-                    verification_sid, message = send_twilio_verification(request.user.phone_number)
+                    verification_sid, message = sms_verification.send_code(request.user.phone_number)
                     if verification_sid:
                         new_otp = PasswordResetOTP.objects.create(
                             user=request.user,
@@ -1624,10 +1501,11 @@ def resend_otp(request, otp_type):
                         user=user,
                         email=user.email
                     )
+                    queue_otp_email(new_otp, 'password_reset')
                 else:
                     # For phone, use Twilio
                     phone = request.session.get('twilio_phone_number', user.phone_number)
-                    verification_sid, message = send_twilio_verification(phone)
+                    verification_sid, message = sms_verification.send_code(phone)
                     if verification_sid:
                         new_otp = PasswordResetOTP.objects.create(
                             user=user,
@@ -1682,6 +1560,7 @@ def send_verification_otp(request):
                     verification_type='account_verification',
                     email=user.email
                 )
+                queue_otp_email(otp, 'account_verification')
 
                 # Store OTP ID in session
                 request.session['verification_otp_id'] = str(otp.id)
@@ -1701,7 +1580,7 @@ def send_verification_otp(request):
                     user.save()
 
                 # Send OTP via Twilio
-                verification_sid, message = send_twilio_verification(user.phone_number)
+                verification_sid, message = sms_verification.send_code(user.phone_number)
                 if verification_sid:
                     # Create OTP record
                     otp = OTPVerification.objects.create(
@@ -1766,7 +1645,7 @@ def verify_account_otp(request):
 
             # VERIFY VIA TWILIO FOR PHONE
             if verification_method == 'phone' and twilio_sid:
-                success, message = verify_twilio_code(otp.phone_number, otp_code)
+                success, message = sms_verification.check_code(otp.phone_number, otp_code)
             else:
                 # Email verification
                 success, message = otp.verify_otp(otp_code)
@@ -1785,7 +1664,7 @@ def verify_account_otp(request):
                 otp.save()
 
                 # Create notification
-                Notification.objects.create(
+                notify(
                     user=user,
                     notification_type='system',
                     title="Account Verified",
@@ -1,37 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
-from datetime import timedelta
 from django.contrib import messages
-import json
-from .models import Invitation, CustomUser
+from .email_queue import queue_emails
+from .invitation_import import import_invitations, read_csv_contacts, read_text_contacts
+from .models import Invitation, CustomUser, OutboundEmail
 from .forms import InvitationForm, BulkInvitationForm
 
 
+def _import_summary(result):
+    """Human-readable outcome of import_invitations"""
+    skipped = {
+        'already on Messenger': result['registered'],
+        'already invited': result['already_invited'],
+        'duplicates': result['duplicates'],
+        'invalid': result['invalid'],
+        'over the import limit': result['over_limit'],
+    }
+    summary = f"Successfully sent {result['created']} invitation(s)!"
+    details = ', '.join(f"{count} {reason}" for reason, count in skipped.items() if count)
+    return f"{summary} Skipped {details}." if details else summary
+
+
 @login_required
 def invite_user(request):
     if request.method == 'POST':
         form = InvitationForm(request.POST)
         if form.is_valid():
-            # Create invitation logic here
-            invitation = Invitation.objects.create(
-                inviter=request.user,
-                email=form.cleaned_data.get('email'),
-                phone_number=form.cleaned_data.get('phone_number'),
-                message=form.cleaned_data.get('message', ''),
-                invitation_type='email' if form.cleaned_data.get('email') else 'phone',
-                expires_at=timezone.now() + timedelta(days=7)
-            )
-
-            # Send invitation email
-            if invitation.email:
-                send_invitation_email(invitation)
-
-            messages.success(request, f"Invitation sent successfully to {invitation.email or invitation.phone_number}!")
-            return redirect('invitations_list')
+            contact = form.cleaned_data.get('email') or form.cleaned_data.get('phone_number')
+            result = import_invitations(request.user, [contact], form.cleaned_data.get('message', ''))
+
+            if result['created']:
+                messages.success(request, f"Invitation sent successfully to {contact}!")
+                return redirect('invitations_list')
+            elif result['invalid']:
+                form.add_error(None, 'Please enter a valid email address or phone number')
+            elif result['registered']:
+                form.add_error(None, f"{contact} is already on Messenger")
+            else:
+                form.add_error(None, f"You already have a pending invitation for {contact}")
     else:
         form = InvitationForm()
 
@@ -44,39 +52,17 @@ def invite_user(request):
 @login_required
 def bulk_invite(request):
     if request.method == 'POST':
-        form = BulkInvitationForm(request.POST)
+        form = BulkInvitationForm(request.POST, request.FILES)
         if form.is_valid():
-            contacts_text = form.cleaned_data['contacts']
-            message = form.cleaned_data.get('message', '')
-
-            # Process contacts (simple implementation)
-            contacts = [contact.strip() for contact in contacts_text.split('\n') if contact.strip()]
-            success_count = 0
-
-            for contact in contacts:
-                try:
-                    if '@' in contact:  # Email
-                        invitation = Invitation.objects.create(
-                            inviter=request.user,
-                            email=contact,
-                            message=message,
-                            invitation_type='email',
-                            expires_at=timezone.now() + timedelta(days=7)
-                        )
-                        send_invitation_email(invitation)
-                    else:  # Phone
-                        invitation = Invitation.objects.create(
-                            inviter=request.user,
-                            phone_number=contact,
-                            message=message,
-                            invitation_type='phone',
-                            expires_at=timezone.now() + timedelta(days=7)
-                        )
-                    success_count += 1
-                except:
-                    pass  # Skip duplicates
-
-            messages.success(request, f"Successfully sent {success_count} invitation(s)!")
+            if form.cleaned_data.get('csv_file'):
+                contacts = read_csv_contacts(form.cleaned_data['csv_file'])
+            else:
+                contacts = read_text_contacts(form.cleaned_data['contacts'])
+
+            # Dedup and lookups happen in memory and a few IN queries; emails go out after the response
+            result = import_invitations(request.user, contacts, form.cleaned_data.get('message', ''))
+
+            messages.success(request, _import_summary(result))
             return redirect('invitations_list')
     else:
         form = BulkInvitationForm()
@@ -90,7 +76,7 @@ def bulk_invite(request):
 @login_required
 def invitations_list(request):
     invitations = Invitation.objects.filter(inviter=request.user).order_by('-created_at')
-    return render(request, 'accounts/invitations_list.html', {
+    return render(request, 'accounts/invitaions_list.html', {
         'invitations': invitations,
         'active_tab': 'invitations_list'
     })
@@ -110,34 +96,31 @@ def cancel_invitation(request, invitation_id):
     return redirect('invitations_list')
 
 
-def send_invitation_email(invitation):
-    """Send invitation email to the recipient"""
-    if invitation.invitation_type == 'email' and invitation.email:
-        subject = f"Join me on Messenger!"
-        message = f"""
-        Hi there!
-
-        {invitation.inviter.username} has invited you to join Messenger, a real-time chatting app.
-
-        {invitation.message if invitation.message else "Connect with friends and family with instant messaging, video calls, and more!"}
-
-        Click the link below to join:
-        {settings.SITE_URL}/register/
-
-        This invitation will expire in 7 days.
+def invitation_email(invitation):
+    """Unsaved OutboundEmail carrying an email invitation"""
+    body = (
+        f"Hi there!\n\n"
+        f"{invitation.inviter.username} has invited you to join Messenger, a real-time chatting app.\n\n"
+        f"{invitation.message or 'Connect with friends and family with instant messaging, video calls, and more!'}\n\n"
+        f"Click the link below to join:\n"
+        f"{settings.SITE_URL}/register/\n\n"
+        f"This invitation will expire in 7 days.\n\n"
+        f"Looking forward to chatting with you!\n\n"
+        f"The Messenger Team"
+    )
+    return OutboundEmail(
+        kind='invitation',
+        to_email=invitation.email,
+        subject="Join me on Messenger!",
+        body=body,
+        invitation=invitation
+    )
 
-        Looking forward to chatting with you!
 
-        The Messenger Team
-        """
-
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [invitation.email],
-            fail_silently=False,
-        )
+def send_invitation_email(invitation):
+    """Queue the invitation email; it is sent in the background by accounts.email_queue"""
+    if invitation.invitation_type == 'email' and invitation.email:
+        queue_emails([invitation_email(invitation)])
 
 
 @login_required
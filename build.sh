@@ -6,7 +6,8 @@ echo "🚀 Starting Render deployment with COMPLETE database fixes..."
 # Install dependencies
 pip install -r requirements.txt
 
-# Collect static files
+# Build the content-hashed emoji catalog, then collect static files
+python manage.py build_emoji_catalog
 python manage.py collectstatic --no-input
 
 # Run ALL migrations
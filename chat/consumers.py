@@ -2,7 +2,11 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from accounts import badge_counts
 from .models import Conversation, Message, UserStatus
+from .utils import get_conversation_group_name, serialize_messages
+from .emoji_utils import get_text_message_type
 
 User = get_user_model()
 
@@ -10,9 +14,9 @@ User = get_user_model()
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
-        if self.user.is_authenticated:
-            self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-            self.room_group_name = f'chat_{self.conversation_id}'
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        if self.user.is_authenticated and await self.is_participant():
+            self.room_group_name = get_conversation_group_name(self.conversation_id)
 
             # Join room group
             await self.channel_layer.group_add(
@@ -55,10 +59,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     'sender': self.user.username,
                     'sender_id': self.user.id,
                     'timestamp': message.timestamp.isoformat(),
-                    'message_id': message.id,
+                    'message_id': str(message.id),
+                    'message_type': message.message_type,
+                    'seq': message.seq,
                 }
             )
 
+        elif message_type == 'sync':
+            # Client saw a gap in seq (or reconnected); replay what it missed
+            missed = await self.get_messages_after(text_data_json.get('last_seq'))
+            await self.send(text_data=json.dumps({
+                'type': 'sync',
+                'messages': missed,
+            }))
+
         elif message_type == 'typing':
             await self.channel_layer.group_send(
                 self.room_group_name,
@@ -70,7 +84,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
 
         elif message_type == 'read_receipt':
-            await self.mark_message_as_read(text_data_json['message_id'])
+            # Everything up to the client's last seen seq (or, from older clients, one message id)
+            await self.mark_read(text_data_json.get('seq'), text_data_json.get('message_id'))
 
     async def chat_message(self, event):
         # Send message to WebSocket
@@ -81,6 +96,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'sender_id': event['sender_id'],
             'timestamp': event['timestamp'],
             'message_id': event['message_id'],
+            'message_type': event.get('message_type', 'text'),
+            'seq': event.get('seq'),
         }))
 
     async def typing_indicator(self, event):
@@ -90,16 +107,62 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'typing': event['typing']
         }))
 
+    async def message_updated(self, event):
+        # Edit/unsend delta - clients patch the message in place
+        await self.send(text_data=json.dumps({
+            'type': 'message_updated',
+            'message_id': event['message_id'],
+            'content': event['content'],
+            'is_edited': event['is_edited'],
+            'is_unsent': event['is_unsent'],
+            'edited_at': event['edited_at'],
+        }))
+
+    async def reaction_delta(self, event):
+        # Reaction delta - clients adjust their local counts
+        await self.send(text_data=json.dumps({
+            'type': 'reaction_delta',
+            'message_id': event['message_id'],
+            'user_id': event['user_id'],
+            'previous': event['previous'],
+            'current': event['current'],
+        }))
+
+    @database_sync_to_async
+    def is_participant(self):
+        try:
+            return Conversation.objects.filter(
+                id=self.conversation_id,
+                participants=self.user
+            ).exists()
+        except ValidationError:
+            return False
+
     @database_sync_to_async
     def save_message(self, content):
         conversation = Conversation.objects.get(id=self.conversation_id)
         message = Message.objects.create(
             conversation=conversation,
             sender=self.user,
-            content=content
+            content=content,
+            message_type=get_text_message_type(content)
         )
         return message
 
+    @database_sync_to_async
+    def get_messages_after(self, last_seq, limit=200):
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            return []
+
+        messages = Message.objects.filter(
+            conversation_id=self.conversation_id,
+            seq__gt=last_seq
+        ).select_related('sender').order_by('seq')[:limit]
+        # Same shape as the HTTP listings, so the client renders them with one code path
+        return serialize_messages(list(messages), self.user)
+
     @database_sync_to_async
     def update_user_status(self, online):
         status, created = UserStatus.objects.get_or_create(user=self.user)
@@ -107,13 +170,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
         status.save()
 
     @database_sync_to_async
-    def mark_message_as_read(self, message_id):
+    def mark_read(self, seq, message_id=None):
         try:
-            message = Message.objects.get(id=message_id)
-            message.read = True
-            message.save()
-        except Message.DoesNotExist:
-            pass
+            if seq is None and message_id:
+                seq = Message.objects.filter(
+                    id=message_id, conversation_id=self.conversation_id
+                ).values_list('seq', flat=True).first()
+            seq = int(seq)
+        except (TypeError, ValueError, ValidationError):
+            return
+
+        conversation = Conversation.objects.get(id=self.conversation_id)
+        if conversation.mark_read_up_to(self.user, seq):
+            badge_counts.chat_read(self.user.id, conversation.id)
 
 
 class UserStatusConsumer(AsyncWebsocketConsumer):
@@ -0,0 +1,174 @@
+# chat/emoji_usage.py - Per-user frequent emoji counters (space-saving top-K in Redis)
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .emoji_utils import find_emojis
+
+logger = logging.getLogger(__name__)
+
+USAGE_KEY = 'chat:emoji_usage:{user_id}'
+DIRTY_KEY = 'chat:emoji_usage:dirty'
+
+# Space-saving update: a tracked emoji is incremented; a new one either takes a free slot
+# or replaces the current minimum and inherits its count + 1. Memory stays at `capacity`.
+# Returns -1 without touching anything when the user's counters are not in Redis yet,
+# so the caller can seed them from the database snapshot first.
+SPACE_SAVING_SCRIPT = """
+if ARGV[3] == '0' and redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local capacity = tonumber(ARGV[1])
+for i = 5, #ARGV do
+    local item = ARGV[i]
+    if redis.call('ZSCORE', KEYS[1], item) or redis.call('ZCARD', KEYS[1]) < capacity then
+        redis.call('ZINCRBY', KEYS[1], 1, item)
+    else
+        local minimum = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+        redis.call('ZREM', KEYS[1], minimum[1])
+        redis.call('ZADD', KEYS[1], tonumber(minimum[2]) + 1, item)
+    end
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+redis.call('SADD', KEYS[2], ARGV[4])
+return 1
+"""
+
+_client = None
+_script = None
+
+
+def get_redis():
+    """Shared Redis client for the counters, or None when CHAT_EMOJI_USAGE_REDIS_URL is unset"""
+    global _client, _script
+    url = getattr(settings, 'CHAT_EMOJI_USAGE_REDIS_URL', '')
+    if not url:
+        return None
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        _script = _client.register_script(SPACE_SAVING_SCRIPT)
+    return _client
+
+
+def extract_emojis(text):
+    """Distinct emojis in a message, in order of first appearance"""
+    return list(dict.fromkeys(find_emojis(text)))
+
+
+def record_emoji_usage(user_id, emojis):
+    """Count emojis for a user once the current transaction commits"""
+    emojis = [item for item in emojis if item and len(item) <= 32]
+    if emojis:
+        transaction.on_commit(lambda: _record(user_id, emojis))
+
+
+def _record(user_id, emojis):
+    client = get_redis()
+    if client is not None:
+        try:
+            _record_in_redis(client, user_id, emojis)
+            return
+        except Exception as e:
+            logger.warning(f"Emoji usage counters unavailable, writing to the database: {e}")
+
+    _record_in_database(user_id, emojis)
+
+
+def _record_in_redis(client, user_id, emojis):
+    keys = [USAGE_KEY.format(user_id=user_id), DIRTY_KEY]
+    args = [settings.CHAT_EMOJI_USAGE_CAPACITY, settings.CHAT_EMOJI_USAGE_TTL]
+
+    if _script(keys=keys, args=args + [0, user_id] + emojis, client=client) == -1:
+        # Counters were evicted or never loaded: start again from the last flushed snapshot
+        from .models import EmojiUsage
+        snapshot = dict(
+            EmojiUsage.objects.filter(user_id=user_id).order_by('-count')
+            .values_list('emoji', 'count')[:settings.CHAT_EMOJI_USAGE_CAPACITY]
+        )
+        if snapshot:
+            client.zadd(keys[0], snapshot, nx=True)
+        _script(keys=keys, args=args + [1, user_id] + emojis, client=client)
+
+
+def _record_in_database(user_id, emojis):
+    """Same space-saving update applied to the EmojiUsage rows (local development without Redis)"""
+    from .models import EmojiUsage
+
+    with transaction.atomic():
+        counters = {
+            row.emoji: row
+            for row in EmojiUsage.objects.select_for_update().filter(user_id=user_id)
+        }
+        for item in emojis:
+            row = counters.get(item)
+            if row is None and len(counters) >= settings.CHAT_EMOJI_USAGE_CAPACITY:
+                minimum = min(counters.values(), key=lambda counter: counter.count)
+                del counters[minimum.emoji]
+                minimum.delete()
+                row = EmojiUsage.objects.create(user_id=user_id, emoji=item, count=minimum.count)
+            elif row is None:
+                row = EmojiUsage.objects.create(user_id=user_id, emoji=item, count=0)
+            row.count += 1
+            row.save(update_fields=['count', 'updated_at'])
+            counters[item] = row
+
+
+def get_frequent_emojis(user_id, limit=None):
+    """The user's top emojis, most used first: one ZREVRANGE (or one indexed query) of `limit` items"""
+    limit = limit or settings.CHAT_EMOJI_FREQUENT_LIMIT
+    client = get_redis()
+    if client is not None:
+        try:
+            items = client.zrevrange(USAGE_KEY.format(user_id=user_id), 0, limit - 1)
+            if items:
+                return [item.decode('utf-8') for item in items]
+        except Exception as e:
+            logger.warning(f"Emoji usage counters unavailable, reading the snapshot: {e}")
+
+    from .models import EmojiUsage
+    return list(
+        EmojiUsage.objects.filter(user_id=user_id).order_by('-count', 'emoji')
+        .values_list('emoji', flat=True)[:limit]
+    )
+
+
+def flush_emoji_usage(batch_size=500):
+    """Copy the counters of users active since the last flush into EmojiUsage; returns users flushed"""
+    from .models import EmojiUsage
+
+    client = get_redis()
+    if client is None:
+        return 0
+
+    flushed = 0
+    while True:
+        user_ids = [int(user_id) for user_id in client.spop(DIRTY_KEY, batch_size) or []]
+        if not user_ids:
+            return flushed
+
+        pipeline = client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipeline.zrange(USAGE_KEY.format(user_id=user_id), 0, -1, withscores=True)
+        snapshots = dict(zip(user_ids, pipeline.execute()))
+
+        now = timezone.now()
+        with transaction.atomic():
+            for user_id, counters in snapshots.items():
+                current = {item.decode('utf-8'): int(score) for item, score in counters}
+                if not current:
+                    continue
+                # Counters evicted by the space-saving update leave the snapshot as well
+                EmojiUsage.objects.filter(user_id=user_id).exclude(emoji__in=current).delete()
+                EmojiUsage.objects.bulk_create(
+                    [
+                        EmojiUsage(user_id=user_id, emoji=item, count=count, updated_at=now)
+                        for item, count in current.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['user', 'emoji'],
+                    update_fields=['count', 'updated_at'],
+                )
+        flushed += len(user_ids)
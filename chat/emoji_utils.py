@@ -0,0 +1,104 @@
+# chat/emoji_utils.py - Grapheme-aware emoji matching from one precompiled regex
+import re
+
+import emoji
+
+# Emoji-only (or nearly) messages are shown large in the chat
+EMOJI_ONLY_MAX_GRAPHEMES = 3
+EMOJI_ONLY_MIN_RATIO = 0.7
+
+# Marks that attach to the preceding character instead of starting a new grapheme
+_COMBINING = '\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe00-\ufe0f\ufe20-\ufe2f\u200c\u200d'
+
+_token_re = None
+
+
+def _char_class(code_points):
+    """Compact regex character class (as ranges) for a set of code points"""
+    ranges = []
+    for code_point in sorted(code_points):
+        if ranges and code_point == ranges[-1][1] + 1:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+    return '[' + ''.join(
+        re.escape(chr(first)) if first == last else f'{re.escape(chr(first))}-{re.escape(chr(last))}'
+        for first, last in ranges
+    ) + ']'
+
+
+def get_token_regex():
+    """
+    Compile (once per process) a tokenizer whose matches are whole graphemes:
+    group 1 is an emoji sequence (ZWJ families, skin tones, flags, keycaps, tag flags),
+    otherwise one non-space character plus its combining marks.
+    The emoji base characters come from the emoji data.
+    """
+    global _token_re
+    if _token_re is None:
+        structural = {0x200d, 0xfe0f, 0x20e3}
+        structural.update(range(0x1f3fb, 0x1f400))  # skin tone modifiers
+        structural.update(range(0x1f1e6, 0x1f200))  # regional indicators
+        structural.update(range(0xe0020, 0xe0080))  # tags
+        bases = {
+            ord(char)
+            for sequence in emoji.EMOJI_DATA
+            for char in sequence
+            if ord(char) > 0x7f and ord(char) not in structural
+        }
+        # re compiles a BMP-only class to a bitmap; astral ranges are tested one by one,
+        # so only try them on astral characters
+        bmp = {code_point for code_point in bases if code_point <= 0xffff}
+        base = rf'(?:{_char_class(bmp)}|(?=[\U00010000-\U0010ffff]){_char_class(bases - bmp)})'
+
+        element = rf'{base}[\ufe0f\U0001f3fb-\U0001f3ff]*(?:[\U000e0020-\U000e007e]+\U000e007f)?'
+        sequence = '|'.join([
+            r'[0-9#*]\ufe0f?\u20e3',  # keycaps
+            r'[\U0001f1e6-\U0001f1ff]{2}',  # flags
+            rf'{element}(?:\u200d{element})*',  # ZWJ sequences
+        ])
+        _token_re = re.compile(rf'({sequence})|\S[{_COMBINING}]*')
+    return _token_re
+
+
+def find_emojis(text):
+    """All emoji sequences in text, in order"""
+    if not text or text.isascii():
+        return []
+    return [match for match in get_token_regex().findall(text) if match]
+
+
+def count_graphemes(text):
+    """Return (emoji graphemes, non-space graphemes) for text in a single regex pass"""
+    if not text:
+        return 0, 0
+    if text.isascii():
+        # No emoji is plain ASCII: skip the regex for the common case
+        return 0, sum(map(len, text.split()))
+
+    # One entry per grapheme: the emoji sequence, or '' for anything else
+    tokens = get_token_regex().findall(text)
+    return len(tokens) - tokens.count(''), len(tokens)
+
+
+def is_emoji_message(text):
+    """Whether a text message is (almost) only emojis"""
+    if not text:
+        return False
+
+    # Every ASCII non-space character outside a keycap is a plain grapheme of its own:
+    # when those alone rule out the emoji ratio, skip tokenizing (C-speed count)
+    plain = sum(map(len, text.encode('ascii', 'ignore').translate(None, b'0123456789#*').split()))
+    if plain > max(EMOJI_ONLY_MAX_GRAPHEMES, (1 - EMOJI_ONLY_MIN_RATIO) * len(text)):
+        return False
+
+    emoji_count, total = count_graphemes(text)
+    if total <= EMOJI_ONLY_MAX_GRAPHEMES:
+        # Short messages count only when they are all emoji ("ok 👍" is text)
+        return emoji_count == total
+    return emoji_count / total > EMOJI_ONLY_MIN_RATIO
+
+
+def get_text_message_type(text):
+    """message_type for a message without an attachment"""
+    return 'emoji' if is_emoji_message(text) else 'text'
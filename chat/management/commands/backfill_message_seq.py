@@ -0,0 +1,45 @@
+# chat/management/commands/backfill_message_seq.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from chat.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Assign per-conversation sequence numbers to messages created before Message.seq existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversation', type=str, help='Only backfill this conversation id')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        conversation_ids = Message.objects.filter(seq__isnull=True)
+        if options.get('conversation'):
+            conversation_ids = conversation_ids.filter(conversation_id=options['conversation'])
+        conversation_ids = conversation_ids.order_by().values_list('conversation_id', flat=True).distinct()
+
+        total = 0
+        for conversation_id in list(conversation_ids):
+            with transaction.atomic():
+                # Lock the counter row so new sends queue behind the backfill
+                conversation = Conversation.objects.select_for_update().get(pk=conversation_id)
+                last_seq = max(
+                    conversation.last_message_seq,
+                    conversation.messages.aggregate(last=Max('seq'))['last'] or 0
+                )
+
+                pending = []
+                for message in conversation.messages.filter(seq__isnull=True).order_by('timestamp', 'id').only('id'):
+                    last_seq += 1
+                    message.seq = last_seq
+                    pending.append(message)
+
+                Message.objects.bulk_update(pending, ['seq'], batch_size=batch_size)
+                Conversation.objects.filter(pk=conversation_id).update(last_message_seq=last_seq)
+
+            total += len(pending)
+            self.stdout.write(f'{conversation_id}: numbered {len(pending)} messages (last seq {last_seq})')
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Backfilled {total} messages'))
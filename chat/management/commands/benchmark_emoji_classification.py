@@ -0,0 +1,79 @@
+# chat/management/commands/benchmark_emoji_classification.py
+import random
+import time
+
+import emoji
+from django.core.management.base import BaseCommand
+from chat.emoji_utils import count_graphemes, get_text_message_type, get_token_regex
+
+# Sequences a per-code-point count gets wrong: ZWJ families, skin tones, flags, keycaps
+GRAPHEME_CASES = {
+    '👨‍👩‍👧‍👦': 'emoji',
+    '👍🏽👍🏽': 'emoji',
+    '🇳🇵🇯🇵': 'emoji',
+    '1️⃣': 'emoji',
+    '❤️': 'emoji',
+    'nice work 👍🏽': 'text',
+    'ok 👍': 'text',
+    'hi 😀': 'text',
+    'café': 'text',
+}
+
+
+def per_code_point_type(content):
+    """The previous classifier, kept for comparison"""
+    emoji_count = sum(1 for char in content if emoji.is_emoji(char))
+    total_chars = len(content.strip())
+    if (emoji_count > 0 and total_chars <= 3) or (total_chars > 0 and emoji_count / total_chars > 0.7):
+        return 'emoji'
+    return 'text'
+
+
+class Command(BaseCommand):
+    help = 'Compare emoji-only classification speed on long inputs against the per-code-point scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=10000, help='Characters per input')
+        parser.add_argument('--runs', type=int, default=20, help='Classifications per input')
+
+    def handle(self, *args, **options):
+        length = options['length']
+        runs = options['runs']
+        rng = random.Random(0)
+
+        started = time.perf_counter()
+        get_token_regex()
+        self.stdout.write(f'Regex compiled once in {(time.perf_counter() - started) * 1000:.1f}ms')
+
+        emojis = [sequence for sequence in emoji.EMOJI_DATA if len(sequence) > 1] + ['😀', '🔥', '❤']
+        words = ['hello', 'there', 'see', 'you', 'tomorrow', 'नमस्ते', 'café', 'ok']
+        inputs = {
+            'ascii text': ' '.join(rng.choice(words[:5]) for _ in range(length))[:length],
+            'text + emoji': ' '.join(rng.choice(words * 10 + emojis[:50]) for _ in range(length))[:length],
+            'mixed text': ' '.join(rng.choice(words + emojis[:50]) for _ in range(length))[:length],
+            'emoji only': ''.join(rng.choice(emojis) for _ in range(length))[:length],
+        }
+
+        for label, content in inputs.items():
+            old = self._time(per_code_point_type, content, runs)
+            new = self._time(get_text_message_type, content, runs)
+            emoji_count, total = count_graphemes(content)
+            self.stdout.write(
+                f'{label:>12}: per-code-point {old:8.2f}ms  regex {new:7.2f}ms  '
+                f'({old / new if new else 0:.0f}x, {emoji_count}/{total} emoji graphemes)'
+            )
+
+        wrong = [content for content, expected in GRAPHEME_CASES.items() if get_text_message_type(content) != expected]
+        old_wrong = [content for content, expected in GRAPHEME_CASES.items() if per_code_point_type(content) != expected]
+        self.stdout.write(f'Grapheme cases misclassified: regex {len(wrong)}, per-code-point {len(old_wrong)}')
+
+        if wrong:
+            self.stdout.write(self.style.ERROR(f'\n❌ Misclassified: {wrong}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Benchmark complete'))
+
+    def _time(self, classify, content, runs):
+        started = time.perf_counter()
+        for _ in range(runs):
+            classify(content)
+        return (time.perf_counter() - started) * 1000 / runs
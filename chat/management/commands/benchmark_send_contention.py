@@ -0,0 +1,97 @@
+# chat/management/commands/benchmark_send_contention.py
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from chat.models import Conversation, Message
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure message send throughput with many concurrent senders in one group'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, default=50, help='Concurrent senders in the group')
+        parser.add_argument('--messages', type=int, default=20, help='Messages per sender')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users and group')
+
+    def handle(self, *args, **options):
+        senders_count = options['senders']
+        per_sender = options['messages']
+        run_id = uuid.uuid4().hex[:8]
+
+        senders = [
+            User.objects.create_user(
+                username=f'bench_{run_id}_{i}',
+                email=f'bench_{run_id}_{i}@example.com',
+                password=uuid.uuid4().hex
+            )
+            for i in range(senders_count)
+        ]
+        conversation = Conversation.objects.create(is_group=True, group_name=f'Benchmark {run_id}')
+        conversation.participants.add(*senders)
+
+        latencies = []
+        conversation_updates = []
+        errors = []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(senders_count)
+
+        def send_all(sender):
+            try:
+                start_gate.wait()
+                for i in range(per_sender):
+                    started = time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        Message.objects.create(conversation=conversation, sender=sender, content=f'bench {i}')
+                    elapsed = time.perf_counter() - started
+
+                    updates = sum(
+                        1 for query in queries.captured_queries
+                        if query['sql'].startswith('UPDATE') and 'chat_conversation' in query['sql']
+                    )
+                    with lock:
+                        latencies.append(elapsed)
+                        conversation_updates.append(updates)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=send_all, args=(sender,)) for sender in senders]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        seqs = list(conversation.messages.order_by('seq').values_list('seq', flat=True))
+        gap_free = seqs == list(range(1, len(seqs) + 1))
+
+        latencies.sort()
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            self.stdout.write(f'Sent {len(latencies)} messages from {senders_count} senders in {wall:.2f}s')
+            self.stdout.write(f'Throughput: {len(latencies) / wall:.1f} msg/s  p50: {p50:.1f}ms  p99: {p99:.1f}ms')
+            self.stdout.write(f'Conversation UPDATEs per send: max {max(conversation_updates)}')
+        self.stdout.write(f'Seq gap-free: {gap_free} (last seq {seqs[-1] if seqs else 0})')
+
+        for error in errors[:5]:
+            self.stdout.write(self.style.ERROR(f'❌ {error}'))
+
+        if not options['keep']:
+            conversation.delete()
+            User.objects.filter(id__in=[sender.id for sender in senders]).delete()
+
+        if errors or not gap_free:
+            self.stdout.write(self.style.ERROR(f'\n❌ {len(errors)} senders failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Benchmark complete'))
@@ -0,0 +1,17 @@
+# chat/management/commands/build_emoji_catalog.py
+import os
+
+from django.core.management.base import BaseCommand
+from chat.utils import EmojiManager
+
+
+class Command(BaseCommand):
+    help = 'Write the content-hashed emoji picker catalog into chat/static (run before collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help='Directory to write into (defaults to chat/static/chat/emoji)')
+
+    def handle(self, *args, **options):
+        path = EmojiManager.write_catalog(options.get('output_dir'))
+        size_kb = os.path.getsize(path) / 1024
+        self.stdout.write(self.style.SUCCESS(f'✅ Emoji catalog written to {path} ({size_kb:.1f} KB)'))
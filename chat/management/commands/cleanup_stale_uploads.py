@@ -0,0 +1,28 @@
+# chat/management/commands/cleanup_stale_uploads.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.models import MediaUpload
+
+
+class Command(BaseCommand):
+    help = 'Expire resumable uploads that have not received a chunk recently and remove their temp files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.CHAT_UPLOAD_EXPIRY_HOURS,
+                            help='Idle time after which an upload is abandoned')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # 'completing' rows left behind by a request that died mid-complete expire too
+        stale = MediaUpload.objects.filter(status__in=['uploading', 'completing'], updated_at__lt=cutoff)
+
+        count = 0
+        for upload in stale.iterator():
+            upload.discard_temp_file()
+            count += 1
+        stale.update(status='failed')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Expired {count} stale uploads'))
@@ -0,0 +1,18 @@
+# chat/management/commands/flush_emoji_usage.py
+from django.core.management.base import BaseCommand
+from chat.emoji_usage import flush_emoji_usage, get_redis
+
+
+class Command(BaseCommand):
+    help = 'Persist the Redis frequent-emoji counters of recently active users (run periodically, e.g. every 5 minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users flushed per transaction')
+
+    def handle(self, *args, **options):
+        if get_redis() is None:
+            self.stdout.write(self.style.WARNING('⚠️  CHAT_EMOJI_USAGE_REDIS_URL is not set; counters already live in the database'))
+            return
+
+        flushed = flush_emoji_usage(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Flushed emoji counters for {flushed} users'))
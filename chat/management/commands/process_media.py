@@ -0,0 +1,45 @@
+# chat/management/commands/process_media.py
+import time
+
+from django.core.management.base import BaseCommand
+from chat.media import process_media, release_stale
+from chat.models import ChatMedia
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails, blurhash placeholders and durations for unprocessed chat media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Media rows per pass')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry rows that failed before')
+        parser.add_argument('--stale-minutes', type=int, default=15,
+                            help='Requeue rows left in processing this long by a dead worker')
+        parser.add_argument('--watch', type=int, default=0, help='Keep polling every N seconds (worker mode)')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+
+        while True:
+            released = release_stale(options['stale_minutes'])
+            if released:
+                self.stdout.write(self.style.WARNING(f'⚠️  Requeued {released} media files stuck in processing'))
+
+            media_ids = list(
+                ChatMedia.objects.filter(processing_status__in=statuses, is_deleted=False)
+                .order_by('uploaded_at')
+                .values_list('id', flat=True)[:options['limit']]
+            )
+
+            processed = 0
+            for media_id in media_ids:
+                media = process_media(media_id)
+                if media is not None:
+                    processed += 1
+                    self.stdout.write(f'{media_id}: {media.processing_status}')
+
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'✅ Processed {processed} media files'))
+
+            if not options['watch']:
+                break
+            time.sleep(options['watch'])
@@ -0,0 +1,49 @@
+# chat/management/commands/reconcile_storage_usage.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from chat.models import ChatMedia, StorageUsage
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user and per-conversation storage counters from live ChatMedia rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not fix it')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        live_media = ChatMedia.objects.filter(is_deleted=False).order_by()
+
+        drift = 0
+        for owner_field in ('user_id', 'conversation_id'):
+            group_field = 'uploaded_by_id' if owner_field == 'user_id' else 'conversation_id'
+            actual = {
+                row[group_field]: (row['total'] or 0, row['files'])
+                for row in live_media.values(group_field).annotate(total=Sum('file_size'), files=Count('id'))
+            }
+            counted = {
+                row[owner_field]: (row['bytes_used'], row['file_count'])
+                for row in StorageUsage.objects.filter(**{f'{owner_field}__isnull': False}).values(
+                    owner_field, 'bytes_used', 'file_count'
+                )
+            }
+
+            for owner_id in set(actual) | set(counted):
+                expected = actual.get(owner_id, (0, 0))
+                if counted.get(owner_id, (0, 0)) == expected:
+                    continue
+
+                drift += 1
+                self.stdout.write(
+                    self.style.WARNING(f'⚠️  {owner_field}={owner_id}: counted {counted.get(owner_id)}, actual {expected}')
+                )
+                if not dry_run:
+                    with transaction.atomic():
+                        StorageUsage.objects.update_or_create(
+                            **{owner_field: owner_id},
+                            defaults={'bytes_used': expected[0], 'file_count': expected[1]}
+                        )
+
+        verb = 'Found' if dry_run else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {verb} {drift} drifted counters'))
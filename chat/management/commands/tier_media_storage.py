@@ -0,0 +1,67 @@
+# chat/management/commands/tier_media_storage.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+from chat.models import ChatMedia, MediaBlob
+
+
+class Command(BaseCommand):
+    help = 'Move originals not referenced recently to cold storage (thumbnails stay hot) and report reclaimable bytes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_MEDIA_COLD_AFTER_DAYS,
+                            help='Move originals not referenced for this many days')
+        parser.add_argument('--limit', type=int, default=500, help='Maximum blobs moved per run')
+        parser.add_argument('--dry-run', action='store_true', help='Only report reclaimable bytes')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = MediaBlob.objects.filter(tier='hot', ref_count__gt=0, last_referenced_at__lt=cutoff)
+
+        # Reclaimable hot bytes per conversation (a shared blob is listed under each conversation using it)
+        per_conversation = (
+            ChatMedia.objects.filter(file__in=candidates.values('file'), is_deleted=False)
+            .values('conversation_id')
+            .annotate(total=Sum('file_size'))
+            .order_by('-total')
+        )
+        for row in per_conversation:
+            self.stdout.write(f"{row['conversation_id']}: {row['total']} bytes reclaimable")
+
+        total = candidates.aggregate(total=Sum('size'))['total'] or 0
+        self.stdout.write(f'Hot storage reclaimable: {total} bytes in {candidates.count()} blobs')
+
+        if options['dry_run']:
+            return
+
+        cold_storage = MediaBlob.get_cold_storage()
+        moved = moved_bytes = 0
+        for blob in candidates.order_by('last_referenced_at')[:options['limit']]:
+            hot_storage = blob.file.storage
+            if not hot_storage.exists(blob.file.name):
+                continue
+
+            with hot_storage.open(blob.file.name, 'rb') as source:
+                stored_name = cold_storage.save(blob.file.name, source)
+            if stored_name != blob.file.name:
+                # Name taken by a leftover copy; keep the original hot rather than mislink it
+                cold_storage.delete(stored_name)
+                continue
+
+            # Only flip the tier if the blob was not re-referenced while copying
+            flipped = MediaBlob.objects.filter(
+                pk=blob.pk, tier='hot', last_referenced_at__lt=cutoff
+            ).update(tier='cold')
+            if not flipped:
+                cold_storage.delete(stored_name)
+                continue
+
+            hot_storage.delete(blob.file.name)
+            moved += 1
+            moved_bytes += blob.size
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Moved {moved} originals ({moved_bytes} bytes) to cold storage'))
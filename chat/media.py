@@ -0,0 +1,247 @@
+# chat/media.py - Thumbnail, placeholder and duration extraction for ChatMedia
+import io
+import json
+import logging
+import math
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Rendition widths; the browser picks the smallest adequate one through srcset
+THUMBNAIL_WIDTHS = (160, 480, 1080)
+THUMBNAIL_QUALITY = 80
+
+_executor = None
+
+
+def schedule_media_processing(media_id):
+    """Process a ChatMedia row after the current transaction commits"""
+    if not getattr(settings, 'CHAT_MEDIA_PROCESS_IN_BACKGROUND', True):
+        # Left for the process_media worker command
+        return
+
+    def submit():
+        global _executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-media')
+        _executor.submit(_process_in_thread, media_id)
+
+    transaction.on_commit(submit)
+
+
+def _process_in_thread(media_id):
+    close_old_connections()
+    try:
+        process_media(media_id)
+    finally:
+        close_old_connections()
+
+
+def process_media(media_id):
+    """Fill in renditions, blurhash, dimensions and duration for one ChatMedia row"""
+    from .models import ChatMedia
+
+    # Claim the row so the worker command and the thread pool never both process it
+    claimed = ChatMedia.objects.filter(
+        id=media_id, processing_status__in=['pending', 'failed']
+    ).update(processing_status='processing', processing_claimed_at=timezone.now())
+    if not claimed:
+        return None
+
+    media = ChatMedia.objects.get(id=media_id)
+    try:
+        image = None
+        if media.media_type in ('image', 'gif', 'sticker'):
+            with media.file.open('rb') as source:
+                image = Image.open(source)
+                image.load()
+        elif media.media_type in ('video', 'audio'):
+            path = get_local_path(media.file)
+            if path:
+                media.duration = get_duration_probe()(path)
+                if media.media_type == 'video':
+                    image = extract_video_frame(path)
+
+        if image is not None:
+            image = ImageOps.exif_transpose(image)
+            media.width, media.height = image.size
+            media.renditions = save_renditions(media, image)
+            media.blurhash = encode_blurhash(image)
+            if media.renditions:
+                media.thumbnail.name = media.renditions[str(min(int(width) for width in media.renditions))]
+
+        media.processing_status = 'done'
+        media.processed_at = timezone.now()
+    except Exception as e:
+        logger.warning(f"Could not process media {media_id}: {e}")
+        media.processing_status = 'failed'
+
+    media.save(update_fields=[
+        'width', 'height', 'duration', 'renditions', 'blurhash', 'thumbnail',
+        'processing_status', 'processed_at'
+    ])
+    return media
+
+
+def release_stale(minutes=15):
+    """Return media stuck in processing (worker restarted mid-file) to pending"""
+    from .models import ChatMedia
+
+    return ChatMedia.objects.filter(processing_status='processing').filter(
+        Q(processing_claimed_at__lt=timezone.now() - timedelta(minutes=minutes)) |
+        Q(processing_claimed_at__isnull=True)  # Claimed before claims were timestamped
+    ).update(processing_status='pending')
+
+
+def save_renditions(media, image):
+    """Write WebP renditions no wider than the original; returns {width: storage name}"""
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    renditions = {}
+    for width in THUMBNAIL_WIDTHS:
+        # Always keep the smallest size; skip upscaling beyond the original
+        if width > image.width and renditions:
+            break
+
+        rendition = image.copy()
+        rendition.thumbnail((width, width * 4), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        rendition.save(buffer, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+        name = media.thumbnail.field.storage.save(
+            f'chat_media/thumbnails/{media.id}_{width}.webp',
+            ContentFile(buffer.getvalue())
+        )
+        renditions[str(width)] = name
+
+    return renditions
+
+
+def get_local_path(field_file):
+    """Filesystem path for a stored file, or None for remote storages"""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return None
+
+
+def get_duration_probe():
+    """Load the configured duration probe: a callable taking a path and returning seconds or None"""
+    return import_string(getattr(settings, 'CHAT_MEDIA_DURATION_PROBE', 'chat.media.ffprobe_duration'))
+
+
+def ffprobe_duration(path):
+    """Default duration probe, using ffprobe when it is installed"""
+    if not shutil.which('ffprobe'):
+        return None
+
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+        capture_output=True, timeout=30
+    )
+    if result.returncode != 0:
+        return None
+
+    duration = json.loads(result.stdout or b'{}').get('format', {}).get('duration')
+    return int(round(float(duration))) if duration else None
+
+
+def extract_video_frame(path):
+    """Grab an early frame of a video as a PIL image (needs ffmpeg)"""
+    if not shutil.which('ffmpeg'):
+        return None
+
+    result = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-ss', '1', '-i', path, '-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'png', '-'],
+        capture_output=True, timeout=60
+    )
+    if result.returncode != 0 or not result.stdout:
+        return None
+
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image
+
+
+# ---- Blurhash encoding (https://blurha.sh), on a small downscale of the image ----
+
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _base83(value, length):
+    return ''.join(_BASE83[(value // (83 ** (length - i - 1))) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exp):
+    return math.copysign(abs(value) ** exp, value)
+
+
+def encode_blurhash(image, components_x=4, components_y=3):
+    """Encode a blurhash placeholder string for a PIL image"""
+    small = image.convert('RGB')
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [[_srgb_to_linear(channel) for channel in pixel] for pixel in small.getdata()]
+
+    factors = []
+    for j in range(components_y):
+        for i in range(components_x):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                basis_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = basis_y * math.cos(math.pi * i * x / width)
+                    pr, pg, pb = pixels[y * width + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((components_x - 1) + (components_y - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _base83(0, 1)
+
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+
+    for factor in ac:
+        quantised = [
+            max(0, min(18, int(math.floor(_sign_pow(value / max_value, 0.5) * 9 + 9.5))))
+            for value in factor
+        ]
+        result += _base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+
+    return result
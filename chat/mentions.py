@@ -0,0 +1,69 @@
+# chat/mentions.py - @username mentions resolved against a conversation's participants
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Usernames allow letters, digits and @.+-_; a trailing dot is punctuation, not part of the name
+MENTION_RE = re.compile(r'(?<![\w@.+-])@([\w.@+-]*[\w@+-])')
+
+PARTICIPANTS_KEY = 'chat:mention_usernames:{conversation_id}'
+
+
+def extract_usernames(text):
+    """Distinct @usernames in text (lowercased), in order of first appearance"""
+    if not text or '@' not in text:
+        return []
+    return list(dict.fromkeys(name.lower() for name in MENTION_RE.findall(text)))
+
+
+def get_participant_usernames(conversation_id):
+    """{lowercased username: user id} for a conversation's participants, cached until they change"""
+    key = PARTICIPANTS_KEY.format(conversation_id=conversation_id)
+    usernames = cache.get(key)
+    if usernames is None:
+        from django.contrib.auth import get_user_model
+        usernames = {
+            username.lower(): user_id
+            for user_id, username in get_user_model().objects.filter(
+                conversations__id=conversation_id
+            ).values_list('id', 'username')
+        }
+        cache.set(key, usernames, settings.CHAT_MENTION_USERNAMES_TTL)
+    return usernames
+
+
+def forget_participant_usernames(conversation_id):
+    cache.delete(PARTICIPANTS_KEY.format(conversation_id=conversation_id))
+
+
+def resolve_mentions(conversation_id, text, exclude_user_id=None):
+    """Ids of the participants mentioned in text, in order"""
+    names = extract_usernames(text)
+    if not names:
+        return []
+    usernames = get_participant_usernames(conversation_id)
+    user_ids = dict.fromkeys(usernames[name] for name in names if name in usernames)
+    user_ids.pop(exclude_user_id, None)
+    return list(user_ids)
+
+
+def record_mentions(message):
+    """Store the MessageMention rows of a new message; returns the mentioned user ids"""
+    from .models import MessageMention
+
+    user_ids = resolve_mentions(message.conversation_id, message.content, exclude_user_id=message.sender_id)
+    if user_ids:
+        MessageMention.objects.bulk_create(
+            [
+                MessageMention(
+                    message=message,
+                    conversation_id=message.conversation_id,
+                    user_id=user_id,
+                    created_at=message.timestamp,
+                )
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+    return user_ids
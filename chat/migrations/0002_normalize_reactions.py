@@ -0,0 +1,71 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:06
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_reactions_to_table(apps, schema_editor):
+    """Copy Message.reactions JSON blobs into MessageReaction rows and build the counts"""
+    Message = apps.get_model('chat', 'Message')
+    MessageReaction = apps.get_model('chat', 'MessageReaction')
+    MessageReactionCount = apps.get_model('chat', 'MessageReactionCount')
+    User = MessageReaction._meta.get_field('user').related_model
+
+    messages = Message.objects.exclude(reactions={}).exclude(reactions__isnull=True).only('id', 'reactions')
+    for message in messages.iterator():
+        user_reactions = {
+            int(user_id): emoji
+            for user_id, emoji in message.reactions.items()
+            if str(user_id).isdigit() and emoji
+        }
+        valid_user_ids = set(User.objects.filter(id__in=user_reactions).values_list('id', flat=True))
+        already_moved = set(
+            MessageReaction.objects.filter(message=message).values_list('user_id', flat=True)
+        )
+
+        MessageReaction.objects.bulk_create([
+            MessageReaction(message=message, user_id=user_id, reaction=emoji[:10])
+            for user_id, emoji in user_reactions.items()
+            if user_id in valid_user_ids and user_id not in already_moved
+        ])
+
+    # Rebuild the denormalized counts from the normalized rows
+    MessageReactionCount.objects.all().delete()
+    counts = Counter(MessageReaction.objects.values_list('message_id', 'reaction'))
+    MessageReactionCount.objects.bulk_create(
+        [
+            MessageReactionCount(message_id=message_id, reaction=reaction, count=count)
+            for (message_id, reaction), count in counts.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageReactionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reaction', models.CharField(max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reaction_counts', to='chat.message')),
+            ],
+            options={
+                'ordering': ['-count', 'reaction'],
+                'unique_together': {('message', 'reaction')},
+            },
+        ),
+        migrations.RunPython(move_reactions_to_table, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='reactions',
+        ),
+    ]
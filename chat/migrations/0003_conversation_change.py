@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_normalize_reactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('message_id', models.UUIDField(blank=True, null=True)),
+                ('change_type', models.CharField(choices=[('created', 'Created'), ('edited', 'Edited'), ('unsent', 'Unsent'), ('reaction', 'Reaction'), ('deleted', 'Deleted'), ('cleared', 'Cleared')], max_length=10)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='chat.conversation')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['conversation', 'id'], name='chat_conver_convers_c065ce_idx')],
+            },
+        ),
+    ]
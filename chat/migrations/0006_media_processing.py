@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_media_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmedia',
+            name='blurhash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='chatmedia',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmedia',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='chatmedia',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='chatmedia',
+            index=models.Index(fields=['processing_status', 'uploaded_at'], name='chat_chatme_process_4a2525_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmedia',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['conversation', 'media_type', '-uploaded_at', '-id'], name='chatmedia_gallery_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmedia',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['conversation', '-uploaded_at', '-id'], name='chatmedia_gallery_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0009_storage_usage_and_tiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmojiUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emoji', models.CharField(max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emoji_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-count', 'emoji'],
+                'indexes': [models.Index(fields=['user', '-count'], name='emoji_usage_user_count_idx')],
+                'unique_together': {('user', 'emoji')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_emoji_usage'),
+        # Rows are merged into accounts.Notification before the table goes
+        ('accounts', '0003_unified_notifications'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ChatNotification',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_message_mention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediaupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('completing', 'Completing'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploading', max_length=10),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.26 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+def number_existing_changes(apps, schema_editor):
+    """Number each conversation's existing changes in id order and set its counter row"""
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationChange = apps.get_model('chat', 'ConversationChange')
+
+    conversation_ids = ConversationChange.objects.order_by().values_list('conversation_id', flat=True).distinct()
+    for conversation_id in list(conversation_ids):
+        changes = list(ConversationChange.objects.filter(conversation_id=conversation_id).order_by('id').only('id'))
+        for seq, change in enumerate(changes, start=1):
+            change.seq = seq
+        ConversationChange.objects.bulk_update(changes, ['seq'], batch_size=1000)
+        Conversation.objects.filter(pk=conversation_id).update(last_change_seq=len(changes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_media_upload_completing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversationchange',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='conversationchange',
+            name='seq',
+            field=models.BigIntegerField(editable=False),
+        ),
+        migrations.AlterModelOptions(
+            name='conversationchange',
+            options={'ordering': ['seq']},
+        ),
+        migrations.RemoveIndex(
+            model_name='conversationchange',
+            name='chat_conver_convers_c065ce_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='conversationchange',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='unique_change_seq_per_conversation'),
+        ),
+    ]
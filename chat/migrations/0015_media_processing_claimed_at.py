@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_conversation_change_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmedia',
+            name='processing_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
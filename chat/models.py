@@ -1,10 +1,14 @@
 # chat/models.py - FINAL COMPLETE VERSION WITH IMAGEFIELD
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.utils import timezone
+from django.urls import reverse
+from django.core.files.storage import FileSystemStorage
 import uuid
-from django.db.models import Q
+from django.db.models import Q, F, Sum, Value
+from django.db.models.functions import Greatest
 import os
+import hashlib
 from datetime import timedelta
 
 
@@ -55,6 +59,11 @@ class Conversation(models.Model):
     )
     archived_at = models.DateTimeField(null=True, blank=True)
 
+    # Counter row for Message.seq; only ever bumped with an atomic UPDATE
+    last_message_seq = models.BigIntegerField(default=0, editable=False)
+    # Counter row for ConversationChange.seq, bumped the same way
+    last_change_seq = models.BigIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['-updated_at']
         indexes = [
@@ -102,13 +111,13 @@ class Conversation(models.Model):
 
             # If this is a group, create a notification
             if self.is_group and added_by:
-                from accounts.models import Notification
-                Notification.objects.create(
+                from accounts.notification_service import notify
+                notify(
                     user=user,
                     notification_type='group_invite',
                     title="Group Invitation",
                     message=f"You were added to group '{self.group_name}' by {added_by.username}",
-                    related_url=f"/chat/{self.id}/"
+                    conversation=self
                 )
             return True
         return False
@@ -133,6 +142,36 @@ class Conversation(models.Model):
             return True
         return False
 
+    def next_message_seq(self, touched_at=None):
+        """
+        Claim the next message sequence number (call inside the message's transaction).
+        The same UPDATE claims a change-log number for the message's 'created' entry,
+        left in last_change_seq.
+        """
+        changes = {'last_message_seq': F('last_message_seq') + 1, 'last_change_seq': F('last_change_seq') + 1}
+        if touched_at is not None:
+            # Never move updated_at backwards when senders commit out of timestamp order
+            changes['updated_at'] = Greatest('updated_at', Value(touched_at))
+        Conversation.objects.filter(pk=self.pk).update(**changes)
+
+        self.last_message_seq, self.last_change_seq, self.updated_at = Conversation.objects.filter(
+            pk=self.pk
+        ).values_list('last_message_seq', 'last_change_seq', 'updated_at').get()
+        return self.last_message_seq
+
+    @staticmethod
+    def next_change_seqs(conversation_id, count=1):
+        """Claim count change-log numbers (call inside the changes' transaction); returns them as a range"""
+        Conversation.objects.filter(pk=conversation_id).update(last_change_seq=F('last_change_seq') + count)
+        last = Conversation.objects.filter(pk=conversation_id).values_list('last_change_seq', flat=True).get()
+        return range(last - count + 1, last + 1)
+
+    def mark_read_up_to(self, user, seq):
+        """Mark the other participants' messages up to seq as read in one range UPDATE; returns how many"""
+        return self.messages.filter(Q(seq__lte=seq) | Q(seq__isnull=True), is_read=False).exclude(
+            sender=user
+        ).update(is_read=True, read_at=timezone.now())
+
     def get_participant_count(self):
         """Get number of participants"""
         return self.participants.count()
@@ -172,12 +211,16 @@ class Message(models.Model):
     is_unsent = models.BooleanField(default=False)
     is_pinned = models.BooleanField(default=False)
 
-    reactions = models.JSONField(default=dict, blank=True)
-
     timestamp = models.DateTimeField(default=timezone.now)
     read_at = models.DateTimeField(null=True, blank=True)
     edited_at = models.DateTimeField(null=True, blank=True)
 
+    # Per-conversation position, gap-free in commit order (null only before backfill)
+    seq = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    # Conversation order for listings; rows not yet backfilled (null seq) predate every numbered one
+    CONVERSATION_ORDER = (F('seq').asc(nulls_first=True), 'timestamp')
+
     starred_by = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
         related_name='starred_messages',
@@ -191,6 +234,9 @@ class Message(models.Model):
             models.Index(fields=['sender', 'timestamp']),
             models.Index(fields=['is_read', 'timestamp']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='unique_message_seq_per_conversation'),
+        ]
 
     def __str__(self):
         if self.content:
@@ -203,57 +249,99 @@ class Message(models.Model):
         return f"{self.sender.username}: [Empty message]"
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-
-        if is_new:
-            # Update conversation's updated_at
-            self.conversation.updated_at = self.timestamp
-            self.conversation.save(update_fields=['updated_at'])
+        with transaction.atomic():
+            if self._state.adding and self.seq is None:
+                # The counter row stays locked until this insert commits, so seq order is commit order.
+                # The same UPDATE bumps the conversation's updated_at - no second write.
+                self.seq = self.conversation.next_message_seq(touched_at=self.timestamp)
+                self._created_change_seq = self.conversation.last_change_seq
+            super().save(*args, **kwargs)
 
     def add_reaction(self, user, emoji):
-        """Add a reaction to the message"""
-        if 'reactions' not in self.reactions:
-            self.reactions = {}
+        """Toggle a user's reaction and return (previous, current) emoji"""
+        with transaction.atomic():
+            reaction, created = MessageReaction.objects.select_for_update().get_or_create(
+                message=self,
+                user=user,
+                defaults={'reaction': emoji}
+            )
 
-        user_id_str = str(user.id)
-        if user_id_str in self.reactions:
-            if self.reactions[user_id_str] == emoji:
+            if created:
+                previous, current = None, emoji
+            elif reaction.reaction == emoji:
                 # Remove reaction if same emoji
-                del self.reactions[user_id_str]
+                reaction.delete()
+                previous, current = emoji, None
             else:
                 # Update reaction
-                self.reactions[user_id_str] = emoji
-        else:
-            # Add new reaction
-            self.reactions[user_id_str] = emoji
+                previous, current = reaction.reaction, emoji
+                reaction.reaction = emoji
+                reaction.save(update_fields=['reaction', 'updated_at'])
 
-        self.save(update_fields=['reactions'])
-        return self.reactions
+            MessageReactionCount.adjust(self, previous, -1)
+            MessageReactionCount.adjust(self, current, 1)
+            ConversationChange.record(self, 'reaction', user_id=user.id, previous=previous, current=current)
 
-    def get_reaction_summary(self):
-        """Get summary of reactions"""
-        if not self.reactions:
-            return {}
+        if current:
+            from .emoji_usage import record_emoji_usage
+            record_emoji_usage(user.id, [current])
 
-        summary = {}
-        for emoji in self.reactions.values():
-            summary[emoji] = summary.get(emoji, 0) + 1
+        return previous, current
 
-        return summary
+    def get_reaction_summary(self):
+        """Get summary of reactions (uses prefetched reaction_counts when available)"""
+        return {
+            row.reaction: row.count
+            for row in self.reaction_counts.all()
+            if row.count > 0
+        }
+
+    def get_media(self):
+        """Get the attachment's ChatMedia row (uses prefetched media_files when available)"""
+        return next(iter(self.media_files.all()), None)
 
     def get_user_reaction(self, user):
         """Get user's reaction to this message"""
-        if not self.reactions:
-            return None
-        return self.reactions.get(str(user.id))
+        return self.detailed_reactions.filter(user=user).values_list('reaction', flat=True).first()
+
+    @classmethod
+    def get_reaction_summaries(cls, message_ids):
+        """Get {message_id: {emoji: count}} for a page of messages in one query"""
+        summaries = {}
+        rows = MessageReactionCount.objects.filter(
+            message_id__in=message_ids,
+            count__gt=0
+        ).values_list('message_id', 'reaction', 'count')
+        for message_id, reaction, count in rows:
+            summaries.setdefault(message_id, {})[reaction] = count
+        return summaries
+
+    @classmethod
+    def get_user_reactions(cls, message_ids, user):
+        """Get {message_id: emoji} of a user's reactions for a page of messages in one query"""
+        return dict(
+            MessageReaction.objects.filter(
+                message_id__in=message_ids,
+                user=user
+            ).values_list('message_id', 'reaction')
+        )
 
     def edit(self, new_content):
         """Edit the message content"""
         self.content = new_content
         self.is_edited = True
         self.edited_at = timezone.now()
-        self.save(update_fields=['content', 'is_edited', 'edited_at'])
+        with transaction.atomic():
+            self.save(update_fields=['content', 'is_edited', 'edited_at'])
+            ConversationChange.record(self, 'edited')
+
+    def unsend(self):
+        """Unsend the message, keeping a placeholder in the conversation"""
+        self.is_unsent = True
+        self.content = "This message was unsent"
+        with transaction.atomic():
+            self.save(update_fields=['is_unsent', 'content'])
+            ConversationChange.record(self, 'unsent')
 
     def mark_as_read(self, user):
         """Mark message as read by a user"""
@@ -283,6 +371,10 @@ class Message(models.Model):
         audio_extensions = ['.mp3', '.wav', '.ogg', '.m4a', '.flac', '.aac', '.wma']
         return any(self.file.name.lower().endswith(ext) for ext in audio_extensions)
 
+    def get_file_url(self):
+        """Members-only URL of the attachment (served by chat.views.message_file)"""
+        return reverse('message_file', args=[self.id]) if self.file else None
+
     def get_file_size_display(self):
         """Get human-readable file size"""
         if not self.file_size:
@@ -304,7 +396,9 @@ class Message(models.Model):
     def delete_file(self):
         """Delete the associated file"""
         if self.file:
-            self.file.delete(save=False)
+            # Shared blobs only go away with their last reference
+            if not MediaBlob.release(self.file.name):
+                self.file.delete(save=False)
             self.file = None
             self.file_name = None
             self.file_size = None
@@ -376,68 +470,6 @@ class UserStatus(models.Model):
             self.save()
 
 
-class ChatNotification(models.Model):
-    """Chat-specific notifications"""
-    NOTIFICATION_TYPES = [
-        ('message', 'New Message'),
-        ('call', 'Incoming Call'),
-        ('group_invite', 'Group Invitation'),
-        ('mention', 'Mention'),
-        ('reaction', 'Message Reaction'),
-        ('reply', 'Message Reply'),
-        ('system', 'System Notification'),
-    ]
-
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='chat_notifications'
-    )
-    notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
-    title = models.CharField(max_length=255)
-    message = models.TextField()
-    related_conversation = models.ForeignKey(
-        Conversation,
-        on_delete=models.CASCADE,
-        null=True,
-        blank=True,
-        related_name='notifications'
-    )
-    related_message = models.ForeignKey(
-        Message,
-        on_delete=models.CASCADE,
-        null=True,
-        blank=True,
-        related_name='notifications'
-    )
-    is_read = models.BooleanField(default=False)
-    is_archived = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-    read_at = models.DateTimeField(null=True, blank=True)
-
-    class Meta:
-        ordering = ['-created_at']
-        indexes = [
-            models.Index(fields=['user', 'is_read', 'created_at']),
-        ]
-
-    def __str__(self):
-        return f"{self.user.username} - {self.notification_type} - {self.title}"
-
-    def mark_as_read(self):
-        """Mark notification as read"""
-        if not self.is_read:
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
-
-    def archive(self):
-        """Archive notification"""
-        self.is_archived = True
-        self.save(update_fields=['is_archived'])
-
-
 class GroupInvitation(models.Model):
     """Group invitations"""
     STATUS_CHOICES = [
@@ -501,12 +533,13 @@ class GroupInvitation(models.Model):
             )
 
             # Create notification for inviter
-            ChatNotification.objects.create(
+            from accounts.notification_service import notify
+            notify(
                 user=self.invited_by,
                 notification_type='group_invite',
                 title="Group Invitation Accepted",
                 message=f"{self.invited_user.username} accepted your invitation to join {self.conversation.group_name}",
-                related_conversation=self.conversation
+                conversation=self.conversation
             )
 
             return True
@@ -520,12 +553,13 @@ class GroupInvitation(models.Model):
             self.save()
 
             # Create notification for inviter
-            ChatNotification.objects.create(
+            from accounts.notification_service import notify
+            notify(
                 user=self.invited_by,
                 notification_type='group_invite',
                 title="Group Invitation Rejected",
                 message=f"{self.invited_user.username} declined your invitation to join {self.conversation.group_name}",
-                related_conversation=self.conversation
+                conversation=self.conversation
             )
 
             return True
@@ -539,12 +573,13 @@ class GroupInvitation(models.Model):
             self.save()
 
             # Create notification for invited user
-            ChatNotification.objects.create(
+            from accounts.notification_service import notify
+            notify(
                 user=self.invited_user,
                 notification_type='group_invite',
                 title="Group Invitation Cancelled",
                 message=f"Invitation to join {self.conversation.group_name} was cancelled",
-                related_conversation=self.conversation
+                conversation=self.conversation
             )
 
             return True
@@ -553,12 +588,13 @@ class GroupInvitation(models.Model):
     def send_notification(self):
         """Send notification for this invitation"""
         if not self.notification_sent:
-            ChatNotification.objects.create(
+            from accounts.notification_service import notify
+            notify(
                 user=self.invited_user,
                 notification_type='group_invite',
                 title="Group Invitation",
                 message=f"You are invited to join {self.conversation.group_name} by {self.invited_by.username}",
-                related_conversation=self.conversation
+                conversation=self.conversation
             )
             self.notification_sent = True
             self.save(update_fields=['notification_sent'])
@@ -763,6 +799,122 @@ class MessageReaction(models.Model):
         return f"{self.user.username} reacted with {self.reaction} to message {self.message.id}"
 
 
+class MessageReactionCount(models.Model):
+    """Denormalized per-message reaction counts, kept in step with MessageReaction"""
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='reaction_counts'
+    )
+    reaction = models.CharField(max_length=10)  # Emoji character
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['message', 'reaction']
+        ordering = ['-count', 'reaction']
+
+    def __str__(self):
+        return f"{self.reaction} x{self.count} on message {self.message_id}"
+
+    @classmethod
+    def adjust(cls, message, reaction, delta):
+        """Atomically add delta to the count for an emoji on a message"""
+        if not reaction:
+            return
+
+        rows = cls.objects.filter(message=message, reaction=reaction)
+        if delta < 0:
+            rows.filter(count__gte=-delta).update(count=F('count') + delta)
+            rows.filter(count=0).delete()
+            return
+
+        if not rows.update(count=F('count') + delta):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(message=message, reaction=reaction, count=delta)
+            except IntegrityError:
+                # Another reactor created the row first
+                rows.update(count=F('count') + delta)
+
+
+class ConversationChange(models.Model):
+    """Append-only log of message changes, replayed by clients catching up after a reconnect"""
+    CHANGE_TYPES = [
+        ('created', 'Created'),
+        ('edited', 'Edited'),
+        ('unsent', 'Unsent'),
+        ('reaction', 'Reaction'),
+        ('deleted', 'Deleted'),
+        ('cleared', 'Cleared'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='changes'
+    )
+    # The sync cursor: per-conversation, claimed under the conversation row lock so it is gap-free in
+    # commit order (ids are handed out at INSERT, and a lower id can commit after a higher one)
+    seq = models.BigIntegerField(editable=False)
+    # Plain UUID rather than a foreign key so deletions outlive their message
+    message_id = models.UUIDField(null=True, blank=True)
+    change_type = models.CharField(max_length=10, choices=CHANGE_TYPES)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='unique_change_seq_per_conversation'),
+        ]
+
+    def __str__(self):
+        return f"{self.change_type} #{self.seq} in {self.conversation_id}"
+
+    @classmethod
+    def record(cls, message, change_type, seq=None, **payload):
+        """Append a change for a single message (seq: a number already claimed in this transaction)"""
+        with transaction.atomic():
+            return cls.objects.create(
+                conversation_id=message.conversation_id,
+                seq=seq or Conversation.next_change_seqs(message.conversation_id)[0],
+                message_id=message.id,
+                change_type=change_type,
+                payload=payload
+            )
+
+    @classmethod
+    def record_cleared(cls, conversation):
+        """Append a marker telling clients every earlier message is gone"""
+        with transaction.atomic():
+            return cls.objects.create(
+                conversation=conversation,
+                seq=Conversation.next_change_seqs(conversation.pk)[0],
+                change_type='cleared'
+            )
+
+    @classmethod
+    def record_deletions(cls, conversation, message_ids):
+        """Append one deletion entry per removed message"""
+        if not message_ids:
+            return
+        with transaction.atomic():
+            seqs = Conversation.next_change_seqs(conversation.pk, len(message_ids))
+            cls.objects.bulk_create([
+                cls(conversation=conversation, seq=seq, message_id=message_id, change_type='deleted')
+                for seq, message_id in zip(seqs, message_ids)
+            ])
+
+    @classmethod
+    def latest_cursor(cls, conversation):
+        """
+        Get the newest committed change number in a conversation, or 0. Read from the counter row:
+        a number only becomes visible there once the transaction that claimed it has committed.
+        """
+        return Conversation.objects.filter(pk=conversation.pk).values_list('last_change_seq', flat=True).get()
+
+
 class PinnedMessage(models.Model):
     """Pinned messages in conversations"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -878,6 +1030,19 @@ class ChatMedia(models.Model):
         blank=True
     )
 
+    # Filled in by chat.media after upload
+    PROCESSING_STATUS = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    renditions = models.JSONField(default=dict, blank=True)  # {"<width>": storage name} of WebP thumbnails
+    blurhash = models.CharField(max_length=64, blank=True)
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_STATUS, default='pending')
+    processing_claimed_at = models.DateTimeField(null=True, blank=True)  # Rows stuck in processing are released
+    processed_at = models.DateTimeField(null=True, blank=True)
+
     # Metadata
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -902,11 +1067,51 @@ class ChatMedia(models.Model):
         indexes = [
             models.Index(fields=['conversation', 'media_type', 'uploaded_at']),
             models.Index(fields=['uploaded_by', 'uploaded_at']),
+            models.Index(fields=['processing_status', 'uploaded_at']),
+            # Gallery browsing only ever looks at live rows
+            models.Index(
+                fields=['conversation', 'media_type', '-uploaded_at', '-id'],
+                condition=Q(is_deleted=False),
+                name='chatmedia_gallery_type_idx'
+            ),
+            models.Index(
+                fields=['conversation', '-uploaded_at', '-id'],
+                condition=Q(is_deleted=False),
+                name='chatmedia_gallery_idx'
+            ),
         ]
 
     def __str__(self):
         return f"{self.media_type}: {self.file_name}"
 
+    def get_file_url(self):
+        """Members-only URL of the original file"""
+        return reverse('chat_media_file', args=[self.id])
+
+    def get_rendition_urls(self):
+        """Get [(width, url)] of the WebP renditions, smallest first"""
+        url = self.get_file_url()
+        return [
+            (int(width), f"{url}?w={width}")
+            for width in sorted(self.renditions, key=int)
+        ]
+
+    def get_srcset(self):
+        """srcset attribute value so the browser fetches the smallest adequate rendition"""
+        return ', '.join(f"{url} {width}w" for width, url in self.get_rendition_urls())
+
+    def get_thumbnail_url(self):
+        """Smallest rendition, for grids; None until processing has produced one"""
+        urls = self.get_rendition_urls()
+        return urls[0][1] if urls else None
+
+    def get_display_url(self, max_width=480):
+        """Largest rendition up to max_width, falling back to the original"""
+        candidates = [url for width, url in self.get_rendition_urls() if width <= max_width]
+        if candidates:
+            return candidates[-1]
+        return self.get_file_url() if self.file else ''
+
     def get_file_size_display(self):
         """Get human-readable file size"""
         size = self.file_size
@@ -919,16 +1124,416 @@ class ChatMedia(models.Model):
     def delete_file(self):
         """Delete the actual file from storage"""
         if self.file:
-            self.file.delete(save=False)
+            # Shared blobs only go away with their last reference. A legacy file outside the
+            # blob store belongs to the message it was sent with, which deletes it itself
+            MediaBlob.release(self.file.name)
         if self.thumbnail:
             self.thumbnail.delete(save=False)
+        for name in self.renditions.values():
+            self.thumbnail.storage.delete(name)
 
     def mark_as_deleted(self, user):
         """Mark media as deleted"""
+        was_deleted = self.is_deleted
         self.is_deleted = True
         self.deleted_at = timezone.now()
         self.deleted_by = user
-        self.save(update_fields=['is_deleted', 'deleted_at', 'deleted_by'])
+        with transaction.atomic():
+            self.save(update_fields=['is_deleted', 'deleted_at', 'deleted_by'])
+            if not was_deleted:
+                StorageUsage.track_media(self, -1)
+
+    @staticmethod
+    def get_media_type(mime_type):
+        """Map a MIME type onto one of MEDIA_TYPES"""
+        mime_type = mime_type or ''
+        if mime_type == 'image/gif':
+            return 'gif'
+        for prefix in ('image', 'video', 'audio'):
+            if mime_type.startswith(prefix + '/'):
+                return prefix
+        return 'document'
+
+    @classmethod
+    def create_for_message(cls, message, mime_type):
+        """Register a message attachment in the conversation's media library"""
+        MediaBlob.acquire(message.file.name)
+        return cls.objects.create(
+            message=message,
+            conversation=message.conversation,
+            media_type=cls.get_media_type(mime_type),
+            file=message.file.name,
+            file_name=message.file_name or os.path.basename(message.file.name),
+            file_size=message.file_size or 0,
+            mime_type=mime_type or 'application/octet-stream',
+            uploaded_by=message.sender
+        )
+
+
+class MediaBlob(models.Model):
+    """A stored file addressed by its sha256, shared by every Message.file / ChatMedia.file that points at it"""
+    TIERS = [
+        ('hot', 'Hot'),
+        ('cold', 'Cold'),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='media_blobs/', max_length=255, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    tier = models.CharField(max_length=4, choices=TIERS, default='hot')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_referenced_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['tier', 'last_referenced_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} x{self.ref_count}"
+
+    @staticmethod
+    def get_cold_storage():
+        """Storage for originals moved out of the hot media root"""
+        return FileSystemStorage(location=settings.CHAT_COLD_STORAGE_ROOT)
+
+    def get_storage(self):
+        """Storage currently holding this blob's bytes"""
+        return self.get_cold_storage() if self.tier == 'cold' else self.file.storage
+
+    @classmethod
+    def storage_for(cls, field_file):
+        """Storage holding a Message/ChatMedia file, following blobs moved to cold storage"""
+        if cls.objects.filter(file=field_file.name, tier='cold').exists():
+            return cls.get_cold_storage()
+        return field_file.storage
+
+    @staticmethod
+    def hash_file(content):
+        """sha256 of a file-like object, read in chunks"""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for block in iter(lambda: content.read(1024 * 1024), b''):
+            digest.update(block)
+        content.seek(0)
+        return digest.hexdigest()
+
+    @classmethod
+    def find(cls, sha256, size=None):
+        """Get the blob for a checksum (and size, when given), or None"""
+        blobs = cls.objects.filter(sha256=sha256, ref_count__gt=0)
+        if size is not None:
+            blobs = blobs.filter(size=size)
+        return blobs.first()
+
+    @classmethod
+    def find_visible(cls, sha256, size, user):
+        """Get the blob for a checksum and size only if it is already attached in one of user's conversations"""
+        blob = cls.find(sha256, size)
+        if blob and Message.objects.filter(
+            file=blob.file.name, conversation__participants=user, is_unsent=False
+        ).exists():
+            return blob
+        return None
+
+    @classmethod
+    def store(cls, content, file_name, sha256=None):
+        """
+        Store content once per checksum and take one reference; returns the storage name.
+        Call it in the same transaction as the save that points at the name, so a failed save
+        gives the reference back; then pass the name to delete_if_unreferenced on failure.
+        """
+        sha256 = sha256 or cls.hash_file(content)
+        storage = cls._meta.get_field('file').storage
+
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(sha256=sha256).first()
+            if blob:
+                cls.objects.filter(pk=blob.pk).update(
+                    ref_count=F('ref_count') + 1, last_referenced_at=timezone.now()
+                )
+                return blob.file.name
+
+        # Unique per blob row: a late delete of a released blob can never hit a re-stored copy
+        ext = os.path.splitext(file_name)[1].lower()[:10]
+        name = storage.save(f'media_blobs/{sha256[:2]}/{sha256}-{uuid.uuid4().hex[:12]}{ext}', content)
+        try:
+            with transaction.atomic():
+                cls.objects.create(sha256=sha256, file=name, size=storage.size(name), ref_count=1)
+        except IntegrityError:
+            # Someone stored the same content concurrently; use theirs
+            storage.delete(name)
+            cls.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+            return cls.objects.get(sha256=sha256).file.name
+        except Exception:
+            storage.delete(name)
+            raise
+        return name
+
+    @classmethod
+    def acquire(cls, name):
+        """Take another reference on a stored blob; False if name is not a managed blob"""
+        return bool(name) and cls.objects.filter(file=name).update(
+            ref_count=F('ref_count') + 1, last_referenced_at=timezone.now()
+        ) > 0
+
+    @classmethod
+    def release(cls, name):
+        """Drop a reference, deleting the stored file with the last one; False if name is not a managed blob"""
+        if not name:
+            return False
+
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(file=name).first()
+            if blob is None:
+                return False
+
+            if blob.ref_count > 1:
+                cls.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            else:
+                blob.delete()
+                storage = blob.get_storage()
+                transaction.on_commit(lambda: cls.delete_if_unreferenced(name, storage))
+        return True
+
+    @classmethod
+    def delete_if_unreferenced(cls, name, storage=None):
+        """Delete a stored blob file unless a blob row points at it (released, or its transaction rolled back)"""
+        if name and not cls.objects.filter(file=name).exists():
+            (storage or cls._meta.get_field('file').storage).delete(name)
+
+
+class StorageUsage(models.Model):
+    """Running totals of live attachment bytes, one row per user or per conversation"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='storage_usage'
+    )
+    conversation = models.OneToOneField(
+        Conversation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='storage_usage'
+    )
+    bytes_used = models.BigIntegerField(default=0)
+    file_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=Q(user__isnull=False, conversation__isnull=True) | Q(user__isnull=True, conversation__isnull=False),
+                name='storage_usage_single_owner'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user or self.conversation}: {self.bytes_used} bytes"
+
+    @classmethod
+    def adjust(cls, delta_bytes, delta_files, **owner):
+        """Atomically add to one owner's counters; owner is user_id=... or conversation_id=..."""
+        updated = cls.objects.filter(**owner).update(
+            bytes_used=F('bytes_used') + delta_bytes,
+            file_count=F('file_count') + delta_files,
+            updated_at=timezone.now()
+        )
+        if updated or delta_bytes < 0:
+            # Never create rows on the way down (the owner may be mid-deletion)
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(bytes_used=delta_bytes, file_count=delta_files, **owner)
+        except IntegrityError:
+            cls.objects.filter(**owner).update(
+                bytes_used=F('bytes_used') + delta_bytes,
+                file_count=F('file_count') + delta_files
+            )
+
+    @classmethod
+    def track_media(cls, media, sign):
+        """Count (sign=1) or uncount (sign=-1) a ChatMedia row for its uploader and conversation"""
+        cls.adjust(sign * media.file_size, sign, user_id=media.uploaded_by_id)
+        cls.adjust(sign * media.file_size, sign, conversation_id=media.conversation_id)
+
+    @classmethod
+    def get_bytes_used(cls, user):
+        """Get a user's counted bytes"""
+        return cls.objects.filter(user=user).values_list('bytes_used', flat=True).first() or 0
+
+    @classmethod
+    def check_quota(cls, user, incoming_bytes):
+        """True if the user can store incoming_bytes more"""
+        return cls.get_bytes_used(user) + incoming_bytes <= settings.CHAT_STORAGE_QUOTA_BYTES
+
+
+class MediaUpload(models.Model):
+    """A resumable upload in progress; chunks land in a temp file until it is completed"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('completing', 'Completing'),  # Claimed by upload_complete
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='media_uploads'
+    )
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='media_uploads'
+    )
+    file_name = models.CharField(max_length=255)
+    mime_type = models.CharField(max_length=100)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    checksum = models.CharField(max_length=64, blank=True)  # sha256 hex, from client or computed
+    deduplicated = models.BooleanField(default=False)  # Content already stored; no chunks needed
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['uploaded_by', 'status']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received_size}/{self.total_size})"
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.CHAT_UPLOAD_TEMP_DIR, f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.received_size >= self.total_size
+
+    @classmethod
+    def get_in_flight_bytes(cls, user):
+        """Bytes of uploads user has started but not completed, counted against the quota up front"""
+        return cls.objects.filter(
+            uploaded_by=user, status__in=['uploading', 'completing']
+        ).aggregate(total=Sum('total_size'))['total'] or 0
+
+    def write_chunk(self, stream, offset, length):
+        """Stream one chunk from `stream` into the temp file at `offset`; returns new received_size"""
+        os.makedirs(settings.CHAT_UPLOAD_TEMP_DIR, exist_ok=True)
+        mode = 'r+b' if os.path.exists(self.temp_path) else 'wb'
+        written = 0
+        with open(self.temp_path, mode) as part:
+            part.seek(offset)
+            while written < length:
+                block = stream.read(min(64 * 1024, length - written))
+                if not block:
+                    break
+                part.write(block)
+                written += len(block)
+            # Drop anything a previously interrupted attempt left past this chunk
+            part.truncate(offset + written)
+
+        if written != length:
+            raise ValueError(f'Chunk truncated: expected {length} bytes, got {written}')
+
+        # Only advance if nobody else moved the offset while we were writing
+        advanced = MediaUpload.objects.filter(
+            pk=self.pk, status='uploading', received_size=offset
+        ).update(received_size=offset + length, updated_at=timezone.now())
+        if not advanced:
+            raise ValueError('Upload offset changed during write')
+        self.received_size = offset + length
+        return self.received_size
+
+    def compute_checksum(self):
+        """sha256 of the assembled temp file, read in blocks"""
+        digest = hashlib.sha256()
+        with open(self.temp_path, 'rb') as part:
+            for block in iter(lambda: part.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def discard_temp_file(self):
+        """Remove the temp file if it is still around"""
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class EmojiUsage(models.Model):
+    """
+    Durable snapshot of a user's bounded emoji counters for the picker's frequent section.
+    The live space-saving counters sit in Redis; flush_emoji_usage copies them here.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='emoji_usage'
+    )
+    emoji = models.CharField(max_length=32)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'emoji']
+        ordering = ['-count', 'emoji']
+        indexes = [
+            models.Index(fields=['user', '-count'], name='emoji_usage_user_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.emoji} x{self.count}"
+
+
+class MessageMention(models.Model):
+    """A participant @mentioned in a message; feeds mention notifications and the "mentions of me" list"""
+    id = models.BigAutoField(primary_key=True)
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='mentions'
+    )
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='mentions'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='mentions'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['message', 'user']
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='mention_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} mentioned in message {self.message_id}"
 
 
 # Signal handlers
@@ -938,26 +1543,98 @@ from django.dispatch import receiver
 
 @receiver(post_save, sender=Message)
 def create_message_notification(sender, instance, created, **kwargs):
-    """Create chat notification for new messages"""
+    """
+    Record @mentions and notify the other participants about a new message (one INSERT for all
+    of them); mentioned participants get a mention notification instead of the message one
+    """
     if created and not instance.is_unsent:
-        # Create notifications for other participants
-        for participant in instance.conversation.participants.exclude(id=instance.sender.id):
-            # Check if participant has muted this conversation
-            settings = ConversationSettings.objects.filter(
-                user=participant,
-                conversation=instance.conversation,
-                mute_notifications=True
-            ).exists()
-
-            if not settings:
-                ChatNotification.objects.create(
-                    user=participant,
-                    notification_type='message',
-                    title=f"New message from {instance.sender.username}",
-                    message=instance.content[:100] if instance.content else f"Sent a {instance.message_type}",
-                    related_conversation=instance.conversation,
-                    related_message=instance
-                )
+        # After commit: Message.save holds the conversation row lock until then, and every other
+        # sender in the conversation would queue behind this fan-out
+        transaction.on_commit(lambda: _notify_new_message(instance), robust=True)
+
+
+def _notify_new_message(instance):
+    from accounts.models import BlockedUser
+    from accounts.notification_service import notify_many
+    from .mentions import record_mentions
+
+    mentioned = record_mentions(instance) if instance.message_type == 'text' else []
+
+    recipients = instance.conversation.participants.exclude(id=instance.sender_id).exclude(
+        id__in=ConversationSettings.objects.filter(
+            conversation=instance.conversation,
+            mute_notifications=True
+        ).values('user_id')
+    ).exclude(
+        id__in=BlockedUser.objects.filter(blocked_id=instance.sender_id).values('blocker_id')
+    )
+
+    content = instance.content or ''
+    if instance.message_type == 'text':
+        preview = content[:100] + "..." if len(content) > 100 else content
+    elif instance.message_type == 'emoji':
+        preview = "Sent an emoji"
+    else:
+        preview = f"Sent a {instance.message_type}"
+
+    if mentioned:
+        notify_many(
+            recipients.filter(id__in=mentioned),
+            'mention',
+            f"{instance.sender.username} mentioned you",
+            preview,
+            conversation=instance.conversation,
+            related_message=instance
+        )
+        recipients = recipients.exclude(id__in=mentioned)
+
+    notify_many(
+        recipients,
+        'message',
+        f"New message from {instance.sender.username}",
+        preview,
+        conversation=instance.conversation,
+        related_message=instance
+    )
+
+
+@receiver(post_save, sender=Message)
+def update_unread_chats_badge(sender, instance, created, **kwargs):
+    """Add the conversation to the other participants' cached unread chats"""
+    if created and not instance.is_read:
+        # After commit, like the notifications: cache round trips must not extend the row lock
+        transaction.on_commit(lambda: _mark_chat_unread(instance), robust=True)
+
+
+def _mark_chat_unread(instance):
+    from accounts import badge_counts
+    from .mentions import get_participant_usernames
+    participant_ids = set(get_participant_usernames(instance.conversation_id).values())
+    participant_ids.discard(instance.sender_id)
+    badge_counts.chat_became_unread(participant_ids, instance.conversation_id)
+
+
+@receiver(post_save, sender=Message)
+def record_message_created(sender, instance, created, **kwargs):
+    """Log new messages so reconnecting clients can pick them up (in the message's own transaction)"""
+    if created:
+        # Message.save claimed the number along with seq, saving a second UPDATE under the lock
+        ConversationChange.record(instance, 'created', seq=getattr(instance, '_created_change_seq', None))
+
+
+@receiver(post_save, sender=Message)
+def count_message_emojis(sender, instance, created, **kwargs):
+    """Feed the sender's frequent-emoji counters"""
+    if created and instance.content and not instance.is_unsent:
+        from .emoji_usage import record_emoji_usage, extract_emojis
+        record_emoji_usage(instance.sender_id, extract_emojis(instance.content))
+
+
+@receiver(post_delete, sender=Message)
+def release_message_file(sender, instance, **kwargs):
+    """Drop the message's reference on a shared media blob"""
+    if instance.file:
+        MediaBlob.release(instance.file.name)
 
 
 @receiver(post_save, sender=GroupInvitation)
@@ -970,6 +1647,12 @@ def send_group_invitation_notification(sender, instance, created, **kwargs):
 @receiver(m2m_changed, sender=Conversation.participants.through)
 def conversation_participants_changed(sender, instance, action, pk_set, **kwargs):
     """Handle conversation participants changes"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        from .mentions import forget_participant_usernames
+        # Changed from the user side (user.conversations.add) the conversations are in pk_set
+        for conversation_id in [instance.id] if isinstance(instance, Conversation) else pk_set or []:
+            forget_participant_usernames(conversation_id)
+
     if action == "post_add":
         # New participants added
         for user_id in pk_set:
@@ -991,18 +1674,36 @@ def create_call_notification(sender, instance, created, **kwargs):
     """Create notification for new calls"""
     if created:
         call_type = "Video" if instance.call_type == 'video' else "Voice"
-        ChatNotification.objects.create(
+        from accounts.notification_service import notify
+        notify(
             user=instance.recipient,
             notification_type='call',
             title=f"Incoming {call_type} Call",
             message=f"{instance.caller.username} is calling you",
-            related_conversation=instance.conversation
+            conversation=instance.conversation
         )
 
 
+@receiver(post_save, sender=ChatMedia)
+def queue_media_processing(sender, instance, created, **kwargs):
+    """Generate thumbnails and metadata in the background after upload"""
+    if created and instance.processing_status == 'pending':
+        from .media import schedule_media_processing
+        schedule_media_processing(instance.id)
+
+
+@receiver(post_save, sender=ChatMedia)
+def count_media_storage(sender, instance, created, **kwargs):
+    """Add new uploads to the storage quota counters"""
+    if created and not instance.is_deleted:
+        StorageUsage.track_media(instance, 1)
+
+
 @receiver(post_delete, sender=ChatMedia)
 def delete_media_file(sender, instance, **kwargs):
     """Delete actual media files when record is deleted"""
+    if not instance.is_deleted:
+        StorageUsage.track_media(instance, -1)
     instance.delete_file()
 
 
@@ -0,0 +1,113 @@
+# chat/serving.py - Protected media responses: proxy offload or Range/ETag aware streaming
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# The only types shown in the page; anything else (HTML, SVG, PDF...) is downloaded, since the
+# content type comes from the uploader and an inline document would run on the app's origin
+INLINE_CONTENT_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif', 'image/bmp',
+    'video/mp4', 'video/webm', 'video/ogg', 'video/quicktime',
+    'audio/mpeg', 'audio/ogg', 'audio/wav', 'audio/x-wav', 'audio/webm', 'audio/mp4', 'audio/aac', 'audio/flac',
+}
+
+
+def protected_file_response(request, storage, name, file_name=None, content_type=None, accel_prefix=None):
+    """
+    Serve a stored file after the caller has checked access.
+
+    With CHAT_MEDIA_ACCEL set the front proxy streams the bytes (X-Accel-Redirect for
+    nginx, X-Sendfile for Apache/lighttpd); otherwise Django streams them itself,
+    honouring Range, ETag and If-None-Match.
+    """
+    file_name = file_name or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+    size = storage.size(name)
+    try:
+        modified = int(storage.get_modified_time(name).timestamp())
+    except NotImplementedError:
+        modified = 0
+    etag = f'"{size:x}-{modified:x}"'
+
+    accel = getattr(settings, 'CHAT_MEDIA_ACCEL', '')
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == 'nginx':
+            prefix = accel_prefix or settings.CHAT_MEDIA_ACCEL_PREFIX
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+        else:
+            response['X-Sendfile'] = storage.path(name)
+        response['ETag'] = etag
+        return _with_media_headers(response, file_name, content_type)
+
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return _with_media_headers(response, file_name, content_type, disposition=False)
+
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.headers.get('Range', '')
+    if_range = request.headers.get('If-Range')
+    match = RANGE_RE.match(range_header.strip()) if range_header and size else None
+
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if match and (if_range is None or if_range == etag):
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            # Suffix range: the final N bytes
+            start = max(size - int(last), 0)
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        status = 206
+
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _stream_range(storage, name, start, length),
+        status=status,
+        content_type=content_type
+    )
+    response['Content-Length'] = str(length)
+    response['ETag'] = etag
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _with_media_headers(response, file_name, content_type)
+
+
+def _with_media_headers(response, file_name, content_type, disposition=True):
+    response['Accept-Ranges'] = 'bytes'
+    # Members-only content: browsers may cache it, shared caches must not
+    response['Cache-Control'] = 'private, max-age=86400'
+    # Never sniff uploads into something executable, and run none of their scripts if opened directly
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+    if disposition:
+        inline = content_type.split(';')[0].strip().lower() in INLINE_CONTENT_TYPES
+        response['Content-Disposition'] = content_disposition_header(not inline, file_name)
+    return response
+
+
+def _stream_range(storage, name, start, length):
+    with storage.open(name, 'rb') as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = handle.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
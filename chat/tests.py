@@ -1,3 +1,1062 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from django.utils import timezone
+
+from accounts.models import CustomUser, Notification
+from messenger.pagination import decode_cursor, encode_cursor
+from . import emoji_usage
+from .consumers import ChatConsumer
+from .emoji_utils import count_graphemes, find_emojis, get_text_message_type
+from .mentions import extract_usernames
+from .media import process_media, release_stale as release_stale_media, schedule_media_processing
+from .models import (
+    ChatMedia, Conversation, ConversationChange, EmojiUsage, MediaBlob, MediaUpload, Message, MessageMention,
+    MessageReaction, MessageReactionCount, StorageUsage
+)
+from .utils import EmojiManager, get_conversation_group_name, send_reaction_delta
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def make_user(username):
+    return CustomUser.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+
+
+def make_png(width=640, height=480, color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_conversation(*users, is_group=False):
+    conversation = Conversation.objects.create(is_group=is_group, group_name='Group' if is_group else None)
+    conversation.participants.add(*users)
+    return conversation
+
+
+@override_settings(CHAT_MEDIA_PROCESS_IN_BACKGROUND=False)
+class MediaTestCase(TestCase):
+    """Keeps uploaded, temporary and cold files in a scratch directory"""
+    def setUp(self):
+        scratch = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch, ignore_errors=True)
+        scratch_settings = override_settings(
+            MEDIA_ROOT=os.path.join(scratch, 'media'),
+            CHAT_UPLOAD_TEMP_DIR=os.path.join(scratch, 'uploads'),
+            CHAT_COLD_STORAGE_ROOT=os.path.join(scratch, 'cold'),
+        )
+        scratch_settings.enable()
+        self.addCleanup(scratch_settings.disable)
+
+    def start_upload(self, conversation, data, **metadata):
+        metadata = {'file_name': 'notes.txt', 'total_size': len(data), 'mime_type': 'text/plain', **metadata}
+        response = self.client.post(
+            f'/chat/upload/{conversation.id}/init/', json.dumps(metadata), content_type='application/json', **AJAX
+        )
+        return response
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            f'/chat/upload/chunk/{upload_id}/', chunk, content_type='application/octet-stream',
+            HTTP_X_UPLOAD_OFFSET=str(offset), **AJAX
+        )
+
+    def complete(self, upload_id, **body):
+        return self.client.post(
+            f'/chat/upload/complete/{upload_id}/', json.dumps(body), content_type='application/json', **AJAX
+        )
+
+    def send_file(self, conversation, data, name='photo.png', content_type='image/png', content=''):
+        """Send an attachment through send_message_ajax as the logged-in user; returns the Message"""
+        response = self.client.post(f'/chat/send-message/{conversation.id}/', {
+            'content': content, 'file': SimpleUploadedFile(name, data, content_type=content_type)
+        }, **AJAX)
+        self.assertTrue(response.json()['success'], response.content)
+        return Message.objects.get(id=response.json()['message_id'])
+
+    def stored_files(self, directory='media_blobs'):
+        """Names of the files under a directory of the media root"""
+        root = os.path.join(settings.MEDIA_ROOT, directory)
+        return sorted(name for _, _, names in os.walk(root) for name in names)
+
+    def upload(self, conversation, data, **metadata):
+        upload_id = self.start_upload(conversation, data, **metadata).json()['upload_id']
+        if data:
+            self.put_chunk(upload_id, 0, data)
+        return upload_id
+
+
+class ReactionCountTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='hi')
+
+    def test_counts_follow_reaction_rows(self):
+        reactors = [self.alice, self.bob] + [make_user(f'user{i}') for i in range(6)]
+        for user in reactors:
+            self.message.add_reaction(user, '👍')
+        for user in reactors[:3]:
+            self.message.add_reaction(user, '❤️')
+
+        self.assertEqual(self.message.get_reaction_summary(), {'👍': 5, '❤️': 3})
+        self.assertEqual(MessageReaction.objects.filter(message=self.message).count(), 8)
+
+    def test_same_emoji_twice_removes_the_reaction(self):
+        self.assertEqual(self.message.add_reaction(self.bob, '👍'), (None, '👍'))
+        self.assertEqual(self.message.add_reaction(self.bob, '👍'), ('👍', None))
+
+        self.assertEqual(self.message.get_reaction_summary(), {})
+        self.assertFalse(MessageReactionCount.objects.filter(message=self.message).exists())
+        self.assertIsNone(self.message.get_user_reaction(self.bob))
+
+    def test_switching_emoji_moves_the_count(self):
+        self.message.add_reaction(self.alice, '👍')
+        self.message.add_reaction(self.bob, '👍')
+        self.assertEqual(self.message.add_reaction(self.bob, '😂'), ('👍', '😂'))
+
+        self.assertEqual(self.message.get_reaction_summary(), {'👍': 1, '😂': 1})
+        self.assertEqual(self.message.get_user_reaction(self.bob), '😂')
+
+    def test_count_never_goes_below_zero(self):
+        MessageReactionCount.adjust(self.message, '👍', 1)
+        MessageReactionCount.adjust(self.message, '👍', -1)
+        MessageReactionCount.adjust(self.message, '👍', -1)
+
+        self.assertFalse(MessageReactionCount.objects.filter(message=self.message).exists())
+
+    def test_concurrent_first_reactions_both_count(self):
+        # A rival reactor inserts the count row between our UPDATE (0 rows) and our INSERT
+        update = QuerySet.update
+        raced = []
+
+        def update_then_rival_inserts(queryset, **kwargs):
+            updated = update(queryset, **kwargs)
+            if queryset.model is MessageReactionCount and not raced:
+                raced.append(True)
+                MessageReactionCount.objects.create(message=self.message, reaction='🎉', count=1)
+            return updated
+
+        with mock.patch.object(QuerySet, 'update', update_then_rival_inserts):
+            MessageReactionCount.adjust(self.message, '🎉', 1)
+
+        self.assertEqual(MessageReactionCount.objects.get(message=self.message, reaction='🎉').count, 2)
+
+    def test_page_summaries_load_in_one_query_each(self):
+        other = Message.objects.create(conversation=self.conversation, sender=self.bob, content='yo')
+        self.message.add_reaction(self.bob, '👍')
+        other.add_reaction(self.alice, '😂')
+        other.add_reaction(self.bob, '😂')
+        ids = [self.message.id, other.id]
+
+        with self.assertNumQueries(1):
+            summaries = Message.get_reaction_summaries(ids)
+        with self.assertNumQueries(1):
+            mine = Message.get_user_reactions(ids, self.bob)
+
+        self.assertEqual(summaries, {self.message.id: {'👍': 1}, other.id: {'😂': 2}})
+        self.assertEqual(mine, {self.message.id: '👍', other.id: '😂'})
+
+
+class ConversationEventTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='hi')
+
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.flush)()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(get_conversation_group_name(self.conversation.id), self.channel)
+        self.client.force_login(self.alice)
+
+    def post(self, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, json.dumps(data), content_type='application/json', **AJAX)
+        self.assertTrue(response.json()['success'])
+        return async_to_sync(self.layer.receive)(self.channel)
+
+    def test_reaction_publishes_a_delta(self):
+        event = self.post(f'/chat/react-to-message/{self.message.id}/', {'reaction': '👍'})
+        self.assertEqual(event, {
+            'type': 'reaction_delta', 'message_id': str(self.message.id),
+            'user_id': self.alice.id, 'previous': None, 'current': '👍',
+        })
+
+        event = self.post(f'/chat/react-to-message/{self.message.id}/', {'reaction': '😂'})
+        self.assertEqual((event['previous'], event['current']), ('👍', '😂'))
+
+    def test_edit_and_unsend_publish_message_updated(self):
+        event = self.post(f'/chat/edit-message/{self.message.id}/', {'content': 'hello'})
+        self.assertEqual(event['type'], 'message_updated')
+        self.assertEqual((event['content'], event['is_edited'], event['is_unsent']), ('hello', True, False))
+        self.assertIsNotNone(event['edited_at'])
+
+        event = self.post(f'/chat/unsend-message/{self.message.id}/', {})
+        self.assertEqual(event['message_id'], str(self.message.id))
+        self.assertTrue(event['is_unsent'])
+
+    def test_nothing_is_published_for_a_rolled_back_change(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    send_reaction_delta(self.message, self.alice, None, '👍')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_consumer_forwards_the_delta(self):
+        consumer = ChatConsumer()
+        consumer.send = mock.AsyncMock()
+        async_to_sync(consumer.reaction_delta)({
+            'type': 'reaction_delta', 'message_id': 'm', 'user_id': 1, 'previous': '👍', 'current': None,
+        })
+        self.assertEqual(json.loads(consumer.send.call_args.kwargs['text_data']), {
+            'type': 'reaction_delta', 'message_id': 'm', 'user_id': 1, 'previous': '👍', 'current': None,
+        })
+
+
+class SyncMessagesTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.client.force_login(self.bob)
+
+    def send(self, content, sender=None):
+        return Message.objects.create(conversation=self.conversation, sender=sender or self.alice, content=content)
+
+    def sync(self, since=None):
+        query = {} if since is None else {'since': since}
+        return self.client.get(f'/chat/sync-messages/{self.conversation.id}/', query, **AJAX).json()
+
+    def test_without_a_cursor_the_client_is_told_to_reload(self):
+        self.send('one')
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['cursor'], ConversationChange.latest_cursor(self.conversation))
+
+    def test_returns_only_what_changed_after_the_cursor(self):
+        first = self.send('one')
+        cursor = self.sync()['cursor']
+        second = self.send('two')
+        first.edit('one, edited')
+
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual([m['id'] for m in data['messages']], [str(first.id), str(second.id)])
+        self.assertEqual(data['messages'][0]['content'], 'one, edited')
+        self.assertEqual(data['cursor'], ConversationChange.latest_cursor(self.conversation))
+        self.assertEqual(self.sync(data['cursor'])['messages'], [])
+
+    def test_delta_is_in_seq_order_whatever_the_timestamps(self):
+        cursor = self.sync()['cursor']
+        first = self.send('one')
+        second = self.send('two')
+        # The second writer's clock was behind
+        Message.objects.filter(id=second.id).update(timestamp=timezone.now() - timedelta(hours=1))
+
+        data = self.sync(cursor)
+        self.assertEqual([m['id'] for m in data['messages']], [str(first.id), str(second.id)])
+
+    def test_deleted_and_cleared_are_reported(self):
+        kept = self.send('kept')
+        gone = self.send('gone')
+        cursor = self.sync()['cursor']
+        gone_id = gone.id
+        ConversationChange.record_deletions(self.conversation, [gone_id])
+        gone.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted'], [str(gone_id)])
+        self.assertEqual(data['messages'], [])
+
+        self.client.post(f'/chat/clear-conversation/{self.conversation.id}/', **AJAX)
+        data = self.sync(data['cursor'])
+        self.assertTrue(data['cleared'])
+        self.assertFalse(Message.objects.filter(id=kept.id).exists())
+
+    def test_long_gaps_come_back_in_pages(self):
+        message = self.send('one')
+        cursor = self.sync()['cursor']
+        seqs = Conversation.next_change_seqs(self.conversation.id, 501)
+        ConversationChange.objects.bulk_create([
+            ConversationChange(conversation=self.conversation, seq=seq, message_id=message.id, change_type='edited')
+            for seq in seqs
+        ])
+
+        page = self.sync(cursor)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['cursor'], cursor + 500)
+        page = self.sync(page['cursor'])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(page['cursor'], seqs[-1])
+
+
+class MessageSeqTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.client.force_login(self.bob)
+
+    def send(self, content, sender=None, **fields):
+        return Message.objects.create(
+            conversation=self.conversation, sender=sender or self.alice, content=content, **fields
+        )
+
+    def test_seq_counts_up_without_gaps_per_conversation(self):
+        other = make_conversation(self.alice, self.bob)
+        earlier = timezone.now() - timedelta(days=1)
+        seqs = [self.send(str(i), timestamp=earlier if i % 2 else timezone.now()).seq for i in range(5)]
+        Message.objects.create(conversation=other, sender=self.bob, content='elsewhere')
+
+        self.assertEqual(seqs, [1, 2, 3, 4, 5])
+        self.assertEqual(Message.objects.get(conversation=other).seq, 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_seq, 5)
+
+    def test_listing_pages_by_seq_range(self):
+        messages = [self.send(str(i)) for i in range(6)]
+        url = f'/chat/get-messages/{self.conversation.id}/'
+
+        after = self.client.get(url, {'after_seq': 4}, **AJAX).json()['messages']
+        before = self.client.get(url, {'before_seq': 3}, **AJAX).json()['messages']
+        self.assertEqual([m['seq'] for m in after], [5, 6])
+        self.assertEqual([m['id'] for m in before], [str(messages[0].id), str(messages[1].id)])
+
+    def test_polling_reads_up_to_the_newest_seq_handed_out(self):
+        for i in range(3):
+            self.send(str(i))
+        mine = self.send('mine', sender=self.bob)
+
+        data = self.client.get(f'/chat/get-new-messages/{self.conversation.id}/', {'after_seq': 1}, **AJAX).json()
+        self.assertEqual([m['seq'] for m in data['new_messages']], [2, 3, 4])
+        self.assertEqual(data['last_seq'], 4)
+        self.assertFalse(Message.objects.filter(sender=self.alice, is_read=False).exists())
+        mine.refresh_from_db()
+        self.assertFalse(mine.is_read)
+
+    def test_mark_read_up_to_stops_at_the_seq(self):
+        for i in range(4):
+            self.send(str(i))
+
+        self.assertEqual(self.conversation.mark_read_up_to(self.bob, 2), 2)
+        self.assertEqual(
+            list(Message.objects.filter(is_read=False).values_list('seq', flat=True).order_by('seq')), [3, 4]
+        )
+
+    def test_socket_sync_replays_messages_after_the_gap(self):
+        for i in range(4):
+            self.send(str(i))
+        consumer = ChatConsumer()
+        consumer.user = self.bob
+        consumer.conversation_id = str(self.conversation.id)
+
+        missed = async_to_sync(consumer.get_messages_after)(2)
+        self.assertEqual([m['seq'] for m in missed], [3, 4])
+        self.assertEqual(async_to_sync(consumer.get_messages_after)('garbage'), [])
+
+        async_to_sync(consumer.mark_read)(3)
+        self.assertEqual(list(Message.objects.filter(is_read=False).values_list('seq', flat=True)), [4])
+
+
+class ConversationTouchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+
+    def send(self, content, **fields):
+        return Message.objects.create(conversation=self.conversation, sender=self.alice, content=content, **fields)
+
+    def test_send_writes_the_conversation_row_once(self):
+        self.client.force_login(self.alice)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/chat/send-message/{self.conversation.id}/', {'content': 'hi'}, **AJAX)
+        self.assertTrue(response.json()['success'])
+
+        conversation_updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "chat_conversation"')
+        ]
+        self.assertEqual(len(conversation_updates), 1)
+
+    def test_updated_at_follows_the_newest_message(self):
+        message = self.send('now', timestamp=timezone.now() + timedelta(minutes=5))
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.updated_at, message.timestamp)
+
+    def test_updated_at_never_moves_backwards(self):
+        self.send('now')
+        self.conversation.refresh_from_db()
+        latest = self.conversation.updated_at
+        self.send('late', timestamp=latest - timedelta(hours=1))
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.updated_at, latest)
+
+    def test_fan_out_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.send('hi')
+            self.assertFalse(Notification.objects.filter(user=self.bob).exists())
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(Notification.objects.filter(user=self.bob, notification_type='message').exists())
+
+
+@override_settings(CHAT_UPLOAD_CHUNK_SIZE=8)
+class ResumableUploadTests(MediaTestCase):
+    data = b'twenty bytes of text'
+
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.client.force_login(self.alice)
+
+    def test_chunks_resume_from_the_reported_offset(self):
+        upload_id = self.start_upload(self.conversation, self.data).json()['upload_id']
+        self.assertEqual(self.put_chunk(upload_id, 0, self.data[:8]).json()['received_size'], 8)
+
+        # A retried or skipped chunk is refused with the offset to resume from
+        response = self.put_chunk(upload_id, 16, self.data[16:])
+        self.assertEqual((response.status_code, response.json()['received_size']), (409, 8))
+        status = self.client.get(f'/chat/upload/chunk/{upload_id}/', **AJAX).json()
+        self.assertEqual(status['received_size'], 8)
+
+        self.put_chunk(upload_id, 8, self.data[8:16])
+        self.put_chunk(upload_id, 16, self.data[16:])
+        response = self.complete(upload_id, content='see attached')
+
+        self.assertTrue(response.json()['success'])
+        message = Message.objects.get(id=response.json()['message_id'])
+        self.assertEqual((message.content, message.file_size), ('see attached', len(self.data)))
+        with message.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        upload = MediaUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.status, 'completed')
+        self.assertFalse(os.path.exists(upload.temp_path))
+
+    def test_oversized_chunk_is_refused(self):
+        upload_id = self.start_upload(self.conversation, self.data).json()['upload_id']
+        self.assertEqual(self.put_chunk(upload_id, 0, self.data[:9]).status_code, 400)
+
+    def test_completes_exactly_once(self):
+        upload_id = self.start_upload(self.conversation, self.data[:8]).json()['upload_id']
+        self.assertEqual(self.complete(upload_id).status_code, 409)  # nothing received yet
+        self.put_chunk(upload_id, 0, self.data[:8])
+
+        self.assertTrue(self.complete(upload_id).json()['success'])
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 1)
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        upload_id = self.upload(self.conversation, self.data[:8], checksum='0' * 64)
+
+        self.assertEqual(self.complete(upload_id).status_code, 422)
+        self.assertEqual(MediaUpload.objects.get(id=upload_id).status, 'failed')
+        self.assertFalse(Message.objects.exists())
+
+    def test_declared_checksum_is_checked_against_the_bytes(self):
+        upload_id = self.upload(self.conversation, self.data[:8], checksum=hashlib.sha256(self.data[:8]).hexdigest())
+        self.assertEqual(self.complete(upload_id).json()['checksum'], hashlib.sha256(self.data[:8]).hexdigest())
+
+    def test_failure_after_the_claim_reopens_the_upload(self):
+        upload_id = self.upload(self.conversation, self.data[:8])
+
+        with mock.patch.object(MediaUpload, 'compute_checksum', side_effect=OSError('disk went away')):
+            with self.assertRaises(OSError), self.assertLogs('django.request', 'ERROR'):
+                self.complete(upload_id)
+        self.assertEqual(MediaUpload.objects.get(id=upload_id).status, 'uploading')
+
+        self.assertTrue(self.complete(upload_id).json()['success'])
+
+    @override_settings(CHAT_STORAGE_QUOTA_BYTES=30)
+    def test_uploads_in_flight_count_against_the_quota(self):
+        self.assertEqual(self.start_upload(self.conversation, self.data).status_code, 200)
+        self.assertEqual(self.start_upload(self.conversation, self.data).status_code, 413)
+
+    def test_only_participants_can_upload(self):
+        self.client.force_login(make_user('mallory'))
+        self.assertEqual(self.start_upload(self.conversation, self.data).status_code, 404)
+
+
+class MediaProcessingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.conversation = make_conversation(self.alice, make_user('bob'))
+        self.client.force_login(self.alice)
+
+    def test_image_gets_renditions_and_placeholder(self):
+        media = self.send_file(self.conversation, make_png(640, 480)).get_media()
+        self.assertEqual(media.processing_status, 'pending')
+
+        media = process_media(media.id)
+        self.assertEqual(media.processing_status, 'done')
+        self.assertEqual((media.width, media.height), (640, 480))
+        # Never upscaled past the original, except for the smallest size
+        self.assertEqual(sorted(media.renditions, key=int), ['160', '480'])
+        self.assertEqual(media.thumbnail.name, media.renditions['160'])
+        self.assertTrue(media.thumbnail.storage.exists(media.thumbnail.name))
+        self.assertTrue(media.blurhash)
+
+    def test_a_row_is_processed_once(self):
+        media = self.send_file(self.conversation, make_png()).get_media()
+        self.assertIsNotNone(process_media(media.id))
+        self.assertIsNone(process_media(media.id))
+
+    def test_unreadable_image_is_marked_failed(self):
+        media = self.send_file(self.conversation, b'not really a png').get_media()
+        with self.assertLogs('chat.media', 'WARNING'):
+            media = process_media(media.id)
+        self.assertEqual(media.processing_status, 'failed')
+
+    def test_rows_left_by_a_dead_worker_are_requeued(self):
+        stale = self.send_file(self.conversation, make_png()).get_media()
+        busy = self.send_file(self.conversation, make_png(color=(0, 0, 0))).get_media()
+        ChatMedia.objects.filter(id=stale.id).update(
+            processing_status='processing', processing_claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        ChatMedia.objects.filter(id=busy.id).update(processing_status='processing', processing_claimed_at=timezone.now())
+
+        self.assertEqual(release_stale_media(15), 1)
+        self.assertEqual(ChatMedia.objects.get(id=stale.id).processing_status, 'pending')
+        self.assertEqual(ChatMedia.objects.get(id=busy.id).processing_status, 'processing')
+
+    def test_worker_command_processes_pending_rows(self):
+        media = self.send_file(self.conversation, make_png()).get_media()
+        call_command('process_media', stdout=io.StringIO())
+        self.assertEqual(ChatMedia.objects.get(id=media.id).processing_status, 'done')
+
+    @override_settings(CHAT_MEDIA_PROCESS_IN_BACKGROUND=True)
+    def test_background_processing_is_submitted_after_commit(self):
+        with mock.patch('chat.media._executor', None), mock.patch('chat.media.ThreadPoolExecutor') as executor:
+            with self.captureOnCommitCallbacks() as callbacks:
+                schedule_media_processing(42)
+                executor.return_value.submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+        executor.return_value.submit.assert_called_once()
+        self.assertEqual(executor.return_value.submit.call_args.args[1], 42)
+
+
+class MediaDeduplicationTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.conversation = make_conversation(self.alice, self.bob)
+        self.client.force_login(self.alice)
+        self.png = make_png()
+
+    def test_same_bytes_are_stored_once(self):
+        first = self.send_file(self.conversation, self.png)
+        second = self.send_file(make_conversation(self.alice, self.bob), self.png, name='again.png')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        # One reference each for the two messages and their two media rows
+        self.assertEqual(MediaBlob.objects.get().ref_count, 4)
+
+    def test_file_goes_with_the_last_reference(self):
+        first = self.send_file(self.conversation, self.png)
+        second = self.send_file(self.conversation, self.png)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(len(self.stored_files()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_failed_send_leaves_no_blob_or_file(self):
+        with mock.patch.object(ChatMedia, 'create_for_message', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError), self.assertLogs('django.request', 'ERROR'):
+                self.client.post(f'/chat/send-message/{self.conversation.id}/', {
+                    'file': SimpleUploadedFile('photo.png', self.png, content_type='image/png')
+                }, **AJAX)
+
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_late_delete_never_removes_a_restored_copy(self):
+        name = MediaBlob.store(ContentFile(self.png), 'photo.png')
+        with self.captureOnCommitCallbacks() as callbacks:
+            MediaBlob.release(name)
+        # The same content is stored again before the first delete runs
+        restored = MediaBlob.store(ContentFile(self.png), 'photo.png')
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(name, restored)
+        self.assertEqual(self.stored_files(), [os.path.basename(restored)])
+
+    def test_legacy_media_row_leaves_the_message_file_alone(self):
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, message_type='image')
+        message.file.save('legacy.png', ContentFile(self.png))
+        media = ChatMedia.create_for_message(message, 'image/png')
+
+        media.delete()
+        self.assertTrue(message.file.storage.exists(message.file.name))
+
+    def test_upload_of_visible_content_skips_the_transfer(self):
+        self.send_file(self.conversation, self.png)
+        checksum = hashlib.sha256(self.png).hexdigest()
+
+        init = self.start_upload(self.conversation, self.png, checksum=checksum).json()
+        self.assertTrue(init['deduplicated'])
+        self.assertEqual(init['received_size'], len(self.png))
+        response = self.complete(init['upload_id'])
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(len(self.stored_files()), 1)
+
+        # A checksum alone is no proof: someone who cannot see the content has to send the bytes
+        mallory = make_user('mallory')
+        self.client.force_login(mallory)
+        init = self.start_upload(make_conversation(mallory, self.bob), self.png, checksum=checksum).json()
+        self.assertFalse(init['deduplicated'])
+        self.assertEqual(init['received_size'], 0)
+
+
+class MediaServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.conversation = make_conversation(self.alice, make_user('bob'))
+        self.client.force_login(self.alice)
+        self.data = bytes(range(256)) * 4
+        self.message = self.send_file(self.conversation, self.data, name='clip.mp4', content_type='video/mp4')
+        self.url = f'/chat/media/message/{self.message.id}/'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_file_with_validators(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.data))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+        response, body = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, body), (304, b''))
+
+    def test_byte_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(body, self.data[-5:])
+        response, body = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(body, self.data[1000:])
+
+        response, _ = self.get(HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_uploaded_documents_are_downloaded_not_rendered(self):
+        page = self.send_file(self.conversation, b'<script>alert(1)</script>', name='page.html', content_type='text/html')
+        response = self.client.get(f'/chat/media/message/{page.id}/')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    @override_settings(CHAT_MEDIA_ACCEL='nginx', CHAT_MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_proxy_offload_sends_no_body(self):
+        response, body = self.get()
+        self.assertEqual(body, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.message.file.name)
+
+    def test_renditions_are_served_by_width(self):
+        photo = self.send_file(self.conversation, make_png(200, 100)).get_media()
+        process_media(photo.id)
+
+        response = self.client.get(f'/chat/media/{photo.id}/', {'w': '160'})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/webp'))
+        self.assertEqual(self.client.get(f'/chat/media/{photo.id}/', {'w': '9999'}).status_code, 404)
+
+    def test_only_members_get_the_file(self):
+        self.client.force_login(make_user('mallory'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class MediaGalleryTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.conversation = make_conversation(self.alice, make_user('bob'))
+        self.client.force_login(self.alice)
+        self.url = f'/chat/gallery/{self.conversation.id}/'
+
+    def add_media(self, media_type='image', uploaded_at=None, **fields):
+        media = ChatMedia.objects.create(
+            conversation=self.conversation, uploaded_by=self.alice, media_type=media_type,
+            file=f'chat_media/{media_type}.bin', file_name=f'{media_type}.bin', file_size=10,
+            mime_type='application/octet-stream', **fields
+        )
+        if uploaded_at:
+            # auto_now_add ignores a value passed to create()
+            ChatMedia.objects.filter(id=media.id).update(uploaded_at=uploaded_at)
+            media.uploaded_at = uploaded_at
+        return media
+
+    def gallery(self, **query):
+        return self.client.get(self.url, query, **AJAX)
+
+    def test_pages_cover_every_item_once_across_timestamp_ties(self):
+        same_time = timezone.now()
+        items = [self.add_media(uploaded_at=same_time) for _ in range(5)]
+        items.append(self.add_media(uploaded_at=same_time + timedelta(seconds=1)))
+
+        seen, cursor = [], None
+        while True:
+            data = self.gallery(limit=2, **({'cursor': cursor} if cursor else {})).json()
+            seen += [item['id'] for item in data['media']]
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_more'], cursor is not None)
+            if not cursor:
+                break
+
+        newest_first = sorted(items, key=lambda media: (media.uploaded_at, media.id), reverse=True)
+        self.assertEqual(seen, [str(media.id) for media in newest_first])
+
+    def test_filters_by_type_and_hides_deleted(self):
+        video = self.add_media('video')
+        self.add_media('image')
+        self.add_media('video', is_deleted=True)
+
+        data = self.gallery(type='video').json()
+        self.assertEqual([item['id'] for item in data['media']], [str(video.id)])
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ['!!!', encode_cursor(timezone.now(), 'not-a-uuid'), 'bm8gc2VwYXJhdG9y']:
+            self.assertEqual(self.gallery(cursor=cursor).status_code, 400)
+
+    def test_only_members_can_browse(self):
+        self.client.force_login(make_user('mallory'))
+        self.assertEqual(self.gallery().status_code, 404)
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(at, 42), int), (at, 42))
+
+    def test_garbage_raises_value_error(self):
+        for cursor in ['', '***', encode_cursor(timezone.now(), 'x'), 'MjAyNC0wMS0wMQ']:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor, int)
+
+
+class StorageAccountingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = make_user('alice')
+        self.conversation = make_conversation(self.alice, make_user('bob'))
+        self.client.force_login(self.alice)
+
+    def usage(self, **owner):
+        return StorageUsage.objects.filter(**owner).values_list('bytes_used', 'file_count').first()
+
+    def test_sends_and_deletions_keep_the_counters(self):
+        self.send_file(self.conversation, b'x' * 100, name='a.bin', content_type='application/octet-stream')
+        media = self.send_file(self.conversation, b'y' * 50, name='b.bin', content_type='application/octet-stream').get_media()
+        self.assertEqual(self.usage(user=self.alice), (150, 2))
+        self.assertEqual(self.usage(conversation=self.conversation), (150, 2))
+
+        media.mark_as_deleted(self.alice)
+        media.mark_as_deleted(self.alice)
+        media.delete()
+        self.assertEqual(self.usage(user=self.alice), (100, 1))
+        self.assertEqual(self.usage(conversation=self.conversation), (100, 1))
+
+    @override_settings(CHAT_STORAGE_QUOTA_BYTES=120)
+    def test_sends_over_the_quota_are_refused(self):
+        self.send_file(self.conversation, b'x' * 100, name='a.bin', content_type='application/octet-stream')
+        response = self.client.post(f'/chat/send-message/{self.conversation.id}/', {
+            'file': SimpleUploadedFile('b.bin', b'y' * 50)
+        }, **AJAX)
+        self.assertEqual(response.json()['error'], 'Storage quota exceeded.')
+
+    def test_reconcile_fixes_drifted_counters(self):
+        self.send_file(self.conversation, b'x' * 100, name='a.bin', content_type='application/octet-stream')
+        StorageUsage.objects.filter(user=self.alice).update(bytes_used=999, file_count=7)
+
+        call_command('reconcile_storage_usage', stdout=io.StringIO())
+        self.assertEqual(self.usage(user=self.alice), (100, 1))
+
+    def test_old_originals_move_to_cold_storage_and_still_serve(self):
+        message = self.send_file(self.conversation, b'old bytes', name='old.bin', content_type='application/octet-stream')
+        fresh = self.send_file(self.conversation, b'new bytes', name='new.bin', content_type='application/octet-stream')
+        MediaBlob.objects.filter(file=message.file.name).update(last_referenced_at=timezone.now() - timedelta(days=400))
+
+        call_command('tier_media_storage', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(MediaBlob.objects.get(file=message.file.name).tier, 'hot')
+
+        call_command('tier_media_storage', '--days', '180', stdout=io.StringIO())
+        self.assertEqual(MediaBlob.objects.get(file=message.file.name).tier, 'cold')
+        self.assertEqual(MediaBlob.objects.get(file=fresh.file.name).tier, 'hot')
+        self.assertFalse(message.file.storage.exists(message.file.name))
+        self.assertTrue(MediaBlob.get_cold_storage().exists(message.file.name))
+
+        response = self.client.get(f'/chat/media/message/{message.id}/')
+        self.assertEqual(b''.join(response.streaming_content), b'old bytes')
+
+    def test_idle_uploads_expire(self):
+        upload_id = self.upload(self.conversation, b'partial')
+        MediaUpload.objects.filter(id=upload_id).update(updated_at=timezone.now() - timedelta(days=2))
+        upload = MediaUpload.objects.get(id=upload_id)
+
+        call_command('cleanup_stale_uploads', '--hours', '24', stdout=io.StringIO())
+        self.assertEqual(MediaUpload.objects.get(id=upload_id).status, 'failed')
+        self.assertFalse(os.path.exists(upload.temp_path))
+
+
+class EmojiSearchTests(TestCase):
+    def test_names_and_aliases_are_searchable(self):
+        self.assertIn('👍', EmojiManager.search_emojis('thumbs'))
+        self.assertEqual(EmojiManager.search_emojis('+1')[0], '👍')
+        self.assertEqual(EmojiManager.search_emojis('thumbs up')[0], '👍')
+
+    def test_exact_full_name_ranks_first(self):
+        results = EmojiManager.search_emojis('cat face')
+        self.assertEqual(results[0], '🐱')
+        self.assertIn('😿', results)
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(EmojiManager.search_emojis('cat zzqx'), [])
+        self.assertEqual(EmojiManager.search_emojis('zzqx'), [])
+
+    def test_emojis_outside_the_picker_are_found_once(self):
+        results = EmojiManager.search_emojis('heart')
+        self.assertIn('♥️', results)
+        self.assertEqual(len(results), len({emoji_char.replace('\ufe0f', '') for emoji_char in results}))
+
+    def test_search_endpoint(self):
+        self.client.force_login(make_user('alice'))
+        response = self.client.get('/chat/search-emojis/', {'q': 'cat face'}, **AJAX)
+        self.assertEqual(response.json()['emojis'][0], '🐱')
+
+        response = self.client.get('/chat/search-emojis/', **AJAX)
+        self.assertEqual(response.json()['emojis'][:3], EmojiManager.get_all_emojis()[:3])
+
+
+class EmojiCatalogTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(EmojiManager, 'CATALOG_DIR', self.directory),
+            mock.patch.object(EmojiManager, '_catalog_path', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_catalog_lists_every_category_with_names(self):
+        catalog = EmojiManager.build_catalog()
+        self.assertEqual([category['id'] for category in catalog['categories']], list(EmojiManager.EMOJI_CATEGORIES))
+        items = {item['emoji']: item for category in catalog['categories'] for item in category['emojis']}
+        self.assertEqual(items['😃']['name'], 'grinning face with big eyes')
+        self.assertIn('smiley', items['😃']['keywords'])
+
+    def test_write_is_content_hashed_and_replaces_old_builds(self):
+        stale = os.path.join(self.directory, 'catalog.000000000000.json')
+        open(stale, 'w').close()
+
+        path = EmojiManager.write_catalog()
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        self.assertEqual(os.path.basename(path), f'catalog.{hashlib.sha256(data).hexdigest()[:12]}.json')
+        self.assertEqual(json.loads(data)['categories'][0]['id'], list(EmojiManager.EMOJI_CATEGORIES)[0])
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(EmojiManager.write_catalog(), path)
+
+    def test_command_builds_the_catalog_the_pages_link_to(self):
+        self.assertIsNone(EmojiManager.get_catalog_static_path())
+        EmojiManager._catalog_path = None
+
+        call_command('build_emoji_catalog', stdout=io.StringIO())
+        built = os.listdir(self.directory)
+        self.assertEqual(len(built), 1)
+        self.assertEqual(EmojiManager.get_catalog_static_path(), 'chat/emoji/' + built[0])
+
+    def test_categories_endpoint_is_cacheable(self):
+        self.client.force_login(make_user('alice'))
+        response = self.client.get('/chat/emoji-categories/', **AJAX)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=86400')
+        self.assertEqual(list(response.json()['categories']), list(EmojiManager.EMOJI_CATEGORIES))
+
+
+@override_settings(CHAT_EMOJI_USAGE_REDIS_URL='')
+class FrequentEmojiTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.conversation = make_conversation(self.alice, make_user('bob'))
+
+    def send(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(conversation=self.conversation, sender=self.alice, content=content)
+
+    def counts(self):
+        return dict(EmojiUsage.objects.filter(user=self.alice).values_list('emoji', 'count'))
+
+    def test_messages_and_reactions_feed_the_counters(self):
+        self.send('hi 😀😀 🎉')
+        message = self.send('again 😀')
+        with self.captureOnCommitCallbacks(execute=True):
+            message.add_reaction(self.alice, '🎉')
+
+        # Each message counts an emoji once, however often it repeats
+        self.assertEqual(self.counts(), {'😀': 2, '🎉': 2})
+        self.assertEqual(emoji_usage.get_frequent_emojis(self.alice.id), ['🎉', '😀'])
+
+    @override_settings(CHAT_EMOJI_USAGE_CAPACITY=2)
+    def test_new_emoji_replaces_the_least_used_counter(self):
+        self.send('😀')
+        self.send('😀 🎉')
+        self.send('🔥')
+
+        # 🔥 takes 🎉's slot and inherits its count + 1
+        self.assertEqual(self.counts(), {'😀': 2, '🔥': 2})
+
+    def test_picker_shows_frequent_emojis_first(self):
+        self.send('🔥')
+        self.client.force_login(self.alice)
+
+        self.assertEqual(self.client.get('/chat/frequent-emojis/', **AJAX).json()['emojis'], ['🔥'])
+        results = self.client.get('/chat/search-emojis/', **AJAX).json()['emojis']
+        self.assertEqual(results[0], '🔥')
+        self.assertEqual(len(results), len(set(results)))
+
+    def test_unreachable_redis_falls_back_to_the_database(self):
+        with override_settings(CHAT_EMOJI_USAGE_REDIS_URL='redis://127.0.0.1:1/0'), \
+                mock.patch.object(emoji_usage, '_client', None), mock.patch.object(emoji_usage, '_script', None), \
+                self.assertLogs('chat.emoji_usage', 'WARNING'):
+            self.send('😀')
+        self.assertEqual(self.counts(), {'😀': 1})
+
+    def test_flush_without_redis_is_a_no_op(self):
+        out = io.StringIO()
+        call_command('flush_emoji_usage', stdout=out)
+        self.assertIn('CHAT_EMOJI_USAGE_REDIS_URL is not set', out.getvalue())
+        self.assertEqual(emoji_usage.flush_emoji_usage(), 0)
+
+
+class EmojiClassificationTests(TestCase):
+    def test_sequences_count_as_one_grapheme(self):
+        for text in ('👍🏽', '👨\u200d👩\u200d👧\u200d👦', '🇳🇵', '1️⃣'):
+            with self.subTest(text=text):
+                self.assertEqual(count_graphemes(text), (1, 1))
+                self.assertEqual(find_emojis(text), [text])
+        self.assertEqual(find_emojis('go 🇳🇵🇮🇳!'), ['🇳🇵', '🇮🇳'])
+
+    def test_short_messages_have_to_be_all_emoji(self):
+        self.assertEqual(get_text_message_type('👍'), 'emoji')
+        self.assertEqual(get_text_message_type('🎉 🎉 🎉'), 'emoji')
+        self.assertEqual(get_text_message_type('ok 👍'), 'text')
+        self.assertEqual(get_text_message_type('123'), 'text')
+
+    def test_longer_messages_need_mostly_emoji(self):
+        self.assertEqual(get_text_message_type('😀' * 5 + ' x y'), 'emoji')
+        self.assertEqual(get_text_message_type('😀😀 x y z'), 'text')
+        self.assertEqual(get_text_message_type('hello there ' * 20), 'text')
+        self.assertEqual(get_text_message_type(''), 'text')
+
+    def test_sent_messages_are_classified(self):
+        alice = make_user('alice')
+        conversation = make_conversation(alice, make_user('bob'))
+        self.client.force_login(alice)
+
+        for content, message_type in (('👨\u200d👩\u200d👧', 'emoji'), ('ok 👍', 'text')):
+            self.client.post(f'/chat/send-message/{conversation.id}/', {'content': content}, **AJAX)
+            self.assertEqual(Message.objects.get(content=content).message_type, message_type)
+
+
+class MentionTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.carol = make_user('carol')
+        self.conversation = make_conversation(self.alice, self.bob, self.carol, is_group=True)
+
+    def send(self, content, sender=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(conversation=self.conversation, sender=sender or self.alice, content=content)
+
+    def test_usernames_are_parsed_like_usernames(self):
+        self.assertEqual(
+            extract_usernames('hi @Bob, @carol. mail a@b.com @bob (@d.e) @x_y.'), ['bob', 'carol', 'd.e', 'x_y']
+        )
+        self.assertEqual(extract_usernames('no mentions here'), [])
+
+    def test_mentioned_participants_get_a_mention_instead(self):
+        message = self.send('@Bob look, @alice @dave')
+
+        self.assertEqual(list(MessageMention.objects.values_list('message', 'user')), [(message.id, self.bob.id)])
+        self.assertEqual(
+            dict(Notification.objects.values_list('user', 'notification_type')),
+            {self.bob.id: 'mention', self.carol.id: 'message'}
+        )
+
+    def test_new_participants_can_be_mentioned(self):
+        self.send('@dave not here yet')
+        dave = make_user('dave')
+        self.conversation.participants.add(dave)
+        self.send('@dave welcome')
+
+        self.assertEqual(list(MessageMention.objects.values_list('user', flat=True)), [dave.id])
+
+    def test_mentions_endpoint_pages_by_cursor(self):
+        first = self.send('@bob one')
+        second = self.send('@bob two')
+        unsent = self.send('@bob three')
+        Message.objects.filter(id=unsent.id).update(is_unsent=True)
+        self.client.force_login(self.bob)
+
+        response = self.client.get('/chat/mentions/', {'limit': 1}, **AJAX).json()
+        self.assertEqual([mention['message_id'] for mention in response['mentions']], [str(second.id)])
+        self.assertTrue(response['has_more'])
+
+        response = self.client.get('/chat/mentions/', {'limit': 1, 'cursor': response['next_cursor']}, **AJAX).json()
+        self.assertEqual([mention['message_id'] for mention in response['mentions']], [str(first.id)])
+        self.assertIsNone(response['next_cursor'])
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/chat/mentions/', {'cursor': 'bad'}, **AJAX)
+        self.assertEqual(response.status_code, 400)
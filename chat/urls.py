@@ -26,6 +26,17 @@ urlpatterns = [
     path('send-message/<uuid:conversation_id>/', views.send_message_ajax, name='send_message_ajax'),
     path('get-messages/<uuid:conversation_id>/', views.get_messages_ajax, name='get_messages_ajax'),
     path('get-new-messages/<uuid:conversation_id>/', views.get_new_messages, name='get_new_messages'),
+    path('sync-messages/<uuid:conversation_id>/', views.sync_messages, name='sync_messages'),
+
+    # Resumable uploads
+    path('upload/<uuid:conversation_id>/init/', views.upload_init, name='upload_init'),
+    path('upload/chunk/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('upload/complete/<uuid:upload_id>/', views.upload_complete, name='upload_complete'),
+
+    # Protected media
+    path('media/message/<uuid:message_id>/', views.message_file, name='message_file'),
+    path('media/<uuid:media_id>/', views.chat_media_file, name='chat_media_file'),
+    path('gallery/<uuid:conversation_id>/', views.media_gallery, name='media_gallery'),
     path('edit-message/<uuid:message_id>/', views.edit_message, name='edit_message'),
     path('unsend-message/<uuid:message_id>/', views.unsend_message, name='unsend_message'),
     path('react-to-message/<uuid:message_id>/', views.react_to_message, name='react_to_message'),
@@ -68,10 +79,12 @@ urlpatterns = [
 
     # Notifications
     path('notifications/', views.get_notifications, name='get_notifications_chat'),
+    path('mentions/', views.my_mentions, name='my_mentions'),
 
     # Emojis
     path('search-emojis/', views.search_emojis, name='search_emojis'),
     path('emoji-categories/', views.get_emoji_categories, name='get_emoji_categories'),
+    path('frequent-emojis/', views.frequent_emojis, name='frequent_emojis'),
 
     # Statistics
     path('message-stats/', views.message_stats, name='message_stats'),
@@ -1,7 +1,18 @@
 # messenger_app/chat/utils.py
+import bisect
 import emoji
+import glob
+import hashlib
+import itertools
 import json
+import logging
+import os
 from collections import defaultdict
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
 
 
 class EmojiManager:
@@ -94,6 +105,25 @@ class EmojiManager:
         ]
     }
 
+    # Category icons for the picker tabs
+    CATEGORY_ICONS = {
+        'smileys_people': '😀',
+        'animals_nature': '🐶',
+        'food_drink': '🍎',
+        'activities': '⚽',
+        'travel_places': '🚗',
+        'objects': '💡',
+        'symbols': '❤️',
+    }
+
+    # Content-hashed catalog written by the build_emoji_catalog command
+    CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'chat', 'emoji')
+    CATALOG_STATIC_PREFIX = 'chat/emoji/'
+
+    # Built once per process by _get_search_index()
+    _search_index = None
+    _catalog_path = None
+
     @classmethod
     def get_all_emojis(cls):
         """Return all emojis flattened"""
@@ -102,28 +132,264 @@ class EmojiManager:
             all_emojis.extend(category_emojis)
         return all_emojis
 
+    @staticmethod
+    def get_emoji_names(emoji_char):
+        """Get the CLDR name plus aliases of an emoji as plain lowercase phrases"""
+        data = (
+            emoji.EMOJI_DATA.get(emoji_char)
+            or emoji.EMOJI_DATA.get(emoji_char.replace('\ufe0f', ''))
+            or emoji.EMOJI_DATA.get(emoji_char + '\ufe0f')
+        )
+        if not data:
+            return []
+        return [
+            name.strip(':').replace('_', ' ').lower()
+            for name in [data['en']] + data.get('alias', [])
+        ]
+
+    @classmethod
+    def _get_searchable_emojis(cls):
+        """The picker's emojis in picker order, then every other fully-qualified emoji the library knows"""
+        fully_qualified = emoji.STATUS['fully_qualified']
+        seen = set()
+        searchable = []
+        for emoji_char in itertools.chain(
+            cls.get_all_emojis(),
+            (char for char, data in emoji.EMOJI_DATA.items() if data['status'] == fully_qualified)
+        ):
+            # '❤' and '❤️' are one emoji
+            key = emoji_char.replace('\ufe0f', '')
+            if key not in seen:
+                seen.add(key)
+                searchable.append(emoji_char)
+        return searchable
+
+    @classmethod
+    def _get_search_index(cls):
+        """
+        Build (once) a sorted token list for prefix lookups: each name/alias word
+        maps to the positions of the deduplicated emojis it describes. Full names
+        and each emoji's shortest name length are kept for ranking
+        """
+        if cls._search_index is None:
+            emojis = cls._get_searchable_emojis()
+            postings = defaultdict(set)
+            full_names = defaultdict(set)
+            name_lengths = []
+            for position, emoji_char in enumerate(emojis):
+                lengths = []
+                for name in cls.get_emoji_names(emoji_char):
+                    words = name.replace('-', ' ').split()
+                    full_names[' '.join(words)].add(position)
+                    lengths.append(len(words))
+                    for token in words:
+                        postings[token].add(position)
+                name_lengths.append(min(lengths, default=0))
+
+            tokens = sorted(postings)
+            cls._search_index = (
+                emojis, tokens, {token: postings[token] for token in tokens}, dict(full_names), name_lengths
+            )
+        return cls._search_index
+
     @classmethod
-    def search_emojis(cls, query):
-        """Search emojis by name or keyword"""
+    def search_emojis(cls, query, limit=50):
+        """
+        Search emojis by name or alias (word-prefix match). An emoji named exactly
+        the query comes first, then exact words before prefixes, then shorter names
+        """
+        emojis, tokens, postings, full_names, name_lengths = cls._get_search_index()
         if not query:
-            return cls.get_all_emojis()[:50]  # Return first 50 emojis
+            return emojis[:limit]  # Return first emojis
 
-        query = query.lower().strip()
-        results = []
+        terms = query.lower().replace('_', ' ').replace('-', ' ').split()
+        exact = full_names.get(' '.join(terms), set())
+        scores = None
+        for term in terms:
+            term_scores = {}
+            start = bisect.bisect_left(tokens, term)
+            for token in itertools.takewhile(lambda t: t.startswith(term), tokens[start:start + 500]):
+                # Exact word beats prefix; shorter completions beat longer ones
+                score = 0 if token == term else len(token) - len(term)
+                for position in postings[token]:
+                    if score < term_scores.get(position, float('inf')):
+                        term_scores[position] = score
 
-        # Search in emoji data
-        for emoji_char in cls.get_all_emojis():
-            try:
-                # Get emoji name
-                emoji_name = emoji.demojize(emoji_char).replace(':', '').replace('_', ' ')
-                if query in emoji_name.lower():
-                    results.append(emoji_char)
-            except:
-                continue
+            if scores is None:
+                scores = term_scores
+            else:
+                # Every query word has to match
+                scores = {
+                    position: scores[position] + score
+                    for position, score in term_scores.items()
+                    if position in scores
+                }
+            if not scores:
+                return []
 
-        return results[:50]  # Limit results
+        ranked = sorted(scores, key=lambda position: (
+            position not in exact, scores[position], name_lengths[position], position
+        ))
+        return [emojis[position] for position in ranked[:limit]]
 
     @classmethod
     def get_emoji_categories(cls):
         """Return emojis organized by categories"""
-        return cls.EMOJI_CATEGORIES
\ No newline at end of file
+        return cls.EMOJI_CATEGORIES
+
+    @classmethod
+    def build_catalog(cls):
+        """Categories, icons and per-emoji names/keywords for the picker, as one JSON-able dict"""
+        categories = []
+        for category, emojis in cls.EMOJI_CATEGORIES.items():
+            items = []
+            for emoji_char in dict.fromkeys(emojis):
+                names = cls.get_emoji_names(emoji_char)
+                keywords = sorted({token for name in names for token in name.replace('-', ' ').split()})
+                items.append({
+                    'emoji': emoji_char,
+                    'name': names[0] if names else '',
+                    'keywords': keywords,
+                })
+            categories.append({
+                'id': category,
+                'icon': cls.CATEGORY_ICONS.get(category, emojis[0] if emojis else ''),
+                'emojis': items,
+            })
+        return {'version': emoji.__version__, 'categories': categories}
+
+    @classmethod
+    def write_catalog(cls, directory=None):
+        """
+        Write the catalog as catalog.<sha256[:12]>.json and drop older builds.
+        The hash in the name lets static serving mark it immutable.
+        """
+        directory = directory or cls.CATALOG_DIR
+        content = json.dumps(cls.build_catalog(), ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        data = content.encode('utf-8')
+        file_name = f'catalog.{hashlib.sha256(data).hexdigest()[:12]}.json'
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as handle:
+                handle.write(data)
+
+        for old_path in glob.glob(os.path.join(directory, 'catalog.*.json')):
+            if os.path.basename(old_path) != file_name:
+                os.remove(old_path)
+
+        cls._catalog_path = None
+        return path
+
+    @classmethod
+    def get_catalog_static_path(cls):
+        """Static path of the built catalog (looked up once per process), or None if not built"""
+        if cls._catalog_path is None:
+            built = sorted(glob.glob(os.path.join(cls.CATALOG_DIR, 'catalog.*.json')), key=os.path.getmtime)
+            cls._catalog_path = cls.CATALOG_STATIC_PREFIX + os.path.basename(built[-1]) if built else ''
+        return cls._catalog_path or None
+
+
+def get_conversation_group_name(conversation_id):
+    """Channel layer group shared by everyone connected to a conversation"""
+    return f'chat_{conversation_id}'
+
+
+def send_conversation_event(conversation_id, event):
+    """
+    Publish an event to a conversation group once the current transaction commits
+    """
+    def publish():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(get_conversation_group_name(conversation_id), event)
+        except Exception as e:
+            # The DB change already happened; clients will catch up on their next sync
+            logger.warning(f"Could not publish {event.get('type')} to conversation {conversation_id}: {e}")
+
+    transaction.on_commit(publish)
+
+
+def send_message_updated(message):
+    """
+    Publish an edit or unsend as a compact message_updated delta
+    """
+    send_conversation_event(message.conversation_id, {
+        'type': 'message_updated',
+        'message_id': str(message.id),
+        'content': message.content,
+        'is_edited': message.is_edited,
+        'is_unsent': message.is_unsent,
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+    })
+
+
+def send_reaction_delta(message, user, previous, current):
+    """
+    Publish a reaction change; clients decrement `previous` and increment `current`
+    """
+    send_conversation_event(message.conversation_id, {
+        'type': 'reaction_delta',
+        'message_id': str(message.id),
+        'user_id': user.id,
+        'previous': previous,
+        'current': current,
+    })
+
+
+def serialize_messages(messages_list, user):
+    """
+    Serialize a page of messages for the chat UI, batching the reaction lookups
+    """
+    from .models import Message, ChatMedia
+
+    message_ids = [message.id for message in messages_list]
+    reaction_summaries = Message.get_reaction_summaries(message_ids)
+    user_reactions = Message.get_user_reactions(message_ids, user)
+    media_by_message = {
+        media.message_id: media
+        for media in ChatMedia.objects.filter(message_id__in=message_ids, is_deleted=False)
+    }
+
+    messages_data = []
+    for message in messages_list:
+        message_data = {
+            'id': str(message.id),
+            'seq': message.seq,
+            'content': message.content,
+            'sender': message.sender.username,
+            'sender_id': message.sender.id,
+            'timestamp': message.timestamp.strftime('%H:%M'),
+            'is_own': message.sender.id == user.id,
+            'is_read': message.is_read,
+            'is_edited': message.is_edited,
+            'is_unsent': message.is_unsent,
+            'reactions': reaction_summaries.get(message.id, {}),
+            'user_reaction': user_reactions.get(message.id),
+            'message_type': message.message_type
+        }
+
+        # Add file information if it's a media message
+        if message.message_type != 'text':
+            message_data['file_url'] = message.get_file_url()
+            message_data['file_name'] = message.file_name
+            message_data['file_size'] = message.get_file_size_display()
+            message_data['is_image'] = message.is_image_file()
+            message_data['is_video'] = message.is_video_file()
+            message_data['is_audio'] = message.is_audio_file()
+
+            media = media_by_message.get(message.id)
+            if media:
+                message_data['thumbnail_url'] = media.get_display_url()
+                message_data['srcset'] = media.get_srcset()
+                message_data['blurhash'] = media.blurhash
+                message_data['width'] = media.width
+                message_data['height'] = media.height
+                message_data['duration'] = media.duration
+
+        messages_data.append(message_data)
+
+    return messages_data
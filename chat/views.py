@@ -2,26 +2,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.db.models import Q
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
+from django.db import transaction
+from django.core.files import File
 import json
 import os
 from django.conf import settings
-import emoji
 import uuid
 
 # Local chat models imports
-from .models import Conversation, Message, UserStatus, ChatNotification, GroupInvitation
+from .models import (
+    Conversation, Message, UserStatus, ConversationChange,
+    ChatMedia, MediaUpload, MediaBlob, StorageUsage, MessageMention, GroupInvitation
+)
 
 # Local accounts models imports
-from accounts.models import CustomUser, Notification, Friendship, FriendRequest, BlockedUser
+from accounts.models import CustomUser, Friendship, FriendRequest, BlockedUser
+from accounts import badge_counts
+from messenger.pagination import encode_cursor, decode_cursor
+from accounts.notification_service import (
+    notify, get_notifications as get_user_notifications, get_unread_count, mark_read as mark_notifications_read
+)
 
 # Local utils imports
-from .utils import EmojiManager
+from .utils import EmojiManager, send_message_updated, send_reaction_delta, serialize_messages
+from .serving import protected_file_response
+from .emoji_usage import get_frequent_emojis
+from .emoji_utils import get_text_message_type
 
 
 @login_required(login_url='/accounts/login/')
@@ -62,8 +74,8 @@ def chat_home(request):
             'is_group': conversation.is_group
         })
 
-    # Get unread notifications count - FIXED: Use account_notifications
-    unread_notifications_count = request.user.account_notifications.filter(is_read=False).count()
+    # Header counters (cached)
+    badges = badge_counts.get_badge_counts(request.user)
 
     # Get pending group invitations
     pending_invitations = GroupInvitation.objects.filter(
@@ -73,7 +85,7 @@ def chat_home(request):
 
     context = {
         'conversation_data': conversation_data,
-        'unread_notifications_count': unread_notifications_count,
+        'unread_notifications_count': badges['notifications'],
         'pending_invitations_count': pending_invitations,
     }
     return render(request, 'chat/chat_home.html', context)
@@ -162,13 +174,13 @@ def create_group(request):
                 user = CustomUser.objects.get(id=user_id)
                 if user != request.user:
                     conversation.participants.add(user)
-                    # Create account notification - FIXED: Use Notification model
-                    Notification.objects.create(
+                    # Create account notification
+                    notify(
                         user=user,
                         notification_type='group_invite',
                         title="Group Invitation",
                         message=f"You were added to group '{group_name}' by {request.user.username}",
-                        related_url=f"/chat/{conversation.id}/"
+                        conversation=conversation
                     )
             except CustomUser.DoesNotExist:
                 continue
@@ -240,24 +252,20 @@ def conversation(request, conversation_id):
                 messages.error(request, 'You need to be friends to chat with this user.')
                 return redirect('chat_home')
 
-    # Mark messages as read when viewing conversation
-    unread_messages = Message.objects.filter(
-        conversation=conversation,
-        is_read=False
-    ).exclude(sender=request.user)
+    # Mark messages as read when viewing conversation (everything up to the last seq numbered so far)
+    conversation.mark_read_up_to(request.user, conversation.last_message_seq)
 
-    for message in unread_messages:
-        message.is_read = True
-        message.save()
+    # Mark this conversation's notifications as read
+    mark_notifications_read(request.user, conversation=conversation)
+    badge_counts.chat_read(request.user.id, conversation.id)
 
-    # Mark notifications as read when viewing conversation - FIXED: Use account_notifications
-    request.user.account_notifications.filter(
-        notification_type='message',
-        related_url=f"/chat/{conversation.id}/"
-    ).update(is_read=True)
+    # Sync high-water mark for the page, read before the messages themselves
+    sync_cursor = ConversationChange.latest_cursor(conversation)
 
-    # Get messages
-    messages_list = conversation.messages.all().order_by('timestamp')
+    # Get messages (reaction counts prefetched in one query for the whole page)
+    messages_list = conversation.messages.select_related('sender').prefetch_related(
+        'reaction_counts', 'media_files'
+    ).order_by(*Message.CONVERSATION_ORDER)
 
     # Get context based on conversation type
     if conversation.is_group:
@@ -267,6 +275,8 @@ def conversation(request, conversation_id):
             'is_group': True,
             'group_members': conversation.participants.all(),
             'group_admins': conversation.admins.all(),
+            'sync_cursor': sync_cursor,
+            'emoji_catalog_path': EmojiManager.get_catalog_static_path(),
         }
     else:
         other_user = conversation.participants.exclude(id=request.user.id).first()
@@ -274,6 +284,8 @@ def conversation(request, conversation_id):
             'conversation': conversation,
             'messages': messages_list,
             'other_user': other_user,
+            'sync_cursor': sync_cursor,
+            'emoji_catalog_path': EmojiManager.get_catalog_static_path(),
             'is_group': False,
         }
 
@@ -305,13 +317,12 @@ def group_settings(request, conversation_id):
 
                 if user not in conversation.participants.all():
                     conversation.participants.add(user)
-                    # FIXED: Use Notification model
-                    Notification.objects.create(
+                    notify(
                         user=user,
                         notification_type='group_invite',
                         title="Group Invitation",
                         message=f"You were added to group '{conversation.group_name}' by {request.user.username}",
-                        related_url=f"/chat/{conversation.id}/"
+                        conversation=conversation
                     )
                     messages.success(request, f'{user.username} added to group.')
                 else:
@@ -480,13 +491,12 @@ def invite_to_group(request, conversation_id):
                 user = CustomUser.objects.get(id=user_id)
                 if user not in conversation.participants.all():
                     conversation.participants.add(user)
-                    # FIXED: Use Notification model
-                    Notification.objects.create(
+                    notify(
                         user=user,
                         notification_type='group_invite',
                         title="Group Invitation",
                         message=f"You were invited to group '{conversation.group_name}' by {request.user.username}",
-                        related_url=f"/chat/{conversation.id}/"
+                        conversation=conversation
                     )
                     invited_users.append(user.username)
             except CustomUser.DoesNotExist:
@@ -541,48 +551,28 @@ def get_new_messages(request, conversation_id):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
 
-        # Get messages that are not from current user and not read
-        new_messages = Message.objects.filter(
-            conversation=conversation,
-            is_read=False
-        ).exclude(sender=request.user)
-
-        messages_data = []
-        for message in new_messages:
-            message_data = {
-                'id': str(message.id),
-                'content': message.content,
-                'sender': message.sender.username,
-                'sender_id': message.sender.id,
-                'timestamp': message.timestamp.strftime('%H:%M'),
-                'is_own': False,
-                'is_read': message.is_read,
-                'message_type': message.message_type,
-                'is_edited': message.is_edited,
-                'is_unsent': message.is_unsent,
-                'reactions': message.get_reaction_summary(),
-                'user_reaction': message.get_user_reaction(request.user)
-            }
+        messages_qs = conversation.messages.select_related('sender')
+        after_seq = request.GET.get('after_seq', '')
+        if after_seq.isdigit():
+            # Everything past the client's high-water mark, as one range scan
+            new_messages = list(messages_qs.filter(seq__gt=int(after_seq)).order_by('seq')[:200])
+        else:
+            # Get messages that are not from current user and not read
+            new_messages = list(
+                messages_qs.filter(is_read=False).exclude(sender=request.user).order_by(*Message.CONVERSATION_ORDER)
+            )
+        messages_data = serialize_messages(new_messages, request.user)
 
-            # Add file information if it's a media message
-            if message.message_type != 'text':
-                message_data['file_url'] = message.file.url if message.file else None
-                message_data['file_name'] = message.file_name
-                message_data['file_size'] = message.get_file_size_display()
-                message_data['is_image'] = message.is_image_file()
-                message_data['is_video'] = message.is_video_file()
-                message_data['is_audio'] = message.is_audio_file()
-
-            messages_data.append(message_data)
-
-            # Mark as read
-            message.is_read = True
-            message.save()
+        # Read up to the newest message handed out
+        last_seq = max([int(after_seq) if after_seq.isdigit() else 0] + [message.seq for message in new_messages if message.seq is not None])
+        if new_messages and conversation.mark_read_up_to(request.user, last_seq):
+            badge_counts.chat_read(request.user.id, conversation.id)
 
         return JsonResponse({
             'success': True,
             'new_messages': messages_data,
-            'has_new_messages': len(messages_data) > 0
+            'has_new_messages': len(messages_data) > 0,
+            'last_seq': last_seq
         })
 
     return JsonResponse({'success': False, 'error': 'Invalid request'})
@@ -590,21 +580,20 @@ def get_new_messages(request, conversation_id):
 
 @login_required(login_url='/accounts/login/')
 def get_notifications(request):
-    """Get user notifications for dropdown - FIXED: Use account_notifications"""
+    """Get user notifications for dropdown"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        notifications = request.user.account_notifications.filter(
-            is_read=False,
-            is_archived=False
-        ).order_by('-created_at')[:10]  # Show 10 latest unread notifications
+        # Show 10 latest unread notifications
+        notifications = get_user_notifications(request.user).filter(is_read=False)[:10]
 
         notifications_data = []
         for notification in notifications:
             notifications_data.append({
-                'id': notification.id,
+                'id': str(notification.id),
                 'type': notification.notification_type,
                 'content': notification.message,
                 'title': notification.title,
                 'related_url': notification.related_url,
+                'count': notification.count,
                 'created_at': notification.created_at.strftime('%H:%M'),
                 'is_read': notification.is_read
             })
@@ -612,12 +601,91 @@ def get_notifications(request):
         return JsonResponse({
             'success': True,
             'notifications': notifications_data,
-            'unread_count': notifications.count()
+            'unread_count': get_unread_count(request.user)
         })
 
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+@login_required(login_url='/accounts/login/')
+def my_mentions(request):
+    """Messages that @mention the user, newest first, with a created_at cursor (served by the (user, created_at) index)"""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        try:
+            limit = min(max(int(request.GET.get('limit', 30)), 1), 100)
+        except ValueError:
+            limit = 30
+
+        mentions = MessageMention.objects.filter(
+            user=request.user, message__is_unsent=False
+        ).select_related('message__sender', 'conversation')
+
+        # Cursor is "<created_at iso>|<id>" of the last mention seen
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                cursor_at, cursor_id = decode_cursor(cursor, int)
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+            mentions = mentions.filter(Q(created_at__lt=cursor_at) | Q(created_at=cursor_at, id__lt=cursor_id))
+
+        page = list(mentions.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return JsonResponse({
+            'success': True,
+            'mentions': [
+                {
+                    'message_id': str(mention.message_id),
+                    'conversation_id': str(mention.conversation_id),
+                    'conversation_name': mention.conversation.group_name if mention.conversation.is_group else mention.message.sender.username,
+                    'sender': mention.message.sender.username,
+                    'content': mention.message.content,
+                    'timestamp': mention.created_at.isoformat(),
+                    'url': f"/chat/conversation/{mention.conversation_id}/",
+                }
+                for mention in page
+            ],
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+def is_direct_chat_blocked(conversation, user):
+    """Check whether either side of a direct chat has blocked the other"""
+    if conversation.is_group:
+        return False
+
+    other_user = conversation.participants.exclude(id=user.id).first()
+    if not other_user:
+        return False
+
+    return BlockedUser.objects.filter(
+        Q(blocker=user, blocked=other_user) |
+        Q(blocker=other_user, blocked=user)
+    ).exists()
+
+
+def get_message_type_for_mime(content_type):
+    """Get the Message.message_type for an uploaded file's content type"""
+    content_type = content_type or ''
+    if content_type.startswith('image/'):
+        return 'image'
+    elif content_type.startswith('video/'):
+        return 'video'
+    elif content_type.startswith('audio/'):
+        return 'audio'
+    return 'file'
+
+
 @login_required(login_url='/accounts/login/')
 def send_message_ajax(request, conversation_id):
     """Send message via AJAX - Now supports emojis"""
@@ -625,30 +693,29 @@ def send_message_ajax(request, conversation_id):
         conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
 
         # Check for blocks in direct chats
-        if not conversation.is_group:
-            other_user = conversation.participants.exclude(id=request.user.id).first()
-            if other_user:
-                is_blocked = BlockedUser.objects.filter(
-                    Q(user=request.user, blocked_user=other_user) |
-                    Q(user=other_user, blocked_user=request.user)
-                ).exists()
-
-                if is_blocked:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Cannot send message. User is blocked.'
-                    })
+        if is_direct_chat_blocked(conversation, request.user):
+            return JsonResponse({
+                'success': False,
+                'error': 'Cannot send message. User is blocked.'
+            })
 
         content = request.POST.get('content', '').strip()
         file = request.FILES.get('file')
 
-        # Validate file size (50MB limit)
+        # Validate file size (50MB limit). This single-request path buffers the whole file;
+        # larger files (up to CHAT_UPLOAD_MAX_SIZE) go through the resumable upload_* views
         if file and file.size > 50 * 1024 * 1024:
             return JsonResponse({
                 'success': False,
                 'error': 'File too large. Maximum size is 50MB.'
             })
 
+        if file and not StorageUsage.check_quota(request.user, file.size):
+            return JsonResponse({
+                'success': False,
+                'error': 'Storage quota exceeded.'
+            })
+
         if content or file:
             # Determine message type
             message_type = 'text'
@@ -660,59 +727,32 @@ def send_message_ajax(request, conversation_id):
                 file_size = file.size
 
                 # Determine message type based on file content type
-                if file.content_type.startswith('image/'):
-                    message_type = 'image'
-                elif file.content_type.startswith('video/'):
-                    message_type = 'video'
-                elif file.content_type.startswith('audio/'):
-                    message_type = 'audio'
-                else:
-                    message_type = 'file'
+                message_type = get_message_type_for_mime(file.content_type)
             else:
-                # Check if it's an emoji message
-                emoji_count = sum(1 for char in content if emoji.is_emoji(char))
-                total_chars = len(content.strip())
-
-                if (emoji_count > 0 and total_chars <= 3) or (total_chars > 0 and emoji_count / total_chars > 0.7):
-                    message_type = 'emoji'
+                # Emoji-only messages (counted per grapheme) render large
+                message_type = get_text_message_type(content)
 
-            # Create message
-            message = Message.objects.create(
+            # Create message (attachments are stored once per content hash)
+            message = Message(
                 conversation=conversation,
                 sender=request.user,
                 content=content,
                 message_type=message_type,
-                file=file if file else None,
                 file_name=file_name,
                 file_size=file_size
             )
-            conversation.updated_at = timezone.now()
-            conversation.save()
-
-            # Create notifications for other participants
-            for participant in conversation.participants.exclude(id=request.user.id):
-                # Check if participant blocked the sender
-                is_blocked = BlockedUser.objects.filter(
-                    user=participant,
-                    blocked_user=request.user
-                ).exists()
-
-                if not is_blocked:
-                    # Create appropriate notification message
-                    if message_type == 'text':
-                        notification_message = content[:100] + "..." if len(content) > 100 else content
-                    elif message_type == 'emoji':
-                        notification_message = "Sent an emoji"
-                    else:
-                        notification_message = f"Sent a {message_type}"
-
-                    Notification.objects.create(
-                        user=participant,
-                        notification_type='message',
-                        title=f"New message from {request.user.username}",
-                        message=notification_message,
-                        related_url=f"/chat/{conversation.id}/"
-                    )
+            if file:
+                # The blob reference, the message and its media row commit (or roll back) together
+                try:
+                    with transaction.atomic():
+                        message.file.name = MediaBlob.store(file, file_name)
+                        message.save()
+                        ChatMedia.create_for_message(message, file.content_type)
+                except Exception:
+                    MediaBlob.delete_if_unreferenced(message.file.name)
+                    raise
+            else:
+                message.save()
 
             # Prepare response data
             response_data = {
@@ -731,7 +771,7 @@ def send_message_ajax(request, conversation_id):
 
             # Add file information if it's a media message
             if message.message_type != 'text' and message.message_type != 'emoji':
-                response_data['file_url'] = message.file.url if message.file else None
+                response_data['file_url'] = message.get_file_url()
                 response_data['file_name'] = message.file_name
                 response_data['file_size'] = message.get_file_size_display()
                 response_data['is_image'] = message.is_image_file()
@@ -745,6 +785,342 @@ def send_message_ajax(request, conversation_id):
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+@login_required(login_url='/accounts/login/')
+def upload_init(request, conversation_id):
+    """Start a resumable upload; the client then PUTs chunks and calls upload_complete"""
+    if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
+
+        if is_direct_chat_blocked(conversation, request.user):
+            return JsonResponse({'success': False, 'error': 'Cannot send message. User is blocked.'})
+
+        try:
+            data = json.loads(request.body)
+            total_size = int(data.get('total_size', 0))
+        except (json.JSONDecodeError, TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid upload metadata'}, status=400)
+
+        file_name = os.path.basename(str(data.get('file_name', '')).strip())[:255]
+        if not file_name or total_size <= 0:
+            return JsonResponse({'success': False, 'error': 'File name and size are required'}, status=400)
+
+        # Uploads still in progress count too, so parallel inits cannot overshoot the quota together
+        if not StorageUsage.check_quota(request.user, total_size + MediaUpload.get_in_flight_bytes(request.user)):
+            return JsonResponse({'success': False, 'error': 'Storage quota exceeded.'}, status=413)
+
+        if total_size > settings.CHAT_UPLOAD_MAX_SIZE:
+            return JsonResponse({
+                'success': False,
+                'error': f'File too large. Maximum size is {settings.CHAT_UPLOAD_MAX_SIZE // (1024 * 1024)}MB.'
+            }, status=413)
+
+        checksum = str(data.get('checksum', '')).lower()[:64]
+
+        # Content the user can already see (e.g. forwarded media) skips the transfer entirely.
+        # A declared checksum alone proves nothing, so anything else is uploaded and hashed here.
+        deduplicated = bool(checksum) and MediaBlob.find_visible(checksum, total_size, request.user) is not None
+
+        upload = MediaUpload.objects.create(
+            conversation=conversation,
+            uploaded_by=request.user,
+            file_name=file_name,
+            mime_type=str(data.get('mime_type') or 'application/octet-stream')[:100],
+            total_size=total_size,
+            checksum=checksum,
+            deduplicated=deduplicated,
+            received_size=total_size if deduplicated else 0
+        )
+
+        return JsonResponse({
+            'success': True,
+            'upload_id': str(upload.id),
+            'chunk_size': settings.CHAT_UPLOAD_CHUNK_SIZE,
+            'received_size': upload.received_size,
+            'deduplicated': deduplicated
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+def get_upload_access_error(upload, user):
+    """Error response if user may no longer post to the upload's conversation, else None"""
+    if not upload.conversation.participants.filter(id=user.id).exists():
+        return JsonResponse({'success': False, 'error': 'You are no longer in this conversation'}, status=403)
+
+    if is_direct_chat_blocked(upload.conversation, user):
+        return JsonResponse({'success': False, 'error': 'Cannot send message. User is blocked.'}, status=403)
+    return None
+
+
+@login_required(login_url='/accounts/login/')
+def upload_chunk(request, upload_id):
+    """GET reports how much has arrived (to resume); PUT streams the next chunk to disk"""
+    upload = get_object_or_404(MediaUpload, id=upload_id, uploaded_by=request.user)
+
+    if request.method == 'GET':
+        return JsonResponse({
+            'success': True,
+            'status': upload.status,
+            'received_size': upload.received_size,
+            'total_size': upload.total_size
+        })
+
+    if request.method != 'PUT':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    if upload.status != 'uploading':
+        return JsonResponse({'success': False, 'error': f'Upload is {upload.status}'}, status=409)
+
+    access_error = get_upload_access_error(upload, request.user)
+    if access_error:
+        return access_error
+
+    try:
+        offset = int(request.headers.get('X-Upload-Offset', request.GET.get('offset', '')))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Offset and Content-Length are required'}, status=400)
+
+    if offset != upload.received_size:
+        # Client is out of step; tell it where to resume from
+        return JsonResponse({
+            'success': False,
+            'error': 'Unexpected offset',
+            'received_size': upload.received_size
+        }, status=409)
+
+    if length <= 0 or length > settings.CHAT_UPLOAD_CHUNK_SIZE or offset + length > upload.total_size:
+        return JsonResponse({'success': False, 'error': 'Invalid chunk size'}, status=400)
+
+    try:
+        # Read straight from the request stream so the chunk never sits in memory
+        received_size = upload.write_chunk(request, offset, length)
+    except (OSError, ValueError) as e:
+        upload.refresh_from_db(fields=['received_size'])
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'received_size': upload.received_size
+        }, status=409)
+
+    return JsonResponse({
+        'success': True,
+        'received_size': received_size,
+        'total_size': upload.total_size
+    })
+
+
+@login_required(login_url='/accounts/login/')
+def upload_complete(request, upload_id):
+    """Checksum the assembled file, move it into storage and attach it to a new message"""
+    if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        upload = get_object_or_404(MediaUpload, id=upload_id, uploaded_by=request.user)
+        conversation = upload.conversation
+
+        access_error = get_upload_access_error(upload, request.user)
+        if access_error:
+            return access_error
+
+        if upload.status == 'uploading' and not upload.is_complete:
+            return JsonResponse({
+                'success': False,
+                'error': 'Upload is incomplete',
+                'received_size': upload.received_size
+            }, status=409)
+
+        # Claim the upload, so a double click or retried request cannot create a second message
+        claimed = MediaUpload.objects.filter(id=upload.id, status='uploading').update(
+            status='completing', updated_at=timezone.now()
+        )
+        if not claimed:
+            upload.refresh_from_db(fields=['status'])
+            return JsonResponse({'success': False, 'error': f'Upload is {upload.status}'}, status=409)
+
+        stored_name = None
+        try:
+            # Counted against the quota at init, but other uploads may have landed since
+            if not StorageUsage.check_quota(request.user, upload.total_size):
+                MediaUpload.objects.filter(id=upload.id).update(status='failed', updated_at=timezone.now())
+                upload.discard_temp_file()
+                return JsonResponse({'success': False, 'error': 'Storage quota exceeded.'}, status=413)
+
+            try:
+                data = json.loads(request.body) if request.body else {}
+            except json.JSONDecodeError:
+                data = {}
+
+            if upload.deduplicated:
+                checksum = upload.checksum
+            else:
+                checksum = upload.compute_checksum()
+                expected = str(data.get('checksum') or upload.checksum).lower()
+                if expected and expected != checksum:
+                    upload.status = 'failed'
+                    upload.save(update_fields=['status', 'updated_at'])
+                    upload.discard_temp_file()
+                    return JsonResponse({'success': False, 'error': 'Checksum mismatch'}, status=422)
+
+            # The blob reference, the message and the upload's completion commit together
+            with transaction.atomic():
+                if upload.deduplicated:
+                    # The server already had this content when the upload started; nothing was transferred
+                    blob = MediaBlob.find_visible(checksum, upload.total_size, request.user)
+                    if blob is None or not MediaBlob.acquire(blob.file.name):
+                        # The shared copy went away (or left the user's conversations) meanwhile; fall back to a real upload
+                        upload.status = 'uploading'
+                        upload.deduplicated = False
+                        upload.received_size = 0
+                        upload.save(update_fields=['status', 'deduplicated', 'received_size', 'updated_at'])
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Upload is incomplete',
+                            'received_size': 0
+                        }, status=409)
+                    stored_name = blob.file.name
+                else:
+                    with open(upload.temp_path, 'rb') as part:
+                        stored_name = MediaBlob.store(
+                            File(part, name=upload.file_name), upload.file_name, sha256=checksum
+                        )
+
+                message = Message(
+                    conversation=conversation,
+                    sender=request.user,
+                    content=str(data.get('content', '')).strip(),
+                    message_type=get_message_type_for_mime(upload.mime_type),
+                    file_name=upload.file_name,
+                    file_size=upload.total_size
+                )
+                message.file.name = stored_name
+                message.save()
+                ChatMedia.create_for_message(message, upload.mime_type)
+
+                upload.status = 'completed'
+                upload.checksum = checksum
+                upload.message = message
+                upload.save(update_fields=['status', 'checksum', 'message', 'updated_at'])
+        except Exception:
+            # Any failure after the claim (I/O while hashing or storing included) reopens the upload,
+            # so the client can retry; the rolled-back reference may leave a new file to remove
+            MediaBlob.delete_if_unreferenced(stored_name)
+            MediaUpload.objects.filter(id=upload.id, status='completing').update(
+                status='uploading', updated_at=timezone.now()
+            )
+            raise
+
+        upload.discard_temp_file()
+
+        response_data = serialize_messages([message], request.user)[0]
+        response_data.update({'success': True, 'message_id': str(message.id), 'checksum': checksum})
+        return JsonResponse(response_data)
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+@login_required(login_url='/accounts/login/')
+def media_gallery(request, conversation_id):
+    """List a conversation's media newest first, thumbnails only, with an uploaded_at cursor"""
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
+
+        try:
+            limit = min(max(int(request.GET.get('limit', 30)), 1), 100)
+        except ValueError:
+            limit = 30
+
+        media_qs = ChatMedia.objects.filter(conversation=conversation, is_deleted=False).only(
+            'id', 'message_id', 'media_type', 'file_name', 'file_size', 'width', 'height',
+            'duration', 'blurhash', 'renditions', 'uploaded_at'
+        )
+
+        media_types = [t for t in request.GET.get('type', '').split(',') if t in dict(ChatMedia.MEDIA_TYPES)]
+        if len(media_types) == 1:
+            media_qs = media_qs.filter(media_type=media_types[0])
+        elif media_types:
+            media_qs = media_qs.filter(media_type__in=media_types)
+
+        # Cursor is "<uploaded_at iso>|<id>" of the last item seen; id breaks timestamp ties
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                cursor_at, cursor_id = decode_cursor(cursor, uuid.UUID)
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+            media_qs = media_qs.filter(
+                Q(uploaded_at__lt=cursor_at) | Q(uploaded_at=cursor_at, id__lt=cursor_id)
+            )
+
+        page = list(media_qs.order_by('-uploaded_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last.uploaded_at, last.id)
+
+        return JsonResponse({
+            'success': True,
+            'media': [
+                {
+                    'id': str(media.id),
+                    'message_id': str(media.message_id) if media.message_id else None,
+                    'media_type': media.media_type,
+                    'file_name': media.file_name,
+                    'file_size': media.get_file_size_display(),
+                    'thumbnail_url': media.get_thumbnail_url(),
+                    'blurhash': media.blurhash,
+                    'width': media.width,
+                    'height': media.height,
+                    'duration': media.duration,
+                    'uploaded_at': media.uploaded_at.isoformat(),
+                }
+                for media in page
+            ],
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+def serve_original(request, field_file, file_name, content_type=None):
+    """Serve an original from whichever tier (hot media root or cold storage) holds it"""
+    storage = MediaBlob.storage_for(field_file)
+    accel_prefix = settings.CHAT_MEDIA_ACCEL_COLD_PREFIX if storage is not field_file.storage else None
+    return protected_file_response(request, storage, field_file.name, file_name, content_type, accel_prefix)
+
+
+@login_required(login_url='/accounts/login/')
+def message_file(request, message_id):
+    """Serve a message attachment to conversation members only"""
+    message = get_object_or_404(Message, id=message_id, conversation__participants=request.user)
+    if not message.file or message.is_unsent:
+        raise Http404('No file for this message')
+
+    return serve_original(request, message.file, message.file_name)
+
+
+@login_required(login_url='/accounts/login/')
+def chat_media_file(request, media_id):
+    """Serve a media file, or one of its renditions with ?w=<width>, to conversation members only"""
+    media = get_object_or_404(
+        ChatMedia,
+        id=media_id,
+        conversation__participants=request.user,
+        is_deleted=False
+    )
+
+    width = request.GET.get('w')
+    if width:
+        name = media.renditions.get(width)
+        if not name:
+            raise Http404('No such rendition')
+        return protected_file_response(request, media.thumbnail.storage, name, content_type='image/webp')
+
+    return serve_original(request, media.file, media.file_name, media.mime_type)
+
+
 @login_required(login_url='/accounts/login/')
 def search_emojis(request):
     """Search emojis via AJAX"""
@@ -754,8 +1130,8 @@ def search_emojis(request):
         if query:
             results = EmojiManager.search_emojis(query)
         else:
-            # Return popular emojis if no query
-            results = EmojiManager.get_all_emojis()[:30]
+            # The user's most used emojis, topped up with popular ones
+            results = list(dict.fromkeys(get_frequent_emojis(request.user.id) + EmojiManager.get_all_emojis()))[:30]
 
         return JsonResponse({
             'success': True,
@@ -766,15 +1142,30 @@ def search_emojis(request):
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+@login_required(login_url='/accounts/login/')
+def frequent_emojis(request):
+    """The user's most used emojis for the picker's frequent section via AJAX"""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': True,
+            'emojis': get_frequent_emojis(request.user.id)
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
 @login_required(login_url='/accounts/login/')
 def get_emoji_categories(request):
     """Get emoji categories via AJAX"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         categories = EmojiManager.get_emoji_categories()
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'categories': categories
         })
+        # Fallback for when the static catalog has not been built; still cacheable per browser
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
 
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
@@ -784,39 +1175,83 @@ def get_messages_ajax(request, conversation_id):
     """Get messages via AJAX"""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
-        messages_list = conversation.messages.all().order_by('timestamp')
+        # Read the cursor first: every change up to it has committed, so sync replays anything newer
+        cursor = ConversationChange.latest_cursor(conversation)
+        messages_qs = conversation.messages.select_related('sender')
+
+        # Optional integer range scans over the per-conversation sequence
+        after_seq = request.GET.get('after_seq')
+        before_seq = request.GET.get('before_seq')
+        if after_seq and after_seq.isdigit():
+            messages_list = list(messages_qs.filter(seq__gt=int(after_seq)).order_by('seq')[:200])
+        elif before_seq and before_seq.isdigit():
+            messages_list = list(messages_qs.filter(seq__lt=int(before_seq)).order_by('-seq')[:50])[::-1]
+        else:
+            messages_list = list(messages_qs.order_by(*Message.CONVERSATION_ORDER))
+        messages_data = serialize_messages(messages_list, request.user)
 
-        messages_data = []
-        for message in messages_list:
-            message_data = {
-                'id': str(message.id),
-                'content': message.content,
-                'sender': message.sender.username,
-                'sender_id': message.sender.id,
-                'timestamp': message.timestamp.strftime('%H:%M'),
-                'is_own': message.sender.id == request.user.id,
-                'is_read': message.is_read,
-                'is_edited': message.is_edited,
-                'is_unsent': message.is_unsent,
-                'reactions': message.get_reaction_summary(),
-                'user_reaction': message.get_user_reaction(request.user),
-                'message_type': message.message_type
-            }
+        return JsonResponse({'messages': messages_data, 'cursor': cursor})
 
-            # Add file information if it's a media message
-            if message.message_type != 'text':
-                message_data['file_url'] = message.file.url if message.file else None
-                message_data['file_name'] = message.file_name
-                message_data['file_size'] = message.get_file_size_display()
-                message_data['is_image'] = message.is_image_file()
-                message_data['is_video'] = message.is_video_file()
-                message_data['is_audio'] = message.is_audio_file()
+    return JsonResponse({'error': 'Invalid request'})
 
-            messages_data.append(message_data)
 
-        return JsonResponse({'messages': messages_data})
+@login_required(login_url='/accounts/login/')
+def sync_messages(request, conversation_id):
+    """Get everything that changed in a conversation since a change-log cursor"""
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
 
-    return JsonResponse({'error': 'Invalid request'})
+        try:
+            since = int(request.GET.get('since', ''))
+        except ValueError:
+            # No usable high-water mark: the client has to reload in full
+            return JsonResponse({
+                'success': True,
+                'reset': True,
+                'cursor': ConversationChange.latest_cursor(conversation)
+            })
+
+        limit = 500
+        changes = list(
+            ConversationChange.objects.filter(conversation=conversation, seq__gt=since)
+            .order_by('seq')
+            .values_list('seq', 'message_id', 'change_type')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Collapse the log to the latest state per message
+        cleared = False
+        changed_ids = set()
+        deleted_ids = set()
+        for change_seq, message_id, change_type in changes:
+            if change_type == 'cleared':
+                cleared = True
+                changed_ids.clear()
+                deleted_ids.clear()
+            elif change_type == 'deleted':
+                changed_ids.discard(message_id)
+                deleted_ids.add(message_id)
+            else:
+                changed_ids.add(message_id)
+
+        messages_list = list(
+            Message.objects.filter(conversation=conversation, id__in=changed_ids)
+            .select_related('sender')
+            .order_by(*Message.CONVERSATION_ORDER)
+        )
+
+        return JsonResponse({
+            'success': True,
+            'reset': False,
+            'cursor': changes[-1][0] if changes else since,
+            'has_more': has_more,
+            'cleared': cleared,
+            'messages': serialize_messages(messages_list, request.user),
+            'deleted': [str(message_id) for message_id in deleted_ids]
+        })
+
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
 @csrf_exempt
@@ -879,10 +1314,8 @@ def edit_message(request, message_id):
             new_content = data.get('content', '').strip()
 
             if new_content and new_content != message.content:
-                message.content = new_content
-                message.is_edited = True
-                message.edited_at = timezone.now()
-                message.save()
+                message.edit(new_content)
+                send_message_updated(message)
 
                 return JsonResponse({
                     'success': True,
@@ -906,9 +1339,8 @@ def unsend_message(request, message_id):
     if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         try:
             message = Message.objects.get(id=message_id, sender=request.user)
-            message.is_unsent = True
-            message.content = "This message was unsent"
-            message.save()
+            message.unsend()
+            send_message_updated(message)
 
             return JsonResponse({
                 'success': True,
@@ -927,7 +1359,7 @@ def react_to_message(request, message_id):
     """Add reaction to a message"""
     if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         try:
-            message = Message.objects.get(id=message_id)
+            message = Message.objects.get(id=message_id, conversation__participants=request.user)
 
             if message.is_unsent:
                 return JsonResponse({'success': False, 'error': 'Cannot react to unsent message'})
@@ -937,15 +1369,15 @@ def react_to_message(request, message_id):
 
             # Validate reaction (basic emoji validation)
             if reaction and len(reaction) <= 10:  # Basic length check for emojis
-                success = message.add_reaction(request.user, reaction)
+                previous, current = message.add_reaction(request.user, reaction)
+                send_reaction_delta(message, request.user, previous, current)
 
-                if success:
-                    return JsonResponse({
-                        'success': True,
-                        'message_id': str(message.id),
-                        'reactions': message.get_reaction_summary(),
-                        'user_reaction': message.reactions.get(str(request.user.id))
-                    })
+                return JsonResponse({
+                    'success': True,
+                    'message_id': str(message.id),
+                    'reactions': message.get_reaction_summary(),
+                    'user_reaction': current
+                })
 
             return JsonResponse({'success': False, 'error': 'Invalid reaction'})
 
@@ -1091,23 +1523,7 @@ def block_user(request, user_id):
                 (Q(user1=user_to_block) & Q(user2=request.user))
             ).delete()
 
-            # Create notification for the blocked user
-            Notification.objects.create(
-                user=user_to_block,
-                notification_type='system',
-                title="User Blocked You",
-                message=f"{request.user.username} has blocked you",
-                related_url="/accounts/settings/"
-            )
-
-            # Create notification for the blocker
-            Notification.objects.create(
-                user=request.user,
-                notification_type='system',
-                title="User Blocked",
-                message=f"You have blocked {user_to_block.username}",
-                related_url="/chat/blocked-users/"
-            )
+            # Both sides are notified by the BlockedUser signal
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
@@ -1147,7 +1563,7 @@ def unblock_user(request, user_id):
                 blocked_entry.delete()
 
                 # Create notification for the unblocked user
-                Notification.objects.create(
+                notify(
                     user=user_to_unblock,
                     notification_type='system',
                     title="User Unblocked You",
@@ -1156,7 +1572,7 @@ def unblock_user(request, user_id):
                 )
 
                 # Create notification for the unblocker
-                Notification.objects.create(
+                notify(
                     user=request.user,
                     notification_type='system',
                     title="User Unblocked",
@@ -1255,7 +1671,7 @@ def group_chat(request, conversation_id=None):
         )
 
         # Get messages
-        messages_list = conversation.messages.all().order_by('timestamp')
+        messages_list = conversation.messages.all().order_by(*Message.CONVERSATION_ORDER)
 
         context = {
             'conversation': conversation,
@@ -1295,12 +1711,12 @@ def group_chat(request, conversation_id=None):
                     if user != request.user:
                         conversation.participants.add(user)
                         # Create account notification
-                        Notification.objects.create(
+                        notify(
                             user=user,
                             notification_type='group_invite',
                             title="Group Invitation",
                             message=f"You were added to group '{group_name}' by {request.user.username}",
-                            related_url=f"/chat/group/{conversation.id}/"
+                            conversation=conversation
                         )
                 except CustomUser.DoesNotExist:
                     continue
@@ -1563,7 +1979,9 @@ def clear_conversation(request, conversation_id):
             )
 
             # Delete all messages in conversation
-            deleted_count, _ = conversation.messages.all().delete()
+            with transaction.atomic():
+                deleted_count, _ = conversation.messages.all().delete()
+                ConversationChange.record_cleared(conversation)
 
             messages.success(request, f'Cleared {deleted_count} messages from conversation.')
 
@@ -1744,11 +2162,15 @@ def bulk_delete_messages(request, conversation_id):
             message_ids = request.POST.getlist('message_ids[]')
 
             # Delete selected messages
-            deleted_count, _ = Message.objects.filter(
+            to_delete = Message.objects.filter(
                 id__in=message_ids,
                 conversation=conversation,
                 sender=request.user  # Users can only delete their own messages
-            ).delete()
+            )
+            with transaction.atomic():
+                deleted_ids = list(to_delete.values_list('id', flat=True))
+                deleted_count, _ = to_delete.delete()
+                ConversationChange.record_deletions(conversation, deleted_ids)
 
             messages.success(request, f'Deleted {deleted_count} messages.')
 
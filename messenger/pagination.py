@@ -0,0 +1,21 @@
+# messenger/pagination.py - Opaque keyset cursors shared by the paginated endpoints
+from datetime import datetime
+
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(at, row_id):
+    """Cursor for the row after (at, row_id): "<at iso>|<id>", base64 so clients treat it as opaque"""
+    return urlsafe_base64_encode(f"{at.isoformat()}|{row_id}".encode())
+
+
+def decode_cursor(cursor, id_type):
+    """
+    (datetime, id) from encode_cursor's output, the id converted with id_type (int, uuid.UUID).
+    Raises ValueError for a malformed cursor; endpoints answer it with 400.
+    """
+    try:
+        at, row_id = urlsafe_base64_decode(cursor).decode().split('|')
+        return datetime.fromisoformat(at), id_type(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
@@ -92,6 +92,7 @@ TEMPLATES = [
                 'social_django.context_processors.backends',
                 'social_django.context_processors.login_redirect',
                 'messenger.context_processors.site_info',
+                'accounts.context_processors.badge_counts',
             ],
         },
     },
@@ -173,6 +174,9 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # WhiteNoise for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+# Files carrying a 12-hex content hash in their name (e.g. the emoji catalog) never change:
+# serve them with far-future immutable cache headers
+WHITENOISE_IMMUTABLE_FILE_TEST = r'\.[0-9a-f]{12}\.[A-Za-z0-9]+(\.(gz|br))?$'
 
 # Media files
 MEDIA_URL = '/media/'
@@ -225,6 +229,16 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@connect.io')
 EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
 EMAIL_SUBJECT_PREFIX = config('EMAIL_SUBJECT_PREFIX', default='[Connect.io] ')
 
+# Invitation and OTP mail goes through the outbound queue (accounts.email_queue): each batch is sent
+# over one SMTP connection from a background thread, or by send_queued_email when this is off
+EMAIL_QUEUE_IN_BACKGROUND = config('EMAIL_QUEUE_IN_BACKGROUND', default=True, cast=bool)
+EMAIL_QUEUE_BATCH_SIZE = config('EMAIL_QUEUE_BATCH_SIZE', default=100, cast=int)  # emails per connection
+EMAIL_QUEUE_RATE_PER_SECOND = config('EMAIL_QUEUE_RATE_PER_SECOND', default=10, cast=float)  # 0 = unlimited
+EMAIL_QUEUE_MAX_ATTEMPTS = config('EMAIL_QUEUE_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_QUEUE_RETRY_DELAY = config('EMAIL_QUEUE_RETRY_DELAY', default=60, cast=int)  # seconds, doubled per attempt
+SITE_URL = config('SITE_URL', default='http://localhost:8000')  # links in invitation emails
+INVITATION_IMPORT_MAX_CONTACTS = config('INVITATION_IMPORT_MAX_CONTACTS', default=50000, cast=int)  # per bulk import
+
 print(f"\n==> EMAIL CONFIGURATION:")
 print(f"    Backend: {EMAIL_BACKEND}")
 print(f"    Host: {EMAIL_HOST}")
@@ -359,6 +373,22 @@ TWILIO_VERIFY_SERVICE_SID = config('TWILIO_VERIFY_SERVICE_SID', default='')
 TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='+15005550006')
 TWILIO_TEST_PHONE_NUMBER = config('TWILIO_TEST_PHONE_NUMBER', default='+9779866399895')
 
+# SMS verification client (accounts.sms_verification). Without Twilio credentials in local development the
+# LocalVerifyBackend prints codes instead of texting them. Sends wait at most SMS_VERIFICATION_SEND_WAIT seconds
+# before finishing in the background; after SMS_VERIFICATION_CIRCUIT_THRESHOLD provider failures calls are
+# refused for SMS_VERIFICATION_CIRCUIT_RESET seconds.
+SMS_VERIFICATION_BACKEND = config(
+    'SMS_VERIFICATION_BACKEND',
+    default='accounts.sms_verification.LocalVerifyBackend' if DEBUG and not TWILIO_AUTH_TOKEN
+    else 'accounts.sms_verification.TwilioVerifyBackend'
+)
+SMS_VERIFICATION_CONNECT_TIMEOUT = config('SMS_VERIFICATION_CONNECT_TIMEOUT', default=3.05, cast=float)
+SMS_VERIFICATION_READ_TIMEOUT = config('SMS_VERIFICATION_READ_TIMEOUT', default=5, cast=float)
+SMS_VERIFICATION_SEND_WAIT = config('SMS_VERIFICATION_SEND_WAIT', default=2, cast=float)
+SMS_VERIFICATION_MAX_WORKERS = config('SMS_VERIFICATION_MAX_WORKERS', default=4, cast=int)
+SMS_VERIFICATION_CIRCUIT_THRESHOLD = config('SMS_VERIFICATION_CIRCUIT_THRESHOLD', default=5, cast=int)
+SMS_VERIFICATION_CIRCUIT_RESET = config('SMS_VERIFICATION_CIRCUIT_RESET', default=60, cast=int)  # seconds
+
 # OTP Configuration
 OTP_TWILIO_NO_DELIVERY = config('OTP_TWILIO_NO_DELIVERY', default=True, cast=bool)
 OTP_TWILIO_CHALLENGE_MESSAGE = config('OTP_TWILIO_CHALLENGE_MESSAGE', default='Your verification code is {token}')
@@ -390,6 +420,60 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=2621
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 
+# Resumable chat uploads (chunks are appended to a temp file, never held in memory)
+CHAT_UPLOAD_MAX_SIZE = config('CHAT_UPLOAD_MAX_SIZE', default=500 * 1024 * 1024, cast=int)
+CHAT_UPLOAD_CHUNK_SIZE = config('CHAT_UPLOAD_CHUNK_SIZE', default=5 * 1024 * 1024, cast=int)
+CHAT_UPLOAD_TEMP_DIR = config('CHAT_UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'tmp' / 'chat_uploads'))
+CHAT_UPLOAD_EXPIRY_HOURS = config('CHAT_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+
+# Chat media processing (WebP renditions, blurhash, duration)
+CHAT_MEDIA_PROCESS_IN_BACKGROUND = config('CHAT_MEDIA_PROCESS_IN_BACKGROUND', default=True, cast=bool)
+CHAT_MEDIA_DURATION_PROBE = config('CHAT_MEDIA_DURATION_PROBE', default='chat.media.ffprobe_duration')
+
+# Protected chat media: '' streams through Django (Range/ETag aware), 'nginx' uses
+# X-Accel-Redirect to an internal location aliasing MEDIA_ROOT, 'sendfile' uses X-Sendfile
+CHAT_MEDIA_ACCEL = config('CHAT_MEDIA_ACCEL', default='')
+CHAT_MEDIA_ACCEL_PREFIX = config('CHAT_MEDIA_ACCEL_PREFIX', default='/protected-media/')
+CHAT_MEDIA_ACCEL_COLD_PREFIX = config('CHAT_MEDIA_ACCEL_COLD_PREFIX', default='/protected-cold-media/')
+
+# Storage quotas and tiered retention of chat media
+CHAT_STORAGE_QUOTA_BYTES = config('CHAT_STORAGE_QUOTA_BYTES', default=2 * 1024 * 1024 * 1024, cast=int)
+CHAT_COLD_STORAGE_ROOT = config('CHAT_COLD_STORAGE_ROOT', default=str(BASE_DIR / 'cold_media'))
+CHAT_MEDIA_COLD_AFTER_DAYS = config('CHAT_MEDIA_COLD_AFTER_DAYS', default=180, cast=int)
+
+# Frequent-emoji counters: space-saving top-K per user in Redis, flushed by flush_emoji_usage.
+# Left empty in local development, where the counters are written straight to the database.
+CHAT_EMOJI_USAGE_REDIS_URL = config(
+    'CHAT_EMOJI_USAGE_REDIS_URL',
+    default='' if DEBUG and 'RENDER' not in os.environ else REDIS_URL
+)
+CHAT_EMOJI_USAGE_CAPACITY = config('CHAT_EMOJI_USAGE_CAPACITY', default=64, cast=int)  # counters kept per user
+CHAT_EMOJI_FREQUENT_LIMIT = config('CHAT_EMOJI_FREQUENT_LIMIT', default=24, cast=int)  # shown in the picker
+CHAT_EMOJI_USAGE_TTL = config('CHAT_EMOJI_USAGE_TTL', default=30 * 24 * 3600, cast=int)  # seconds idle in Redis
+
+# Cached username -> id map of each conversation used to resolve @mentions (dropped when participants change)
+CHAT_MENTION_USERNAMES_TTL = config('CHAT_MENTION_USERNAMES_TTL', default=600, cast=int)
+
+# Low-priority notifications (friend online, system) are queued here and written by send_notification_digest.
+# Left empty in local development, where they are folded into the open notification straight away.
+NOTIFICATION_DIGEST_REDIS_URL = config(
+    'NOTIFICATION_DIGEST_REDIS_URL',
+    default='' if DEBUG and 'RENDER' not in os.environ else REDIS_URL
+)
+NOTIFICATION_COUNTS_CACHE_TIMEOUT = config('NOTIFICATION_COUNTS_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+NOTIFICATIONS_PAGE_SIZE = config('NOTIFICATIONS_PAGE_SIZE', default=20, cast=int)
+BADGE_COUNTS_CACHE_TIMEOUT = config('BADGE_COUNTS_CACHE_TIMEOUT', default=600, cast=int)  # seconds; signals keep it current
+
+# Notification types kept for less than NOTIFICATION_RETENTION_DAYS, purged by purge_notifications.
+# On PostgreSQL the table can be split into monthly partitions (manage_notification_partitions)
+# so whole months are dropped instead.
+NOTIFICATION_RETENTION_DAYS_BY_TYPE = {
+    'friend_online': 7,
+    'system': 30,
+    'marketing': 30,
+    'reaction': 60,
+}
+
 # Session Configuration
 SESSION_COOKIE_AGE = config('SESSION_COOKIE_AGE', default=1209600, cast=int)
 SESSION_COOKIE_SECURE = config('SESSION_COOKIE_SECURE', default=False, cast=bool)
@@ -407,23 +491,43 @@ CSRF_COOKIE_SAMESITE = config('CSRF_COOKIE_SAMESITE', default='Lax')
 CSRF_FAILURE_VIEW = 'messenger.views.csrf_failure'
 
 # Cache Configuration
-CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
-CACHE_LOCATION = config('CACHE_LOCATION', default='redis://localhost:6379/1')
+# Notification counts, header badges and mention maps are cached per user and kept current by
+# signals, so every gunicorn worker has to see the same cache: outside local development it is
+# the Redis that already backs Channels. A per-process cache would serve stale counts.
+CACHE_BACKEND = config(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.locmem.LocMemCache' if DEBUG and 'RENDER' not in os.environ
+    else 'django.core.cache.backends.redis.RedisCache'
+)
+CACHE_LOCATION = config('CACHE_LOCATION', default=REDIS_URL)
 CACHE_TIMEOUT = config('CACHE_TIMEOUT', default=300, cast=int)
+CACHE_POOL_SIZE = config('CONNECTION_POOL_SIZE', default=10, cast=int)
+
+if CACHE_BACKEND == 'django_redis.cache.RedisCache':
+    CACHE_OPTIONS = {
+        'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        'CONNECTION_POOL_KWARGS': {
+            'max_connections': CACHE_POOL_SIZE,
+        },
+        'SOCKET_CONNECT_TIMEOUT': 5,
+        'SOCKET_TIMEOUT': 5,
+        'RETRY_ON_TIMEOUT': True,
+    }
+elif CACHE_BACKEND == 'django.core.cache.backends.redis.RedisCache':
+    CACHE_OPTIONS = {
+        'max_connections': CACHE_POOL_SIZE,
+        'socket_connect_timeout': 5,
+        'socket_timeout': 5,
+        'retry_on_timeout': True,
+    }
+else:
+    CACHE_OPTIONS = {}
 
 CACHES = {
     'default': {
         'BACKEND': CACHE_BACKEND,
         'LOCATION': CACHE_LOCATION,
-        'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-            'CONNECTION_POOL_KWARGS': {
-                'max_connections': config('CONNECTION_POOL_SIZE', default=10, cast=int),
-            },
-            'SOCKET_CONNECT_TIMEOUT': 5,
-            'SOCKET_TIMEOUT': 5,
-            'RETRY_ON_TIMEOUT': True,
-        },
+        'OPTIONS': CACHE_OPTIONS,
         'KEY_PREFIX': 'messenger',
         'TIMEOUT': CACHE_TIMEOUT,
     }
@@ -507,7 +611,7 @@ TYPING_INDICATOR_TIMEOUT = config('TYPING_INDICATOR_TIMEOUT', default=5, cast=in
 PAGINATION_SIZE = config('PAGINATION_SIZE', default=20, cast=int)
 MAX_LOGIN_ATTEMPTS = config('MAX_LOGIN_ATTEMPTS', default=5, cast=int)
 LOGIN_LOCKOUT_TIME = config('LOGIN_LOCKOUT_TIME', default=300, cast=int)
-NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)  # see NOTIFICATION_RETENTION_DAYS_BY_TYPE
 
 # Feature Flags
 ENABLE_TWO_FACTOR = config('ENABLE_TWO_FACTOR', default=False, cast=bool)
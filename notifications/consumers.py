@@ -2,7 +2,7 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from .models import Notification
+from accounts import badge_counts, notification_service
 
 User = get_user_model()
 
@@ -11,7 +11,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_authenticated:
-            self.room_group_name = f'notifications_{self.user.id}'
+            self.room_group_name = notification_service.get_notification_group_name(self.user.id)
 
             await self.channel_layer.group_add(
                 self.room_group_name,
@@ -19,12 +19,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
             await self.accept()
 
-            # Send unread notifications count on connect
-            unread_count = await self.get_unread_count()
-            await self.send(text_data=json.dumps({
-                'type': 'unread_count',
-                'count': unread_count
-            }))
+            # Send unread notifications count and header badges on connect
+            await self.send_unread_count()
+            await self.send_badge_counts()
         else:
             await self.close()
 
@@ -39,6 +36,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get('type')
 
+        # The service pushes unread_count_changed back to every open socket
         if message_type == 'mark_as_read':
             await self.mark_notification_as_read(text_data_json['notification_id'])
         elif message_type == 'mark_all_read':
@@ -51,45 +49,53 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'title': event['title'],
             'message': event['message'],
             'notification_type': event['notification_type'],
+            'related_url': event.get('related_url'),
             'conversation_id': event.get('conversation_id'),
+            'count': event.get('count', 1),
             'timestamp': event['timestamp'],
             'is_read': event.get('is_read', False)
         }))
 
         # Update unread count
-        unread_count = await self.get_unread_count()
-        await self.send(text_data=json.dumps({
-            'type': 'unread_count',
-            'count': unread_count
-        }))
+        await self.send_unread_count()
 
-    async def notification_read(self, event):
+    async def unread_count_changed(self, event):
+        await self.send_unread_count()
+        await self.send_badge_counts()
+
+    async def badge_counts_changed(self, event):
+        await self.send_badge_counts()
+
+    async def send_badge_counts(self):
+        counts = await self.get_badge_counts()
         await self.send(text_data=json.dumps({
-            'type': 'notification_read',
-            'notification_id': event['notification_id']
+            'type': 'badge_counts',
+            **counts
         }))
 
-        # Update unread count
+    async def send_unread_count(self):
         unread_count = await self.get_unread_count()
         await self.send(text_data=json.dumps({
             'type': 'unread_count',
             'count': unread_count
         }))
 
+    @database_sync_to_async
+    def get_badge_counts(self):
+        return badge_counts.get_badge_counts(self.user)
+
     @database_sync_to_async
     def get_unread_count(self):
-        return Notification.objects.filter(user=self.user, is_read=False).count()
+        return notification_service.get_unread_count(self.user)
 
     @database_sync_to_async
     def mark_notification_as_read(self, notification_id):
         try:
-            notification = Notification.objects.get(id=notification_id, user=self.user)
-            notification.is_read = True
-            notification.save()
-            return True
-        except Notification.DoesNotExist:
+            return bool(notification_service.mark_read(self.user, [notification_id]))
+        except Exception:
+            # Malformed id
             return False
 
     @database_sync_to_async
     def mark_all_notifications_read(self):
-        Notification.objects.filter(user=self.user, is_read=False).update(is_read=True)
\ No newline at end of file
+        notification_service.mark_read(self.user)
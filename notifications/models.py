@@ -4,32 +4,6 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
-class Notification(models.Model):
-    NOTIFICATION_TYPES = [
-        ('message', 'New Message'),
-        ('call', 'Missed Call'),
-        ('contact_request', 'Contact Request'),
-        ('added_to_group', 'Added to Group'),
-        ('message_seen', 'Message Seen'),
-        ('reaction', 'Message Reaction'),
-    ]
-
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
-    notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
-    title = models.CharField(max_length=200)
-    message = models.TextField()
-    related_conversation = models.ForeignKey('chat.Conversation', on_delete=models.CASCADE, null=True, blank=True)
-    related_message = models.ForeignKey('chat.Message', on_delete=models.CASCADE, null=True, blank=True)
-    is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        ordering = ['-created_at']
-
-    def __str__(self):
-        return f"{self.notification_type} - {self.user.username}"
-
-
 class ContactRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
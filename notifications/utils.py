@@ -1,45 +1,22 @@
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
-from .models import Notification
-import json
-from datetime import datetime
+from accounts.notification_service import notify
 
 User = get_user_model()
 
 
 def send_notification(user, notification_type, title, message, **kwargs):
     """
-    Send a real-time notification to a user
+    Send a real-time notification to a user (stored in the shared accounts notification table)
     """
-    # Create notification in database
-    notification = Notification.objects.create(
-        user=user,
-        notification_type=notification_type,
-        title=title,
-        message=message,
-        related_conversation=kwargs.get('conversation'),
+    return notify(
+        user,
+        notification_type,
+        title,
+        message,
+        conversation=kwargs.get('conversation'),
         related_message=kwargs.get('message')
     )
 
-    # Send via WebSocket
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f'notifications_{user.id}',
-        {
-            'type': 'send_notification',
-            'id': notification.id,
-            'title': title,
-            'message': message,
-            'notification_type': notification_type,
-            'conversation_id': kwargs.get('conversation_id'),
-            'timestamp': datetime.now().isoformat(),
-            'is_read': False
-        }
-    )
-
-    return notification
-
 
 def send_contact_request_notification(from_user, to_user):
     """
@@ -47,7 +24,7 @@ def send_contact_request_notification(from_user, to_user):
     """
     send_notification(
         to_user,
-        'contact_request',
+        'friend_request',
         'New Contact Request',
         f'{from_user.username} wants to add you as a contact',
         from_user=from_user
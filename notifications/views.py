@@ -1,7 +1,8 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from .models import Notification, ContactRequest
+from .models import ContactRequest
+from accounts import notification_service
 from accounts.models import Contact
 from django.contrib.auth import get_user_model
 
@@ -10,8 +11,8 @@ User = get_user_model()
 
 @login_required
 def notifications_list(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:50]
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+    notifications = notification_service.get_notifications(request.user)[:50]
+    unread_count = notification_service.get_unread_count(request.user)
 
     return render(request, 'notifications/notifications_list.html', {
         'notifications': notifications,
@@ -21,23 +22,22 @@ def notifications_list(request):
 
 @login_required
 def mark_notification_read(request, notification_id):
-    notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-    notification.is_read = True
-    notification.save()
+    if not notification_service.mark_read(request.user, [notification_id]):
+        get_object_or_404(notification_service.get_notifications(request.user), id=notification_id)
 
     return JsonResponse({'success': True})
 
 
 @login_required
 def mark_all_notifications_read(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    notification_service.mark_read(request.user)
 
     return JsonResponse({'success': True})
 
 
 @login_required
 def get_unread_count(request):
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
+    count = notification_service.get_unread_count(request.user)
     return JsonResponse({'count': count})
 
 
@@ -87,6 +87,11 @@ if not User.objects.filter(is_superuser=True).exists():
     print("✅ Created admin user: admin / AdminPass123!")
 EOF
 
+# ====== START EMAIL WORKER ======
+# Retries backed-off and stuck emails even when no web process is around to do it
+echo "📧 Starting email queue worker..."
+python manage.py send_queued_email --watch 60 &
+
 # ====== START SERVER ======
 echo "🌐 Starting server on port \$PORT..."
 exec gunicorn messenger.wsgi:application \